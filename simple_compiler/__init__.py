@@ -0,0 +1,77 @@
+"""MiniScript compiler: lexer, parser, semantic analysis, optimizer and VM.
+
+Importing the package does no work; each name below loads the module that
+defines it on first access, so `python -m simple_compiler check` never pays
+for the optimizer, the VM or the GUI's tkinter.
+"""
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    'TOKEN_NAMES': 'the_project',
+    'TOKEN_TYPES': 'the_project',
+    'TokenBuffer': 'the_project',
+    'lexer': 'the_project',
+    'stream_lexer': 'the_project',
+    'bulk_lexer': 'bulk',
+    'parallel_lexer': 'parallel',
+    'parallel_lex_file': 'parallel',
+    'lex_range': 'the_project',
+    'LineIndex': 'the_project',
+    'MiniScriptError': 'the_project',
+    'ParseError': 'the_project',
+    'Parser': 'the_project',
+    'SpanTable': 'the_project',
+    'parse_Miniscript': 'the_project',
+    'AST': 'the_project',
+    'Symbol': 'the_project',
+    'SymbolTable': 'the_project',
+    'collect_symbols': 'the_project',
+    'Diagnostic': 'the_project',
+    'SemanticAnalyzer': 'the_project',
+    'OPTIMIZATION_LEVELS': 'the_project',
+    'CodeOptimization': 'the_project',
+    'TypeInference': 'inference',
+    'infer_types': 'inference',
+    'Bytecode': 'vm',
+    'CodeGenerator': 'vm',
+    'generate_code': 'vm',
+    'VM': 'vm',
+    'run': 'vm',
+    'PythonProgram': 'transpile',
+    'run_python': 'transpile',
+    'to_source': 'transpile',
+    'ControlFlowGraph': 'ir',
+    'lower': 'ir',
+    'Grammar': 'll1',
+    'parse_ll1': 'll1',
+    'IncrementalDocument': 'incremental',
+    'edit_between': 'incremental',
+    'FileResult': 'batch',
+    'compile_files': 'batch',
+    'expand_paths': 'batch',
+    'CompileCache': 'cache',
+    'export_tokens': 'export',
+    'export_ast': 'export',
+    'export_symbols': 'export',
+    'export_parse_table': 'export',
+    'read_columnar': 'export',
+    'Profiler': 'profiling',
+    'CompileServer': 'server',
+    'serve': 'server',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,293 @@
+"""Command line driver: python -m simple_compiler {lex,parse,check,compile} [file]
+       python -m simple_compiler export {tokens,ast,symbols} file
+       python -m simple_compiler batch path...
+       python -m simple_compiler serve [--socket path]
+
+Reads the named file, or standard input when the file is '-' or missing.
+`batch` compiles many files, directories or globs across a process pool;
+`serve` answers JSON-RPC compile requests until shut down. `export` writes
+tokens, the syntax tree or the symbol table as JSON Lines, CSV or a binary
+columnar format, streaming the rows out as they are produced.
+Each command imports only the stages it runs.
+parse, check and compile take --profile to report where the time went, per
+phase, on standard error.
+"""
+import argparse
+import sys
+
+from .profiling import PHASES, Profiler
+from .the_project import TOKEN_NAMES, MiniScriptError, Parser, lexer, parse_Miniscript
+
+
+def read_source(path):
+    if path == '-':
+        return sys.stdin.read()
+    with open(path) as file:
+        return file.read()
+
+
+def command_lex(arguments):
+    source = read_source(arguments.file)
+    if arguments.bulk:
+        from .bulk import bulk_lexer
+
+        tokens = bulk_lexer(source)
+    elif arguments.jobs is not None:
+        from .parallel import parallel_lexer
+
+        tokens = parallel_lexer(source, arguments.jobs)
+    else:
+        tokens = lexer(source)
+    for i in range(len(tokens)):
+        text = tokens.text_at(i)
+        if arguments.all or not text.isspace():
+            print(f"{TOKEN_NAMES[tokens.types[i]]}\t{text!r}")
+    return 0
+
+
+def make_profiler(arguments):
+    enabled = bool(arguments.profile or arguments.profile_memory or arguments.profile_json or arguments.cprofile)
+    return Profiler(enabled, arguments.profile_memory, arguments.cprofile)
+
+
+def report_profile(profiler, arguments):
+    if not profiler.enabled:
+        return
+    print(profiler.format(), file=sys.stderr)
+    if arguments.profile_json == '-':
+        print(profiler.to_json())
+    elif arguments.profile_json:
+        with open(arguments.profile_json, 'w') as file:
+            file.write(profiler.to_json())
+
+
+def profiled(command):
+    """Give `command` a profiler, reporting it even when the command fails."""
+    def run(arguments):
+        profiler = make_profiler(arguments)
+        try:
+            return command(arguments, profiler)
+        finally:
+            report_profile(profiler, arguments)
+    return run
+
+
+@profiled
+def command_parse(arguments, profiler):
+    source = read_source(arguments.file)
+    tokens = profiler.run('lex', lexer, source)
+    if not arguments.spans:
+        for statement in profiler.run('parse', parse_Miniscript, tokens):
+            print(statement)
+        return 0
+    parser = Parser(tokens, spans=True)
+    lines = tokens.line_index()
+    for statement in profiler.run('parse', parser.parse_Miniscript):
+        start, end = parser.spans.span(statement)
+        (line, column), (end_line, end_column) = lines.position(start), lines.position(end)
+        print(f"{line}:{column}-{end_line}:{end_column}\t{statement}")
+    return 0
+
+
+@profiled
+def command_check(arguments, profiler):
+    from .the_project import SemanticAnalyzer
+
+    source = read_source(arguments.file)
+    tokens = profiler.run('lex', lexer, source)
+    analyzer = SemanticAnalyzer(lines=tokens.line_index())
+    statements = profiler.run('parse', parse_Miniscript, tokens)
+    for diagnostic in profiler.run('semantic', analyzer.analyze, statements):
+        print(f"{arguments.file}: {diagnostic}")
+    return 1 if analyzer.errors else 0
+
+
+@profiled
+def command_compile(arguments, profiler):
+    from .the_project import CodeOptimization, SemanticAnalyzer
+    from .vm import VM, generate_code
+
+    source = read_source(arguments.file)
+    tokens = profiler.run('lex', lexer, source)
+    analyzer = SemanticAnalyzer(lines=tokens.line_index())
+    statements = profiler.run('parse', parse_Miniscript, tokens)
+    for diagnostic in profiler.run('semantic', analyzer.analyze, statements):
+        print(f"{arguments.file}: {diagnostic}", file=sys.stderr)
+    if analyzer.errors:
+        return 1
+    statements = profiler.run('optimize', CodeOptimization(arguments.optimize).optimize, statements)
+    if arguments.backend == 'python':
+        from .transpile import PythonProgram, to_source
+
+        if arguments.run:
+            program = profiler.run('codegen', PythonProgram, statements)
+            profiler.run('run', program.run, sys.stdout.write)
+        else:
+            print(profiler.run('codegen', to_source, statements))
+        return 0
+    bytecode = profiler.run('codegen', generate_code, statements, analyzer.symbol_table)
+    if arguments.run:
+        profiler.run('run', VM(sys.stdout.write).run, bytecode)
+    else:
+        print(bytecode.disassemble())
+    return 0
+
+
+def command_ir(arguments):
+    from .ir import lower
+    from .the_project import CodeOptimization
+
+    statements = parse_Miniscript(lexer(read_source(arguments.file)))
+    print(lower(CodeOptimization(arguments.optimize).optimize(statements)).format())
+    return 0
+
+
+def command_export(arguments):
+    from .export import BINARY_FORMATS, export_ast, export_symbols, export_tokens
+    from .the_project import stream_lexer
+
+    binary = arguments.format in BINARY_FORMATS
+    if arguments.output:
+        output = open(arguments.output, 'wb' if binary else 'w')
+    else:
+        output = sys.stdout.buffer if binary else sys.stdout
+    try:
+        if arguments.table == 'tokens':
+            # Lexed chunk by chunk: memory stays flat however large the file
+            if arguments.file == '-':
+                export_tokens(stream_lexer(sys.stdin), output, arguments.format, arguments.all)
+            else:
+                with open(arguments.file) as source:
+                    export_tokens(stream_lexer(source), output, arguments.format, arguments.all)
+            return 0
+        tokens = lexer(read_source(arguments.file))
+        if arguments.table == 'ast':
+            export_ast(Parser(tokens).iter_statements(), output, arguments.format)
+        else:
+            from .inference import infer_types
+            from .the_project import collect_symbols
+
+            statements = parse_Miniscript(tokens)
+            symbol_table = collect_symbols(statements, lines=tokens.line_index())
+            infer_types(statements).annotate(symbol_table)
+            export_symbols(symbol_table, output, arguments.format)
+    finally:
+        if arguments.output:
+            output.close()
+    return 0
+
+
+def command_batch(arguments):
+    from .batch import compile_files, expand_paths
+
+    paths = expand_paths(arguments.paths)
+    failed = cached = 0
+    for result in compile_files(paths, arguments.jobs, arguments.chunk_size, arguments.optimize,
+                                ordered=not arguments.unordered, cache_directory=arguments.cache,
+                                cache_size=arguments.cache_size << 20):
+        report = result.format()
+        if report:
+            print(report)
+        failed += not result.ok
+        cached += result.cached
+    summary = f"{len(paths)} files, {failed} failed"
+    if arguments.cache is not None:
+        summary += f", {cached} from cache"
+    print(summary, file=sys.stderr)
+    return 1 if failed else 0
+
+
+def command_serve(arguments):
+    from .server import serve
+
+    serve(arguments.socket, arguments.documents)
+    return 0
+
+
+COMMANDS = {
+    'lex': (command_lex, "print the tokens"),
+    'parse': (command_parse, "print the top-level statements"),
+    'check': (command_check, "report semantic errors and warnings"),
+    'compile': (command_compile, "print the bytecode, or run it with --run"),
+    'ir': (command_ir, "print the three-address code, basic blocks, dominators and liveness"),
+    'export': (command_export, "write tokens, the syntax tree or symbols as JSON Lines, CSV or columnar binary"),
+    'batch': (command_batch, "compile many files in parallel"),
+    'serve': (command_serve, "run a JSON-RPC compile server on stdio or a Unix socket"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m simple_compiler', description="MiniScript compiler")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, (function, help_text) in COMMANDS.items():
+        command = commands.add_parser(name, help=help_text)
+        command.set_defaults(function=function)
+        if name == 'batch':
+            command.add_argument('paths', nargs='+', help="files, directories or glob patterns")
+        elif name == 'serve':
+            command.add_argument('--socket', metavar='PATH', help="listen on this Unix socket instead of stdio")
+            command.add_argument('--documents', type=int, default=64,
+                                 help="parsed documents kept in memory (default 64)")
+        else:
+            if name == 'export':
+                # Required, so that options may come between the two positionals
+                command.add_argument('table', choices=('tokens', 'ast', 'symbols'), help="what to export")
+                command.add_argument('file', help="source file ('-' for standard input)")
+            else:
+                command.add_argument('file', nargs='?', default='-', help="source file ('-' for standard input)")
+        if name in ('compile', 'ir', 'batch'):
+            command.add_argument('-O', dest='optimize', type=int, choices=(0, 1, 2), default=1,
+                                 help="optimization level (default 1)")
+        if name in ('parse', 'check', 'compile'):
+            command.add_argument('--profile', action='store_true',
+                                 help="report time, tokens and nodes of each phase on standard error")
+            command.add_argument('--profile-memory', action='store_true',
+                                 help="also trace each phase's peak memory (slows every phase down)")
+            command.add_argument('--profile-json', metavar='FILE',
+                                 help="write the profile as JSON to FILE ('-' for standard output)")
+            command.add_argument('--cprofile', metavar='PHASE', choices=PHASES,
+                                 help=f"run one phase under cProfile ({', '.join(PHASES)})")
+        if name == 'parse':
+            command.add_argument('--spans', action='store_true',
+                                 help="prefix each statement with its source range, line:column-line:column")
+        elif name == 'lex':
+            command.add_argument('--all', action='store_true', help="include whitespace tokens")
+            command.add_argument('--bulk', action='store_true',
+                                 help="lex with the vectorized NumPy lexer (same tokens, faster on large input)")
+            command.add_argument('-j', '--jobs', type=int, metavar='N',
+                                 help="split one large input across N processes (same tokens)")
+        elif name == 'export':
+            command.add_argument('-f', '--format', choices=('jsonl', 'csv', 'columnar'), default='jsonl',
+                                 help="output format (default jsonl)")
+            command.add_argument('-o', '--output', metavar='FILE', help="write to FILE instead of standard output")
+            command.add_argument('--all', action='store_true', help="include whitespace tokens")
+        elif name == 'compile':
+            command.add_argument('--run', action='store_true', help="run the bytecode on the VM")
+            command.add_argument('--backend', choices=('vm', 'python'), default='vm',
+                                 help="compile to VM bytecode, or to a Python function run by CPython")
+        elif name == 'batch':
+            command.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: CPUs)")
+            command.add_argument('--chunk-size', type=int, default=16, help="files per worker task")
+            command.add_argument('--unordered', action='store_true',
+                                 help="report files as they finish instead of in path order")
+            command.add_argument('--cache', metavar='DIRECTORY', help="reuse results cached in DIRECTORY")
+            command.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                                 help="evict least recently used cache entries beyond this size (default 256)")
+    return parser
+
+
+def main(argv=None):
+    arguments = build_parser().parse_args(argv)
+    try:
+        return arguments.function(arguments)
+    except OSError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 2
+    except MiniScriptError as error:
+        # batch and serve take no single file
+        print(f"{getattr(arguments, 'file', '-')}: error: {error}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
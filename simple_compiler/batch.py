@@ -0,0 +1,164 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .cache import DEFAULT_MAX_BYTES, CompileCache, pack_entry, unpack_bytecode, unpack_diagnostics
+from .the_project import CodeOptimization, MiniScriptError, SemanticAnalyzer, lexer, parse_Miniscript
+from .vm import generate_code
+
+# File extensions picked up when a directory is given
+SOURCE_SUFFIXES = ('.ms', '.txt')
+
+# Files per task sent to a worker: large enough to amortize the round trip,
+# small enough to keep every worker busy until the end
+DEFAULT_CHUNK_SIZE = 16
+
+# CompileCache per (directory, size cap), opened once per worker process
+_caches = {}
+
+
+def expand_paths(arguments, suffixes=SOURCE_SUFFIXES):
+    """Turn files, directories and glob patterns into a sorted list of files.
+
+    Directories are searched recursively for files ending in `suffixes`.
+    """
+    paths = set()
+    for argument in arguments:
+        if os.path.isdir(argument):
+            for directory, _, names in os.walk(argument):
+                paths.update(os.path.join(directory, name) for name in names if name.endswith(suffixes))
+        elif glob.has_magic(argument):
+            paths.update(path for path in glob.glob(argument, recursive=True) if os.path.isfile(path))
+        else:
+            paths.add(argument)
+    return sorted(paths)
+
+
+class FileResult:
+    """What compiling one file produced.
+
+    `error` is the message of the ParseError or OSError that stopped the
+    file, if any; `diagnostics` are the analyzer's, and `bytecode` is set
+    when the file compiled without errors. `cached` tells whether it all
+    came from the compile cache.
+    """
+
+    __slots__ = ('path', 'tokens', 'diagnostics', 'error', 'bytecode', 'elapsed', 'cached')
+
+    def __init__(self, path):
+        self.path = path
+        self.tokens = 0
+        self.diagnostics = []
+        self.error = None
+        self.bytecode = None
+        self.elapsed = 0.0
+        self.cached = False
+
+    @property
+    def ok(self):
+        return self.error is None and not any(d.severity == 'error' for d in self.diagnostics)
+
+    def to_dict(self):
+        """Everything but the timing, for comparing runs."""
+        return {
+            'path': self.path,
+            'tokens': self.tokens,
+            'diagnostics': [diagnostic.to_dict() for diagnostic in self.diagnostics],
+            'error': self.error,
+            'code': bytes(self.bytecode.code) if self.bytecode else None,
+            'constants': self.bytecode.constants if self.bytecode else None,
+        }
+
+    def format(self):
+        lines = [f"{self.path}: {diagnostic}" for diagnostic in self.diagnostics]
+        if self.error is not None:
+            lines.append(f"{self.path}: error: {self.error}")
+        return '\n'.join(lines)
+
+
+def open_cache(directory, max_bytes=DEFAULT_MAX_BYTES):
+    if (directory, max_bytes) not in _caches:
+        _caches[directory, max_bytes] = CompileCache(directory, max_bytes)
+    return _caches[directory, max_bytes]
+
+
+def compile_file(path, optimization_level=1, cache_directory=None, cache_size=DEFAULT_MAX_BYTES):
+    """Lex, parse, analyze and generate code for one file.
+
+    With a `cache_directory`, a file compiled before with the same contents
+    and options is read back from the CompileCache instead.
+    """
+    result = FileResult(path)
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as file:
+            source = file.read().decode('utf-8')
+    except (OSError, UnicodeError) as error:
+        result.error = str(error)
+        result.elapsed = time.perf_counter() - start
+        return result
+    cache = key = None
+    if cache_directory is not None:
+        cache = open_cache(cache_directory, cache_size)
+        key = cache.key(source, optimization_level=optimization_level)
+        entry = cache.get(key)
+        if entry is not None:
+            result.tokens = entry['token_count']
+            result.diagnostics = unpack_diagnostics(entry)
+            result.error = entry['error']
+            result.bytecode = unpack_bytecode(entry)
+            result.cached = True
+            result.elapsed = time.perf_counter() - start
+            return result
+    tokens = statements = None
+    try:
+        tokens = lexer(source)
+        result.tokens = len(tokens)
+        statements = parse_Miniscript(tokens)
+        analyzer = SemanticAnalyzer(lines=tokens.line_index())
+        result.diagnostics = analyzer.analyze(statements)
+        if not analyzer.errors:
+            optimized = CodeOptimization(optimization_level).optimize(statements)
+            result.bytecode = generate_code(optimized, analyzer.symbol_table)
+    except MiniScriptError as error:
+        result.error = str(error)
+    except Exception as error:
+        # A file the compiler itself fails on is reported with the rest of
+        # the batch rather than ending it; it is not cached, so a fixed
+        # compiler gets to try it again
+        result.error = f"Internal error: {error!r}"
+        cache = None
+    if cache is not None:
+        cache.put(key, pack_entry(tokens, statements, result.diagnostics, result.error, result.bytecode))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def compile_chunk(paths, optimization_level=1, cache_directory=None, cache_size=DEFAULT_MAX_BYTES):
+    return [compile_file(path, optimization_level, cache_directory, cache_size) for path in paths]
+
+
+def compile_files(paths, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, optimization_level=1, ordered=True,
+                  cache_directory=None, cache_size=DEFAULT_MAX_BYTES):
+    """Compile `paths` across a process pool, yielding a FileResult per file.
+
+    Files go to the workers in chunks of `chunk_size`. With `ordered` the
+    results come back in the order of `paths`; otherwise each chunk's
+    results are yielded as soon as it finishes. `workers` defaults to the
+    number of CPUs; with one worker everything runs in this process. Each
+    worker shares the compile cache in `cache_directory`, if given.
+    """
+    paths = list(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from compile_chunk(chunk, optimization_level, cache_directory, cache_size)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        futures = [executor.submit(compile_chunk, chunk, optimization_level, cache_directory, cache_size)
+                   for chunk in chunks]
+        for future in (futures if ordered else as_completed(futures)):
+            yield from future.result()
@@ -0,0 +1,605 @@
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .batch import compile_files, open_cache
+from .bulk import bulk_lexer
+from .corpus import generate
+from .export import BINARY_FORMATS, EXPORT_FORMATS, export_ast, export_tokens
+from .incremental import IncrementalDocument
+from .inference import infer_types
+from .ir import lower
+from .ll1 import parse_ll1
+from .parallel import parallel_lex_file, parallel_lexer
+from .server import CompileServer
+from .the_project import (IDENTIFIERS, KEYWORDS, LITERALS, SYMBOLS, TOKEN_TYPES, AST, CodeOptimization, LineIndex,
+                          ParseError, Parser, SemanticAnalyzer, code, lexer, parse_Miniscript, stream_lexer)
+from .transpile import PythonProgram, compile_program, transpile
+from .vm import VM, CodeGenerator, generate_code
+
+
+# The lexer as it was before the master pattern, kept as the baseline to beat
+def legacy_lexer(code):
+    tokens = []
+    for match in re.finditer(r'|'.join([KEYWORDS, IDENTIFIERS, LITERALS, SYMBOLS]), code):
+        token = match.group()
+        if token in KEYWORDS:
+            tokens.append({'type': TOKEN_TYPES['KEYWORD'], 'value': token})
+        elif re.match(IDENTIFIERS, token):
+            tokens.append({'type': TOKEN_TYPES['IDENTIFIER'], 'value': token})
+        elif re.match(LITERALS, token):
+            if token.startswith('"') or token.startswith("'"):
+                tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': token})
+            else:
+                try:
+                    value = int(token)
+                    tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': value})
+                except ValueError:
+                    tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': token})
+        elif re.match(SYMBOLS, token):
+            tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
+    return tokens
+
+
+def time_call(function, argument, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_lexer(copies=2000):
+    source = code * copies
+    count = len(lexer(source))
+    new_time = time_call(lexer, source)
+    old_time = time_call(legacy_lexer, source)
+    print(f"lexer:        {count / new_time:>14,.0f} tokens/sec")
+    print(f"legacy_lexer: {count / old_time:>14,.0f} tokens/sec")
+    print(f"speedup:      {old_time / new_time:>14.2f}x  ({count:,} tokens, {len(source):,} chars)")
+
+
+def bench_bulk_lexer(lines=400_000):
+    # Vectorized lexing against the regex lexer on one large generated input
+    source = generate('mixed', lines, seed=1).encode()
+    megabytes = len(source) / 1e6
+    tokens = bulk_lexer(source)
+    for name, function in (('lexer', lexer), ('bulk_lexer', bulk_lexer)):
+        elapsed = time_call(function, source, repeat=3)
+        print(f"{name + ':':<13}{megabytes / elapsed:>8.1f} MB/sec  {len(tokens) / elapsed:>14,.0f} tokens/sec  "
+              f"({megabytes:.1f} MB, {len(tokens):,} tokens)")
+
+
+def bench_parallel_lexer(lines=100_000):
+    # One large input lexed serially and split across worker processes
+    source = generate('mixed', lines, seed=1).encode()
+    megabytes = len(source) / 1e6
+    expected = lexer(source)
+    serial = time_call(lexer, source, repeat=3)
+    print(f"{'serial:':<13}{megabytes / serial:>8.1f} MB/sec  ({megabytes:.1f} MB, {len(expected):,} tokens)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'huge.ms')
+        with open(path, 'wb') as file:
+            file.write(source)
+        for workers in sorted({2, 4, max(2, os.cpu_count() or 1)}):
+            shared = time_call(lambda data: parallel_lexer(data, workers), source, repeat=3)
+            mapped = time_call(lambda name: parallel_lex_file(name, workers), path, repeat=3)
+            print(f"{f'{workers} workers:':<13}{megabytes / shared:>8.1f} MB/sec shared memory  "
+                  f"{megabytes / mapped:>8.1f} MB/sec mmap  ({serial / shared:.2f}x, {serial / mapped:.2f}x)")
+
+
+def peak_memory(function, argument):
+    tracemalloc.start()
+    try:
+        result = function(argument)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def bench_token_memory(copies=2000):
+    source = code * copies
+    buffer_peak, tokens = peak_memory(lexer, source)
+    dicts_peak, _ = peak_memory(legacy_lexer, source)
+    print(f"source:       {len(source):>14,} chars")
+    print(f"TokenBuffer:  {buffer_peak:>14,} bytes peak  ({buffer_peak / len(tokens):.1f} per token)")
+    print(f"token dicts:  {dicts_peak:>14,} bytes peak  ({dicts_peak / len(tokens):.1f} per token)")
+
+
+def count_streamed(path):
+    with open(path, 'rb') as file:
+        return sum(len(tokens) for tokens in stream_lexer(file))
+
+
+def count_whole(path):
+    with open(path, 'rb') as file:
+        return len(lexer(file.read()))
+
+
+def bench_stream_memory(megabytes=16):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'big.ms')
+        with open(path, 'w') as file:
+            for _ in range(megabytes * 1024 * 1024 // len(code)):
+                file.write(code)
+        for name, function in (('stream_lexer', count_streamed), ('lexer', count_whole)):
+            start = time.perf_counter()
+            peak, count = peak_memory(function, path)
+            elapsed = time.perf_counter() - start
+            print(f"{name + ':':<14}{peak:>14,} bytes peak  {count / elapsed:>12,.0f} tokens/sec  ({megabytes} MB input)")
+
+
+def tabulate_tokens(tokens):
+    # The token dump as the_project prints it: one grid string of every row
+    from tabulate import tabulate
+
+    with open(os.devnull, 'w') as file:
+        file.write(tabulate(tokens.rows(), ['Type', 'Value'], tablefmt='grid'))
+
+
+def export_to_devnull(format, export_function, data):
+    with open(os.devnull, 'wb' if format in BINARY_FORMATS else 'w') as file:
+        return export_function(data, file, format)
+
+
+def bench_export(copies=4_000):
+    # Streaming exports against the tabulate grid; peaks are measured on a
+    # separate run, since tracing allocations slows everything down
+    source = code * copies
+    tokens = lexer(source)
+    cases = [('tabulate grid', 'tokens', tabulate_tokens)]
+    for format in EXPORT_FORMATS:
+        cases.append((f'tokens {format}', 'tokens', lambda data, format=format: export_to_devnull(
+            format, export_tokens, data)))
+    for format in EXPORT_FORMATS:
+        cases.append((f'ast {format}', 'nodes', lambda data, format=format: export_to_devnull(
+            format, export_ast, Parser(data).iter_statements())))
+    nodes = count_nodes(parse_Miniscript(tokens))
+    for name, unit, function in cases:
+        elapsed = time_call(function, tokens, repeat=3)
+        peak, _ = peak_memory(function, tokens)
+        count = nodes if unit == 'nodes' else len(tokens)
+        print(f"{name + ':':<18}{count / elapsed:>12,.0f} {unit}/sec  {peak:>14,} bytes peak")
+
+
+def long_expression(terms):
+    operators = ['+', '*', '-', '/', '<', 'and', '>', 'or']
+    parts = ['x =']
+    for i in range(terms):
+        parts.append(f"(a{i % 7} {operators[i % len(operators)]} {i})")
+        parts.append(operators[(i * 3) % len(operators)])
+    parts.append('1')
+    return ' '.join(parts) + '\n'
+
+
+def nested_blocks(depth, copies):
+    block = 'while x > 0 {\n' * depth + 'x = x - 1\n' + '}\n' * depth
+    return block * copies
+
+
+def bench_parser():
+    # Tokens/sec should stay flat as inputs grow if parsing is linear
+    for name, source in (
+        ('expression 10k', long_expression(1_000)),
+        ('expression 100k', long_expression(10_000)),
+        ('nested blocks 10k', nested_blocks(150, 6)),
+        ('nested blocks 100k', nested_blocks(150, 55)),
+    ):
+        tokens = lexer(source)
+        elapsed = time_call(parse_Miniscript, tokens, repeat=3)
+        print(f"{name + ':':<20}{len(tokens) / elapsed:>14,.0f} tokens/sec  ({len(tokens):,} tokens)")
+
+
+def bench_ll1():
+    for name, source in (
+        ('expression 100k', long_expression(10_000)),
+        ('nested blocks 100k', nested_blocks(150, 55)),
+        ('nested depth 50k', nested_blocks(50_000, 1)),
+    ):
+        tokens = lexer(source)
+        for parser in (parse_ll1, parse_Miniscript):
+            try:
+                elapsed = time_call(parser, tokens, repeat=3)
+            except ParseError:
+                print(f"{name + ':':<20}{'too deep':>14}  {parser.__name__}")
+                continue
+            print(f"{name + ':':<20}{len(tokens) / elapsed:>14,.0f} tokens/sec  {parser.__name__}")
+
+
+# The node layout before __slots__: a __dict__ per node holding a type
+# string, an always-allocated children list and the fields
+class LegacyAST:
+    def __init__(self, type, children=None):
+        self.type = type
+        self.children = children if children else []
+
+
+def to_legacy(node):
+    if isinstance(node, (list, tuple)):
+        return [to_legacy(child) for child in node]
+    if not isinstance(node, AST):
+        return node
+    legacy = LegacyAST(node.type)
+    for name in node.__slots__:
+        setattr(legacy, name, to_legacy(getattr(node, name)))
+    return legacy
+
+
+def retained_memory(function, *arguments):
+    tracemalloc.start()
+    try:
+        result = function(*arguments)
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def count_nodes(statements):
+    count = 0
+    stack = list(statements)
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def bench_ast_memory(copies=40_000):
+    tokens = lexer(code * copies)
+    size, statements = retained_memory(parse_Miniscript, tokens)
+    nodes = count_nodes(statements)
+    legacy_size, _ = retained_memory(to_legacy, statements)
+    shared_size, shared = retained_memory(parse_Miniscript, tokens, True)
+    shared_nodes = count_nodes(shared)
+    print(f"legacy nodes:  {legacy_size:>14,} bytes  ({legacy_size / nodes:.1f} per node, {nodes:,} nodes)")
+    print(f"__slots__:     {size:>14,} bytes  ({size / nodes:.1f} per node)")
+    print(f"hash-consed:   {shared_size:>14,} bytes  ({shared_nodes:,} distinct nodes)")
+
+
+def bench_locations(copies=40_000, lookups=100_000):
+    # Nodes keep one offset; lines and columns come from a newline index
+    # built on first use, and cost a binary search each after that
+    source = code * copies
+    tokens = lexer(source)
+    plain = time_call(lambda tokens: Parser(tokens).parse_Miniscript(), tokens, repeat=3)
+    spans = time_call(lambda tokens: Parser(tokens, spans=True).parse_Miniscript(), tokens, repeat=3)
+    print(f"parse:            {len(tokens) / plain:>14,.0f} tokens/sec")
+    print(f"parse with spans: {len(tokens) / spans:>14,.0f} tokens/sec  ({spans / plain - 1:+.0%})")
+    build = time_call(lambda source: LineIndex(source).starts, source, repeat=3)
+    print(f"line index:       {len(source) / build / 1e6:>14,.1f} MB/sec  ({source.count(chr(10)):,} lines)")
+    step = max(1, len(source) // lookups)
+    offsets = range(0, len(source), step)
+    index = LineIndex(source)
+    index.starts
+    elapsed = time_call(lambda offsets: [index.position(offset) for offset in offsets], offsets, repeat=3)
+    print(f"position():       {len(offsets) / elapsed:>14,.0f} lookups/sec")
+    # Counting newlines up to each offset, the cost of not keeping an index
+    sample = offsets[::100]
+    elapsed = time_call(lambda offsets: [source.count('\n', 0, offset) + 1 for offset in offsets], sample, repeat=3)
+    print(f"str.count():      {len(sample) / elapsed:>14,.0f} lookups/sec")
+
+
+# Loop-heavy programs for the VM: counting loops, nested ranges with
+# break/continue, and branchy arithmetic
+VM_PROGRAMS = {
+    'while loop': '''
+        i = 0
+        total = 0
+        while i < 300000 {
+            total += i * 2 - 1
+            i += 1
+        }
+    ''',
+    'nested for': '''
+        total = 0
+        for i in range(600) {
+            for j in range(600) {
+                if j > i { break }
+                if j = 3 { continue }
+                total += j
+            }
+        }
+    ''',
+    'collatz': '''
+        longest = 0
+        for start in range(1, 3000) {
+            n = start
+            steps = 0
+            while n > 1 {
+                half = n / 2
+                if half * 2 = n { n = half } else { n = 3 * n + 1 }
+                steps += 1
+            }
+            if steps > longest { longest = steps }
+        }
+    ''',
+    'constants': '''
+        width = 80
+        height = 25
+        total = 0
+        for y in range(height) {
+            for x in range(width * 20) {
+                area = width * height * 2
+                debug = false
+                if debug { print(x, y) }
+                total += x + area - 1
+            }
+        }
+    ''',
+}
+
+
+def bench_vm():
+    for name, source in VM_PROGRAMS.items():
+        bytecode = generate_code(parse_Miniscript(lexer(source)))
+        vm = VM()
+        start = time.perf_counter()
+        vm.run(bytecode)
+        elapsed = time.perf_counter() - start
+        print(f"{name + ':':<14}{vm.executed / elapsed:>14,.0f} instructions/sec  "
+              f"({vm.executed:,} instructions, {len(bytecode)} in program)")
+
+
+def bench_transpile():
+    # The Python backend against the VM on the same optimized programs
+    for name, source in VM_PROGRAMS.items():
+        statements = CodeOptimization(2).optimize(parse_Miniscript(lexer(source)))
+        bytecode = generate_code(statements)
+        start = time.perf_counter()
+        compile(transpile(statements), '<miniscript>', 'exec')
+        cold = time.perf_counter() - start
+        compile_program(statements)
+        # An equal program parsed again finds the cached code object
+        reparsed = CodeOptimization(2).optimize(parse_Miniscript(lexer(source)))
+        start = time.perf_counter()
+        program = PythonProgram(reparsed)
+        cached = time.perf_counter() - start
+        vm_time = time_call(VM(lambda line: None).run, bytecode, repeat=3)
+        python_time = time_call(program.run, lambda line: None, repeat=3)
+        print(f"{name + ':':<14}VM {vm_time * 1000:>8.1f} ms   Python {python_time * 1000:>7.1f} ms  "
+              f"({vm_time / python_time:>4.1f}x; compile {cold * 1000:.2f} ms, cached {cached * 1000:.3f} ms)")
+
+
+# Tight numeric loops, where every operation can use a numeric opcode
+NUMERIC_PROGRAMS = {
+    'count': '''
+        i = 0
+        while i < 500000 { i = i + 1 }
+    ''',
+    'sum of squares': '''
+        i = 0
+        total = 0
+        while i < 200000 {
+            square = i * i
+            total = total + square
+            i = i + 1
+        }
+    ''',
+    'float decay': '''
+        x = 1000.0
+        steps = 0
+        while x > 0.001 {
+            x = x * 0.9999
+            steps = steps + 1
+        }
+    ''',
+}
+
+
+def bench_specialize():
+    # Generic against type-specialized bytecode: instructions run and time
+    for name, source in {**NUMERIC_PROGRAMS, **VM_PROGRAMS}.items():
+        statements = CodeOptimization(1).optimize(parse_Miniscript(lexer(source)))
+        start = time.perf_counter()
+        types = infer_types(statements)
+        inference = time.perf_counter() - start
+        results = []
+        for bytecode in (generate_code(statements, specialize=False), CodeGenerator(None, types).generate(statements)):
+            vm = VM(lambda line: None)
+            elapsed = time_call(vm.run, bytecode, repeat=3)
+            results.append((elapsed, vm.executed // 3))
+        (generic, generic_count), (specialized, specialized_count) = results
+        print(f"{name + ':':<16}generic {generic * 1000:>7.1f} ms  specialized {specialized * 1000:>7.1f} ms  "
+              f"({generic / specialized:.2f}x; {generic_count:,} -> {specialized_count:,} instructions, "
+              f"inference {inference * 1000:.2f} ms)")
+
+
+def bench_optimizer():
+    # What each pass buys: per-pass node deltas, then VM instructions per level
+    for name, source in VM_PROGRAMS.items():
+        statements = parse_Miniscript(lexer(source))
+        print(f"{name}:")
+        for level in (0, 1, 2):
+            optimizer = CodeOptimization(level)
+            bytecode = generate_code(optimizer.optimize(statements))
+            vm = VM()
+            start = time.perf_counter()
+            vm.run(bytecode)
+            elapsed = time.perf_counter() - start
+            print(f"  -O{level}: {vm.executed:>10,} instructions  {elapsed * 1000:>9.1f} ms")
+        for pass_name, seconds, before, after in optimizer.report:
+            print(f"    {pass_name:<26}{seconds * 1000:>8.3f} ms  {before:>5} -> {after:<5} nodes")
+
+
+def bench_semantic():
+    # Nodes/sec should stay flat as programs grow if analysis is one linear pass
+    for name, source in (
+        ('sample x1k', code * 1_000),
+        ('sample x10k', code * 10_000),
+        ('expression 100k', long_expression(10_000)),
+        ('nested blocks 100k', nested_blocks(150, 55)),
+    ):
+        tokens = lexer(source)
+        statements = parse_Miniscript(tokens)
+        nodes = count_nodes(statements)
+        lines = tokens.line_index()
+        diagnostics = []
+        elapsed = time_call(lambda statements: diagnostics.append(SemanticAnalyzer(lines=lines).analyze(statements)),
+                            statements, repeat=3)
+        print(f"{name + ':':<20}{nodes / elapsed:>14,.0f} nodes/sec  "
+              f"({nodes:,} nodes, {len(diagnostics[-1]):,} diagnostics)")
+
+
+def bench_ir():
+    # Lowering and every analysis should cost the same per node at any size
+    for name, source in (
+        ('sample x1k', code * 1_000),
+        ('sample x10k', code * 10_000),
+        ('nested blocks', nested_blocks(150, 20)),
+        ('loops x100', ''.join(VM_PROGRAMS.values()) * 100),
+    ):
+        statements = parse_Miniscript(lexer(source))
+        nodes = count_nodes(statements)
+        start = time.perf_counter()
+        graph = lower(statements)
+        lowered = time.perf_counter() - start
+        graph.dominators()
+        graph.liveness()
+        graph.def_use()
+        analyzed = time.perf_counter() - start - lowered
+        instructions = sum(len(block.instructions) for block in graph.blocks)
+        print(f"{name + ':':<15}{nodes / lowered:>11,.0f} nodes/sec lowered  "
+              f"{instructions / analyzed:>11,.0f} instructions/sec analyzed  "
+              f"({nodes:,} nodes, {len(graph):,} blocks)")
+
+
+def bench_incremental(copies=3_600):
+    # A keystroke should cost about the same on a 50k-line file as on a small one
+    source = code * copies
+    start = time.perf_counter()
+    document = IncrementalDocument(source)
+    full = time.perf_counter() - start
+    print(f"full build:    {full * 1000:>10.2f} ms  ({source.count(chr(10)):,} lines, {len(document.tokens):,} tokens)")
+    middle = source.index('\n', len(source) // 2) + 1
+    for name, text in (('space', ' '), ('newline', '\n'), ('identifier', 'y = 1\n'), ('open string', '"')):
+        best = float('inf')
+        for i in range(20):
+            start = time.perf_counter()
+            document.edit(middle + i, 0, text)
+            best = min(best, time.perf_counter() - start)
+        print(f"{'type ' + name + ':':<15}{best * 1000:>10.2f} ms  "
+              f"({document.relexed} tokens re-lexed, {document.reparsed} statements re-parsed)")
+
+
+def bench_cli_startup(budget=0.100):
+    # Cold start of `python -m simple_compiler check`, interpreter start-up included
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sample.ms')
+        with open(path, 'w') as file:
+            file.write(code)
+        command = [sys.executable, '-m', 'simple_compiler', 'check', path]
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        best = float('inf')
+        for _ in range(10):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=package_root, stdout=subprocess.DEVNULL, check=False)
+            best = min(best, time.perf_counter() - start)
+        status = 'within' if best <= budget else 'OVER'
+        print(f"check cold start: {best * 1000:>8.1f} ms  ({status} the {budget * 1000:.0f} ms budget)")
+
+
+def bench_batch(files=400):
+    # Files/sec by worker count
+    sources = [code * (1 + i % 20) for i in range(files)]
+    sources[::25] = ['x = (\n'] * len(sources[::25])
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, source in enumerate(sources):
+            paths.append(os.path.join(directory, f'file{i:04}.ms'))
+            with open(paths[-1], 'w') as file:
+                file.write(source)
+        for workers in sorted({1, 2, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            for _ in compile_files(paths, workers):
+                pass
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>3} workers: {files / elapsed:>10,.0f} files/sec  ({elapsed:.2f} s)")
+
+
+def bench_cache(files=400):
+    # A warm run over an unchanged corpus should only read cache entries
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(files):
+            paths.append(os.path.join(directory, f'file{i:04}.ms'))
+            with open(paths[-1], 'w') as file:
+                file.write(code * (1 + i % 20) + f'marker = {i}\n')
+        cache_directory = os.path.join(directory, 'cache')
+        for name in ('cold', 'warm'):
+            start = time.perf_counter()
+            for _ in compile_files(paths, 1, cache_directory=cache_directory):
+                pass
+            print(f"{name}: {time.perf_counter() - start:>8.3f} s")
+        print(open_cache(cache_directory).stats())
+
+
+def bench_server(requests=200):
+    # Round-trip latency over a Unix socket, for new and already-seen versions
+    async def measure(path):
+        server = CompileServer()
+        serving = asyncio.create_task(server.serve_unix(path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+
+        async def call(request_id, params):
+            start = time.perf_counter()
+            writer.write(json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': 'check',
+                                     'params': params}).encode() + b'\n')
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            return time.perf_counter() - start, response['result']['elapsed_ms']
+
+        for name, versions in (('new version', range(requests)), ('same version', [0] * requests)):
+            timings = [await call(i, {'uri': 'sample', 'version': version, 'text': code})
+                       for i, version in enumerate(versions)]
+            round_trip = sorted(timing[0] for timing in timings)[len(timings) // 2]
+            server_side = sorted(timing[1] for timing in timings)[len(timings) // 2]
+            print(f"{name + ':':<14}{round_trip * 1000:>8.3f} ms median round trip  "
+                  f"({server_side:.3f} ms in the server)")
+        writer.write(b'{"jsonrpc": "2.0", "id": 0, "method": "shutdown"}\n')
+        await writer.drain()
+        await serving
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(measure(os.path.join(directory, 'server.sock')))
+
+
+BENCHMARKS = {
+    'lexer': bench_lexer,
+    'bulk_lexer': bench_bulk_lexer,
+    'parallel_lexer': bench_parallel_lexer,
+    'token_memory': bench_token_memory,
+    'stream_memory': bench_stream_memory,
+    'export': bench_export,
+    'parser': bench_parser,
+    'll1': bench_ll1,
+    'ast_memory': bench_ast_memory,
+    'locations': bench_locations,
+    'vm': bench_vm,
+    'transpile': bench_transpile,
+    'specialize': bench_specialize,
+    'optimizer': bench_optimizer,
+    'semantic': bench_semantic,
+    'ir': bench_ir,
+    'incremental': bench_incremental,
+    'cli_startup': bench_cli_startup,
+    'batch': bench_batch,
+    'cache': bench_cache,
+    'server': bench_server,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
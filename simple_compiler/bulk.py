@@ -0,0 +1,181 @@
+"""Vectorized lexer for very large inputs, built on NumPy.
+
+bulk_lexer() returns exactly what lexer() returns, but classifies the whole
+input at once instead of matching one token at a time:
+
+1. quote positions pair up into string literals (a quote with no later
+   quote is skipped, as the regex skips it);
+2. every other byte gets a character class from a 256-entry table;
+3. a table indexed by (class of the previous byte, class of this byte)
+   marks where tokens start: a run of word characters is one identifier,
+   or a number followed by an identifier when it starts with a digit, a
+   run of whitespace is one token and every symbol is its own;
+4. bytes no pattern matches start a segment of their own, so with every
+   byte covered, one flatnonzero() lists the token starts in order and
+   their lengths are the gaps between them;
+5. the first eight bytes of every identifier are read as one integer and
+   looked up among the reserved words with one searchsorted().
+
+NumPy is optional: without it, or for a str that is not pure ASCII (where
+regex classes like \\s and \\d reach beyond ASCII), bulk_lexer() falls back
+to lexer().
+"""
+from array import array
+
+from .the_project import TOKEN_TYPES, WORD_TYPES, TokenBuffer, lexer
+
+# Character classes
+OTHER = 0
+WORD = 1
+DIGIT = 2
+SYMBOL = 3
+SPACE = 4
+QUOTE = 5
+
+SYMBOL_CHARACTERS = b'+-*/()=<>.,;:{}'
+# \s in a bytes pattern; a str pattern also matches \x1c-\x1f
+BYTES_SPACE = b' \t\n\r\f\v'
+STR_SPACE = BYTES_SPACE + bytes(range(0x1c, 0x20))
+
+# Segment markers: a token type, SKIPPED for a byte that starts no token,
+# or LETTER_AFTER_DIGIT, which starts an identifier only in a run that
+# began with a digit (12abc, but not a1b)
+SKIPPED = 255
+LETTER_AFTER_DIGIT = 254
+
+# Reserved words are at most this many bytes, read as one little-endian integer
+WORD_KEY_SIZE = 8
+
+# Mask keeping the first n bytes of such an integer, for n up to WORD_KEY_SIZE
+LENGTH_MASKS = [(1 << 8 * n) - 1 for n in range(WORD_KEY_SIZE + 1)]
+
+CLASSES = 8
+
+_tables = {}
+
+
+def class_table(space):
+    import numpy as np
+
+    table = np.zeros(256, np.uint8)
+    for characters, character_class in ((b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_', WORD),
+                                        (b'0123456789', DIGIT), (SYMBOL_CHARACTERS, SYMBOL),
+                                        (space, SPACE), (b'"\'', QUOTE)):
+        table[list(characters)] = character_class
+    return table
+
+
+def transition_table():
+    """Segment marker of a byte, at index class * CLASSES + class of the byte before."""
+    import numpy as np
+
+    identifier, literal, symbol = TOKEN_TYPES['IDENTIFIER'], TOKEN_TYPES['LITERAL'], TOKEN_TYPES['SYMBOL']
+    table = np.zeros((CLASSES, CLASSES), np.uint8)
+    for previous in range(CLASSES):
+        table[OTHER, previous] = SKIPPED
+        table[SYMBOL, previous] = symbol
+        table[SPACE, previous] = 0 if previous == SPACE else symbol
+        table[WORD, previous] = {WORD: 0, DIGIT: LETTER_AFTER_DIGIT}.get(previous, identifier)
+        table[DIGIT, previous] = 0 if previous in (WORD, DIGIT) else literal
+        # Bytes of a string continue it; opening quotes are marked apart
+        table[QUOTE, previous] = 0
+    return table.ravel()
+
+
+def tables(space):
+    if space not in _tables:
+        _tables[space] = class_table(space), transition_table()
+    return _tables[space]
+
+
+RESERVED_KEYS = None
+
+
+def reserved_keys():
+    """(sorted reserved words as integers, their token types), built on first use."""
+    global RESERVED_KEYS
+    if RESERVED_KEYS is None:
+        import numpy as np
+
+        packed = sorted((int.from_bytes(word.encode(), 'little'), token_type)
+                        for word, token_type in WORD_TYPES.items())
+        RESERVED_KEYS = (np.array([key for key, _ in packed], np.uint64),
+                         np.array([token_type for _, token_type in packed], np.int32))
+    return RESERVED_KEYS
+
+
+def bulk_lexer(code):
+    """Tokenize `code` (a str, bytes, bytearray, mmap or memoryview) like lexer()."""
+    try:
+        import numpy as np
+    except ImportError:
+        return lexer(code)
+    if isinstance(code, str):
+        if not code.isascii():
+            return lexer(code)
+        data = np.frombuffer(code.encode('ascii'), np.uint8)
+        class_of, transitions = tables(STR_SPACE)
+    else:
+        data = np.frombuffer(code, np.uint8)
+        class_of, transitions = tables(BYTES_SPACE)
+    tokens = TokenBuffer(code)
+    size = len(data)
+    if not size:
+        return tokens
+    classes = class_of[data]
+
+    # 1. Strings: quotes pair up in order; an odd last quote is skipped
+    quotes = np.flatnonzero(classes == QUOTE)
+    paired = len(quotes) & ~1
+    opening, closing = quotes[0:paired:2], quotes[1:paired:2]
+    if paired:
+        # +1 at each opening quote, -1 after each closing one: the running
+        # sum is 1 exactly inside a string, quotes included
+        depth = np.zeros(size + 1, np.int8)
+        depth[opening] = 1
+        # Subtract rather than assign: a string may open right after one closes
+        depth[closing + 1] -= 1
+        np.putmask(classes, np.cumsum(depth[:-1], dtype=np.int8).view(bool), QUOTE)
+    if len(quotes) > paired:
+        classes[quotes[-1]] = OTHER
+
+    # 2. Segment starts, from each byte's class and the class before it
+    # The first byte has no byte before it, which reads as OTHER (0)
+    index = classes * np.uint8(CLASSES)
+    index[1:] += classes[:-1]
+    marks = transitions[index]
+    marks[opening] = TOKEN_TYPES['LITERAL']
+
+    # 3. Starts in order; a letter after a digit starts an identifier only
+    # right after a number, and is otherwise inside the identifier before it
+    starts = np.flatnonzero(marks)
+    types = marks[starts]
+    candidates = np.flatnonzero(types == LETTER_AFTER_DIGIT)
+    if len(candidates):
+        starts_identifier = types[candidates - 1] == TOKEN_TYPES['LITERAL']
+        types[candidates[starts_identifier]] = TOKEN_TYPES['IDENTIFIER']
+        inside = candidates[~starts_identifier]
+        if len(inside):
+            starts, types = np.delete(starts, inside), np.delete(types, inside)
+    lengths = np.diff(starts, append=size)
+    kept = types != SKIPPED
+    starts, lengths, types = starts[kept], lengths[kept], types[kept].astype(np.int32)
+
+    # 4. Reserved words among the identifiers
+    identifiers = np.flatnonzero((types == TOKEN_TYPES['IDENTIFIER']) & (lengths <= WORD_KEY_SIZE))
+    if len(identifiers):
+        keys, key_types = reserved_keys()
+        padded = np.zeros(size + WORD_KEY_SIZE, np.uint8)
+        padded[:size] = data
+        # Eight bytes read at every offset: a view, no copy
+        words = np.ndarray((size,), '<u8', padded, strides=(1,))
+        packed = words[starts[identifiers]] & np.array(LENGTH_MASKS, np.uint64)[lengths[identifiers]]
+        position = np.minimum(np.searchsorted(keys, packed), len(keys) - 1)
+        found = keys[position] == packed
+        types[identifiers[found]] = key_types[position[found]]
+
+    for name, column in (('types', types), ('starts', starts), ('lengths', lengths)):
+        values = array('i')
+        values.frombytes(column.astype(np.int32, copy=False).view(np.uint8))
+        setattr(tokens, name, values)
+    return tokens
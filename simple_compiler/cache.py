@@ -0,0 +1,273 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from array import array
+
+from .the_project import AST, NODE_CLASSES, Diagnostic, TokenBuffer
+from .vm import Bytecode
+
+# Bump when the entry layout changes
+CACHE_FORMAT = 3
+
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Modules whose code decides what a compile produces
+FINGERPRINT_MODULES = ('the_project.py', 'inference.py', 'vm.py', 'transpile.py', 'batch.py', 'cache.py')
+
+_fingerprint = None
+
+
+def compiler_fingerprint():
+    """Hash of the compiler's own source, so editing the compiler invalidates the cache."""
+    global _fingerprint
+    if _fingerprint is None:
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in FINGERPRINT_MODULES:
+            with open(os.path.join(directory, name), 'rb') as file:
+                digest.update(file.read())
+        _fingerprint = digest.digest()
+    return _fingerprint
+
+
+def encode_tree(statements):
+    """Flatten a syntax tree into (records, roots) of plain tuples.
+
+    Nodes are listed children first; in a record, a child node is written as
+    [index], a tuple of nodes as a tuple of indices, anything else as is.
+    Shared nodes are written once. Marshalling the nodes themselves would
+    recurse as deep as the tree and keep hashes that are only valid in this
+    process.
+    """
+    records = []
+    index_of = {}
+    stack = [(node, False) for node in reversed(statements)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in index_of:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children) if id(child) not in index_of)
+            continue
+        fields = []
+        for name in node.__slots__:
+            value = getattr(node, name)
+            if isinstance(value, AST):
+                value = [index_of[id(value)]]
+            elif isinstance(value, tuple):
+                value = tuple(index_of[id(child)] for child in value)
+            fields.append(value)
+        index_of[id(node)] = len(records)
+        records.append((node.kind, getattr(node, 'offset', None), tuple(fields)))
+    return records, [index_of[id(node)] for node in statements]
+
+
+def decode_tree(records, roots):
+    nodes = []
+    for kind, offset, fields in records:
+        cls = NODE_CLASSES[kind]
+        node = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, fields):
+            if type(value) is list:
+                value = nodes[value[0]]
+            elif type(value) is tuple:
+                value = tuple(nodes[i] for i in value)
+            elif type(value) is str:
+                value = sys.intern(value)
+            setattr(node, name, value)
+        if offset is not None:
+            node.offset = offset
+        nodes.append(node)
+    return [nodes[i] for i in roots]
+
+
+ENTRY_FIELDS = {'token_count', 'tokens', 'tree', 'diagnostics', 'error', 'bytecode'}
+
+
+def pack_entry(tokens=None, statements=None, diagnostics=(), error=None, bytecode=None):
+    """Build a cache entry from what the compile stages produced."""
+    return {
+        'token_count': len(tokens) if tokens is not None else 0,
+        'tokens': (tokens.types.tobytes(), tokens.starts.tobytes(), tokens.lengths.tobytes())
+        if tokens is not None else None,
+        'tree': encode_tree(statements) if statements is not None else None,
+        'diagnostics': [(d.code, d.message, d.offset, d.line, d.column) for d in diagnostics],
+        'error': error,
+        'bytecode': (bytes(bytecode.code), bytecode.constants, bytecode.names) if bytecode is not None else None,
+    }
+
+
+def unpack_tokens(entry, source):
+    if entry['tokens'] is None:
+        return None
+    tokens = TokenBuffer(source)
+    for name, data in zip(('types', 'starts', 'lengths'), entry['tokens']):
+        values = array('i')
+        values.frombytes(data)
+        setattr(tokens, name, values)
+    return tokens
+
+
+def unpack_statements(entry):
+    return decode_tree(*entry['tree']) if entry['tree'] is not None else None
+
+
+def unpack_diagnostics(entry):
+    diagnostics = []
+    for code, message, offset, line, column in entry['diagnostics']:
+        diagnostic = Diagnostic.__new__(Diagnostic)
+        diagnostic.code, diagnostic.message = code, message
+        diagnostic.offset, diagnostic.line, diagnostic.column = offset, line, column
+        diagnostics.append(diagnostic)
+    return diagnostics
+
+
+def unpack_bytecode(entry):
+    if entry['bytecode'] is None:
+        return None
+    code, constants, names = entry['bytecode']
+    return Bytecode(array('B', code), constants, names)
+
+
+class CompileCache:
+    """Compile results on disk, addressed by a hash of source and options.
+
+    An entry is one marshalled file under `directory`, written to a temporary
+    file and renamed into place so readers never see half an entry. Entries
+    hold plain data only (numbers, strings, bytes, tuples, lists and dicts),
+    so reading one never runs code; still, anyone who can write to the
+    directory decides what compiles report, so it should only be writable by
+    trusted users, and is created readable by its owner only. A hit
+    touches the file, so modification times order entries by last use;
+    once the cache outgrows `max_bytes` the least recently used entries are
+    deleted until it is back under 90% of the cap. Several processes may
+    share a directory: each keeps its own running size and rescans before
+    evicting. The cache is best-effort: an entry that cannot be read counts
+    as a miss and one that cannot be written is skipped, so a read-only,
+    full or vanished directory slows compiles down but never fails them.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        except OSError:
+            pass
+        self.size = sum(size for _, _, size in self.entries())
+
+    def key(self, source, **options):
+        """Key of `source` (str or bytes) compiled with `options`."""
+        if isinstance(source, str):
+            source = source.encode('utf-8', 'surrogatepass')
+        digest = hashlib.sha256(compiler_fingerprint())
+        digest.update(repr(sorted(options.items())).encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.msc')
+
+    def get(self, key):
+        """Return the entry stored under `key`, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = marshal.load(file)
+        except OSError:
+            # Missing, or unreadable to this process
+            self.misses += 1
+            return None
+        except (EOFError, ValueError, TypeError):
+            entry = None
+        if not isinstance(entry, dict) or set(entry) != ENTRY_FIELDS:
+            # A file from another format or a damaged disk: drop it
+            self.misses += 1
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # A read-only cache still serves hits; only eviction order suffers
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """Store `entry` under `key`; returns whether it was written."""
+        data = marshal.dumps(entry)
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        except OSError:
+            return False
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            self.remove(temporary)
+            return False
+        except BaseException:
+            self.remove(temporary)
+            raise
+        self.writes += 1
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+        return True
+
+    def entries(self):
+        """Yield (path, last use, size) of every stored entry."""
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.msc'):
+                    path = os.path.join(directory, name)
+                    try:
+                        status = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, status.st_mtime, status.st_size
+
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        self.size = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if self.size <= target:
+                break
+            if self.remove(path):
+                self.evictions += 1
+            self.size -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        for path, _, _ in list(self.entries()):
+            self.remove(path)
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'bytes': self.size,
+        }
@@ -0,0 +1,210 @@
+"""Seeded generator of synthetic MiniScript programs for benchmarks.
+
+    python -m simple_compiler.corpus --shape nested --lines 50000 --seed 3 > big.ms
+    python -m simple_compiler.corpus --files 1000 --lines 200 -o corpus/
+
+Every program parses and passes semantic analysis: variables are assigned
+before any statement reads them, divisors are non-zero literals and loops
+count a variable down, so the programs also run to completion.
+"""
+import argparse
+import os
+import random
+import sys
+
+SHAPES = ('straight', 'nested', 'expression', 'strings', 'mixed')
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'value', 'total', 'count')
+
+
+class CorpusGenerator:
+    """Emits MiniScript lines of a given shape from a seeded random source.
+
+    straight    assignments, compound assignments and prints
+    nested      if/else, while and for blocks nested up to `max_depth`
+    expression  assignments of expressions with about `terms` operands
+    strings     string literals about `string_length` characters long
+    mixed       all of the above
+    """
+
+    def __init__(self, seed=0, variables=16, max_depth=40, terms=400, string_length=2000):
+        self.random = random.Random(seed)
+        self.numbers = [f'n{i}' for i in range(variables)]
+        self.strings = [f's{i}' for i in range(max(1, variables // 4))]
+        self.max_depth = max_depth
+        self.terms = terms
+        self.string_length = string_length
+        self.lines = []
+        self.depth = 0
+        # While-loop counters created so far; each loop gets a new one
+        self.counters = 0
+
+    def emit(self, line):
+        self.lines.append('    ' * self.depth + line)
+
+    def prologue(self):
+        for name in self.numbers:
+            self.emit(f'{name} = {self.random.randint(1, 100)}')
+        for name in self.strings:
+            self.emit(f'{name} = "{self.random.choice(WORDS)}"')
+
+    def generate(self, shape='mixed', lines=1000):
+        """Return a program of about `lines` lines after the variable set-up."""
+        if shape not in SHAPES:
+            raise ValueError(f"unknown shape {shape!r}, expected one of {', '.join(SHAPES)}")
+        self.lines = []
+        self.prologue()
+        emitters = {
+            'straight': self.straight,
+            'nested': self.nested,
+            'expression': self.expression_statement,
+            'strings': self.string_statement,
+        }
+        choices = list(emitters.values()) if shape == 'mixed' else [emitters[shape]]
+        lines += len(self.lines)
+        while len(self.lines) < lines:
+            self.random.choice(choices)()
+        return '\n'.join(self.lines) + '\n'
+
+    # Expressions
+
+    def operand(self):
+        roll = self.random.random()
+        if roll < 0.6:
+            return self.random.choice(self.numbers)
+        if roll < 0.9:
+            return str(self.random.randint(0, 1000))
+        return f'{self.random.randint(0, 99)}.{self.random.randint(0, 99)}'
+
+    def arithmetic(self, terms):
+        """An arithmetic expression over `terms` operands, built without recursion."""
+        parts = [self.operand()]
+        open_groups = 0
+        for _ in range(terms - 1):
+            operator = self.random.choice('+-*/')
+            if operator == '/':
+                parts.append(f'/ {self.random.randint(1, 9)}')
+                continue
+            parts.append(operator)
+            if self.random.random() < 0.1:
+                parts.append('(')
+                open_groups += 1
+            parts.append(self.operand())
+            if open_groups and self.random.random() < 0.2:
+                parts.append(')')
+                open_groups -= 1
+        if open_groups:
+            parts.append(')' * open_groups)
+        return ' '.join(parts).replace('( ', '(').replace(' )', ')')
+
+    def condition(self):
+        left = self.arithmetic(self.random.randint(1, 3))
+        comparison = f'{left} {self.random.choice(("<", ">", "<=", ">=", "="))} {self.operand()}'
+        roll = self.random.random()
+        if roll < 0.15:
+            return f'{comparison} and not {self.random.choice(self.numbers)} > {self.random.randint(0, 50)}'
+        if roll < 0.3:
+            return f'{comparison} or {self.random.choice(("true", "false"))}'
+        return comparison
+
+    # Statements
+
+    def straight(self):
+        roll = self.random.random()
+        target = self.random.choice(self.numbers)
+        if roll < 0.5:
+            self.emit(f'{target} = {self.arithmetic(self.random.randint(1, 6))}')
+        elif roll < 0.8:
+            self.emit(f'{target} {self.random.choice("+-*")}= {self.random.randint(1, 9)}')
+        else:
+            self.emit(f'print({target}, {self.random.choice(self.strings)})')
+
+    def expression_statement(self):
+        terms = max(1, int(self.random.uniform(0.5, 1.5) * self.terms))
+        self.emit(f'{self.random.choice(self.numbers)} = {self.arithmetic(terms)}')
+
+    def string_statement(self):
+        words = []
+        length = 0
+        target = max(1, int(self.random.uniform(0.5, 1.5) * self.string_length))
+        while length < target:
+            word = self.random.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        name = self.random.choice(self.strings)
+        self.emit(f'{name} = "{" ".join(words)}"')
+        if self.random.random() < 0.3:
+            self.emit(f'print {name}')
+
+    def nested(self):
+        """Open blocks down to a random depth, filling each level, then close them."""
+        target = self.random.randint(1, self.max_depth)
+        closers = []
+        for _ in range(target):
+            for _ in range(self.random.randint(0, 2)):
+                self.straight()
+            roll = self.random.random()
+            if roll < 0.4:
+                self.emit(f'if {self.condition()} {{')
+                closers.append('if')
+            elif roll < 0.7:
+                # The counter is a fresh variable, so the loop always ends
+                counter = f'c{self.counters}'
+                self.counters += 1
+                self.emit(f'{counter} = {self.random.randint(1, 3)}')
+                self.emit(f'while {counter} > 0 {{')
+                closers.append(counter)
+            else:
+                self.emit(f'for i{self.depth} in range({self.random.randint(1, 3)}) {{')
+                closers.append('for')
+            self.depth += 1
+        self.straight()
+        while closers:
+            closer = closers.pop()
+            if closer not in ('if', 'for'):
+                self.emit(f'{closer} -= 1')
+            self.depth -= 1
+            if closer == 'if' and self.random.random() < 0.3:
+                self.emit('} else {')
+                self.depth += 1
+                self.straight()
+                self.depth -= 1
+            self.emit('}')
+
+
+def generate(shape='mixed', lines=1000, seed=0, **options):
+    """A synthetic MiniScript program; the same arguments give the same program."""
+    return CorpusGenerator(seed, **options).generate(shape, lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m simple_compiler.corpus', description=__doc__.splitlines()[0])
+    parser.add_argument('--shape', choices=SHAPES, default='mixed')
+    parser.add_argument('--lines', type=int, default=1000, help="lines per program (default 1000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=40, help="deepest block nesting (default 40)")
+    parser.add_argument('--terms', type=int, default=400, help="operands in a large expression (default 400)")
+    parser.add_argument('--string-length', type=int, default=2000, help="characters in a long string (default 2000)")
+    parser.add_argument('--files', type=int, default=0, help="write this many programs to --output")
+    parser.add_argument('-o', '--output', help="output directory with --files, else output file")
+    arguments = parser.parse_args(argv)
+    options = {'max_depth': arguments.depth, 'terms': arguments.terms, 'string_length': arguments.string_length}
+    if arguments.files:
+        if not arguments.output:
+            parser.error("--files needs --output")
+        os.makedirs(arguments.output, exist_ok=True)
+        for i in range(arguments.files):
+            with open(os.path.join(arguments.output, f'program{i:05}.ms'), 'w') as file:
+                file.write(generate(arguments.shape, arguments.lines, arguments.seed + i, **options))
+        return 0
+    source = generate(arguments.shape, arguments.lines, arguments.seed, **options)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            file.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
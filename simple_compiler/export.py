@@ -0,0 +1,332 @@
+"""Streaming exports of tokens, syntax trees, symbol tables and parse tables.
+
+A table is a schema, a tuple of (name, type, labels) columns, and a stream
+of batches, each a list of equally long columns. Writers take one batch at
+a time, so memory stays bounded by the largest batch whatever the size of
+the input: token batches are at most BATCH_SIZE tokens of one TokenBuffer
+(or of one stream_lexer() chunk), tree batches at most BATCH_SIZE nodes of
+statements parsed one by one.
+
+Formats:
+    jsonl     one JSON object per row
+    csv       a header row, then one line per row
+    columnar  binary; each batch stores every column contiguously
+
+Column types:
+    int    32-bit integer
+    enum   small integer code, written as its label from the schema
+    str    text
+    json   any JSON value; csv and columnar hold its JSON text
+    ints   list of 32-bit integers; csv joins them with spaces
+
+The columnar layout, with every integer little-endian:
+    MAGIC, uint32 schema length, the schema as JSON
+    per batch, uint32 row count, then each column in schema order:
+        int        rows int32 values
+        enum       rows uint8 codes
+        str, json  rows + 1 int32 offsets into a UTF-8 blob, then the blob
+        ints       rows + 1 int32 offsets into the values, then the int32 values
+    uint32 0 after the last batch
+read_columnar() reads it back.
+"""
+import csv
+import json
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from .the_project import AST, NODE_CLASSES, TOKEN_NAMES, TOKEN_TYPES, TokenBuffer
+
+MAGIC = b'MSCOLS\x00\x01'
+
+# Rows per batch, where the producer does not batch by itself
+BATCH_SIZE = 1 << 14
+
+TOKEN_LABELS = [TOKEN_NAMES.get(code, '') for code in range(max(TOKEN_NAMES) + 1)]
+NODE_LABELS = [NODE_CLASSES[kind].__name__ if kind in NODE_CLASSES else '' for kind in range(max(NODE_CLASSES) + 1)]
+# The field of its parent a node is held in; '' for a top-level statement
+FIELD_LABELS = [''] + sorted({name for cls in NODE_CLASSES.values() for name in cls.__slots__})
+FIELD_CODES = {name: code for code, name in enumerate(FIELD_LABELS)}
+
+# Scalar node fields exported as the node's value; 'keyword' repeats the node type
+VALUE_FIELDS = ('value', 'operator')
+
+TABLES = {
+    'tokens': (('type', 'enum', TOKEN_LABELS), ('text', 'str', None), ('offset', 'int', None),
+               ('length', 'int', None)),
+    'ast': (('id', 'int', None), ('parent', 'int', None), ('field', 'enum', FIELD_LABELS),
+            ('type', 'enum', NODE_LABELS), ('value', 'json', None), ('offset', 'int', None)),
+    'symbols': (('name', 'str', None), ('kind', 'str', None), ('type', 'str', None), ('depth', 'int', None),
+                ('slot', 'int', None), ('line', 'int', None), ('references', 'ints', None)),
+    'parse_table': (('nonterminal', 'str', None), ('terminal', 'str', None), ('production', 'str', None)),
+}
+
+
+# Batches
+
+def token_batches(buffers, whitespace=False):
+    """Token columns of each TokenBuffer in `buffers`, with offsets into the whole input.
+
+    Whitespace tokens are left out unless `whitespace` is true.
+    """
+    symbol = TOKEN_TYPES['SYMBOL']
+    for tokens in buffers:
+        types, starts, lengths = tokens.types, tokens.starts, tokens.lengths
+        source, base = tokens.source, tokens.offset
+        for first in range(0, len(types), BATCH_SIZE):
+            batch_types, texts, offsets, batch_lengths = array('i'), [], array('i'), array('i')
+            for i in range(first, min(first + BATCH_SIZE, len(types))):
+                start = starts[i]
+                text = source[start:start + lengths[i]]
+                if not isinstance(text, str):
+                    text = str(text, 'utf-8')
+                if not whitespace and types[i] == symbol and text.isspace():
+                    continue
+                batch_types.append(types[i])
+                texts.append(text)
+                offsets.append(base + start)
+                batch_lengths.append(lengths[i])
+            yield [batch_types, texts, offsets, batch_lengths]
+
+
+def node_batches(statements):
+    """One row per node of `statements`, in preorder, each naming its parent's id.
+
+    `statements` may be a generator (Parser.iter_statements()), which is
+    consumed one statement at a time. A subtree shared by hash-consing is
+    written out at every place it occurs. Nodes without an offset get -1.
+    """
+    columns = None
+    next_id = 0
+    for statement in statements:
+        stack = [(statement, -1, 0)]
+        while stack:
+            node, parent, field = stack.pop()
+            if columns is None:
+                columns = [array('i'), array('i'), array('i'), array('i'), [], array('i')]
+                ids, parents, fields, kinds, values, offsets = columns
+            value = None
+            children = []
+            for name in node.__slots__:
+                item = getattr(node, name)
+                if isinstance(item, AST):
+                    children.append((item, next_id, FIELD_CODES[name]))
+                elif isinstance(item, tuple):
+                    children.extend((child, next_id, FIELD_CODES[name]) for child in item)
+                elif name in VALUE_FIELDS:
+                    value = item
+            ids.append(next_id)
+            parents.append(parent)
+            fields.append(field)
+            kinds.append(node.kind)
+            values.append(value)
+            offsets.append(getattr(node, 'offset', -1))
+            next_id += 1
+            stack.extend(reversed(children))
+            if len(ids) >= BATCH_SIZE:
+                yield columns
+                columns = None
+    if columns is not None:
+        yield columns
+
+
+def symbol_batches(symbol_table):
+    symbols = symbol_table.symbols
+    for first in range(0, len(symbols), BATCH_SIZE):
+        batch = symbols[first:first + BATCH_SIZE]
+        yield [[symbol.name for symbol in batch], [symbol.kind for symbol in batch],
+               [symbol.type or '' for symbol in batch], array('i', (symbol.depth for symbol in batch)),
+               array('i', (symbol.slot for symbol in batch)), array('i', (symbol.line or 0 for symbol in batch)),
+               [symbol.references for symbol in batch]]
+
+
+def parse_table_batches(parse_table):
+    """Rows of a {nonterminal: {terminal: 'rhs'}} parse table, as the GUI and ll1 use."""
+    columns = [[], [], []]
+    for nonterminal, row in parse_table.items():
+        for terminal, production in row.items():
+            columns[0].append(nonterminal)
+            columns[1].append(terminal)
+            columns[2].append(production)
+    yield columns
+
+
+# Writers; each returns the number of rows written
+
+def text_values(column, values, format):
+    """`values` of `column` as the jsonl or csv writer outputs them."""
+    _, type_, labels = column
+    if type_ == 'enum':
+        return [labels[code] for code in values]
+    if type_ == 'ints':
+        if format == 'jsonl':
+            return [list(value) for value in values]
+        return [' '.join(map(str, value)) for value in values]
+    if type_ == 'json' and format == 'csv':
+        return [json.dumps(value) for value in values]
+    return values
+
+
+def write_jsonl(file, table, columns, batches):
+    names = [column[0] for column in columns]
+    encode = json.JSONEncoder(check_circular=False, separators=(',', ':')).encode
+    rows = 0
+    for batch in batches:
+        values = [text_values(column, data, 'jsonl') for column, data in zip(columns, batch)]
+        file.write(''.join([encode(dict(zip(names, row))) + '\n' for row in zip(*values)]))
+        rows += len(batch[0])
+    return rows
+
+
+def write_csv(file, table, columns, batches):
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow([column[0] for column in columns])
+    rows = 0
+    for batch in batches:
+        writer.writerows(zip(*[text_values(column, data, 'csv') for column, data in zip(columns, batch)]))
+        rows += len(batch[0])
+    return rows
+
+
+def write_array(file, values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    file.write(values)
+
+
+def write_blob(file, items):
+    """Write `items` (bytes) as rows + 1 int32 offsets, then their concatenation."""
+    offsets = array('i', [0])
+    offsets.extend(accumulate(map(len, items)))
+    write_array(file, offsets)
+    file.write(b''.join(items))
+
+
+def write_columnar(file, table, columns, batches):
+    schema = {'table': table, 'columns': [{'name': name, 'type': type_, 'labels': labels}
+                                          for name, type_, labels in columns]}
+    header = json.dumps(schema).encode()
+    file.write(MAGIC + struct.pack('<I', len(header)) + header)
+    rows = 0
+    for batch in batches:
+        count = len(batch[0])
+        if not count:
+            # A zero row count ends the stream
+            continue
+        file.write(struct.pack('<I', count))
+        for (_, type_, _), values in zip(columns, batch):
+            if type_ == 'int':
+                write_array(file, values if isinstance(values, array) else array('i', values))
+            elif type_ == 'enum':
+                file.write(array('B', values))
+            elif type_ == 'str':
+                write_blob(file, [value.encode() for value in values])
+            elif type_ == 'json':
+                write_blob(file, [json.dumps(value).encode() for value in values])
+            else:
+                offsets = array('i', [0])
+                offsets.extend(accumulate(map(len, values)))
+                write_array(file, offsets)
+                flat = array('i')
+                for value in values:
+                    flat.extend(value)
+                write_array(file, flat)
+        rows += count
+    file.write(struct.pack('<I', 0))
+    return rows
+
+
+EXPORT_FORMATS = {
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+    'columnar': write_columnar,
+}
+
+# Formats written to a binary file; the others want a text file
+BINARY_FORMATS = {'columnar'}
+
+
+def export(table, batches, file, format='jsonl'):
+    """Write the rows of `table` that `batches` yields to `file`; returns the row count."""
+    writer = EXPORT_FORMATS.get(format)
+    if writer is None:
+        raise ValueError(f"Unknown export format: {format!r}")
+    return writer(file, table, TABLES[table], batches)
+
+
+def export_tokens(tokens, file, format='jsonl', whitespace=False):
+    """Export a TokenBuffer, or an iterable of them such as stream_lexer() yields."""
+    buffers = [tokens] if isinstance(tokens, TokenBuffer) else tokens
+    return export('tokens', token_batches(buffers, whitespace), file, format)
+
+
+def export_ast(statements, file, format='jsonl'):
+    return export('ast', node_batches(statements), file, format)
+
+
+def export_symbols(symbol_table, file, format='jsonl'):
+    return export('symbols', symbol_batches(symbol_table), file, format)
+
+
+def export_parse_table(parse_table, file, format='jsonl'):
+    return export('parse_table', parse_table_batches(parse_table), file, format)
+
+
+# Reading the columnar format back
+
+def read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated columnar export")
+    return data
+
+
+def read_array(file, typecode, count):
+    values = array(typecode)
+    values.frombytes(read_exactly(file, values.itemsize * count))
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+def read_columnar(file):
+    """Read a columnar export from binary `file`; returns (schema, batches).
+
+    `batches` is a generator of {column name: values} dicts, one batch at a
+    time: an array('i') for int columns, an array('B') of codes for enum
+    columns (their labels are in the schema), a list of str or of decoded
+    JSON values, and a list of array('i') for ints columns.
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a columnar export")
+    (length,) = struct.unpack('<I', read_exactly(file, 4))
+    schema = json.loads(read_exactly(file, length))
+
+    def batches():
+        while True:
+            (count,) = struct.unpack('<I', read_exactly(file, 4))
+            if not count:
+                return
+            batch = {}
+            for column in schema['columns']:
+                type_ = column['type']
+                if type_ == 'int':
+                    values = read_array(file, 'i', count)
+                elif type_ == 'enum':
+                    values = read_array(file, 'B', count)
+                else:
+                    offsets = read_array(file, 'i', count + 1)
+                    if type_ == 'ints':
+                        flat = read_array(file, 'i', offsets[-1])
+                        values = [flat[offsets[i]:offsets[i + 1]] for i in range(count)]
+                    else:
+                        blob = read_exactly(file, offsets[-1])
+                        values = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(count)]
+                        if type_ == 'json':
+                            values = [json.loads(value) for value in values]
+                batch[column['name']] = values
+            yield batch
+
+    return schema, batches()
@@ -0,0 +1,172 @@
+"""Per-stage benchmarks over the synthetic corpus, checked against JSON baselines.
+
+    python -m simple_compiler.harness                          print the results
+    python -m simple_compiler.harness --save baseline.json     record a baseline
+    python -m simple_compiler.harness --baseline baseline.json exit 1 on regressions
+
+Each workload is generated by simple_compiler.corpus from a fixed seed, then
+lexed, parsed, analyzed, optimized (-O2) and compiled to bytecode. Every
+stage reports its best time over --repeat runs as tokens/sec or nodes/sec,
+and its peak traced memory from one more run under tracemalloc.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from .corpus import generate
+from .the_project import CodeOptimization, SemanticAnalyzer, lexer, parse_Miniscript, tree_size
+from .vm import generate_code
+
+# Corpus options of each workload, at scale 1
+WORKLOADS = {
+    'straight': {'shape': 'straight', 'lines': 20_000},
+    'nested': {'shape': 'nested', 'lines': 20_000, 'max_depth': 100},
+    'expression': {'shape': 'expression', 'lines': 50, 'terms': 2_000},
+    'strings': {'shape': 'strings', 'lines': 1_000, 'string_length': 5_000},
+    'mixed': {'shape': 'mixed', 'lines': 20_000},
+}
+
+STAGES = ('lex', 'parse', 'analyze', 'optimize', 'codegen')
+
+# Allowed slowdown (or memory growth) before a stage counts as regressed
+DEFAULT_TOLERANCE = 0.3
+
+
+def run_stages(source):
+    """Run the pipeline once; returns {stage: (seconds, peak bytes or None)} and sizes."""
+    tracing = tracemalloc.is_tracing()
+    timings = {}
+
+    def stage(name, function, *arguments):
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = function(*arguments)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - baseline if tracing else None
+        timings[name] = (elapsed, peak)
+        return result
+
+    tokens = stage('lex', lexer, source)
+    statements = stage('parse', parse_Miniscript, tokens)
+    analyzer = SemanticAnalyzer(lines=tokens.line_index())
+    stage('analyze', analyzer.analyze, statements)
+    optimized = stage('optimize', CodeOptimization(2).optimize, statements)
+    stage('codegen', generate_code, optimized, analyzer.symbol_table)
+    sizes = {'chars': len(source), 'tokens': len(tokens), 'nodes': tree_size(statements),
+             'optimized_nodes': tree_size(optimized)}
+    return timings, sizes
+
+
+def measure(source, repeat=3):
+    """Best time, rate and peak memory of every stage on `source`."""
+    best = {}
+    for _ in range(repeat):
+        timings, sizes = run_stages(source)
+        for name, (elapsed, _) in timings.items():
+            best[name] = min(best.get(name, elapsed), elapsed)
+    tracemalloc.start()
+    try:
+        peaks, _ = run_stages(source)
+    finally:
+        tracemalloc.stop()
+    units = {'lex': 'tokens', 'parse': 'tokens', 'analyze': 'nodes', 'optimize': 'nodes',
+             'codegen': 'optimized_nodes'}
+    stages = {}
+    for name in STAGES:
+        seconds = best[name]
+        stages[name] = {
+            'seconds': seconds,
+            'rate': sizes[units[name]] / seconds if seconds else 0.0,
+            'unit': 'tokens/s' if units[name] == 'tokens' else 'nodes/s',
+            'peak_bytes': peaks[name][1],
+        }
+    return {**sizes, 'stages': stages}
+
+
+def run_suite(scale=1.0, seed=0, repeat=3, workloads=None):
+    results = {
+        'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                 'scale': scale, 'seed': seed, 'repeat': repeat},
+        'workloads': {},
+    }
+    for name in workloads or WORKLOADS:
+        options = dict(WORKLOADS[name])
+        options['lines'] = max(1, int(options['lines'] * scale))
+        source = generate(seed=seed, **options)
+        results['workloads'][name] = measure(source, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Messages for every stage slower, or heavier, than the baseline allows."""
+    problems = []
+    for name, workload in results['workloads'].items():
+        expected = baseline['workloads'].get(name)
+        if expected is None:
+            continue
+        if expected['tokens'] != workload['tokens'] or expected['nodes'] != workload['nodes']:
+            problems.append(f"{name}: workload differs from the baseline's "
+                            f"({workload['tokens']} vs {expected['tokens']} tokens); record a new baseline")
+            continue
+        for stage, current in workload['stages'].items():
+            before = expected['stages'][stage]
+            if current['rate'] < before['rate'] * (1 - tolerance):
+                problems.append(f"{name}/{stage}: {current['rate']:,.0f} {current['unit']}, "
+                                f"baseline {before['rate']:,.0f} ({current['rate'] / before['rate'] - 1:+.0%})")
+            if before['peak_bytes'] and current['peak_bytes'] > before['peak_bytes'] * (1 + tolerance):
+                problems.append(f"{name}/{stage}: peak {current['peak_bytes']:,} bytes, "
+                                f"baseline {before['peak_bytes']:,} "
+                                f"({current['peak_bytes'] / before['peak_bytes'] - 1:+.0%})")
+    return problems
+
+
+def format_results(results):
+    lines = []
+    for name, workload in results['workloads'].items():
+        lines.append(f"{name}: {workload['chars']:,} chars, {workload['tokens']:,} tokens, "
+                     f"{workload['nodes']:,} nodes")
+        for stage, result in workload['stages'].items():
+            lines.append(f"  {stage:<10}{result['rate']:>14,.0f} {result['unit']:<9}"
+                         f"{result['seconds'] * 1000:>10.1f} ms{result['peak_bytes']:>14,} bytes peak")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m simple_compiler.harness', description=__doc__.splitlines()[0])
+    parser.add_argument('workloads', nargs='*', metavar='workload',
+                        help=f"workloads to run (default all: {', '.join(WORKLOADS)})")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply workload sizes (default 1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, best counts (default 3)")
+    parser.add_argument('--save', metavar='FILE', help="write the results as a JSON baseline")
+    parser.add_argument('--baseline', metavar='FILE', help="fail if slower or heavier than this baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed regression as a fraction (default {DEFAULT_TOLERANCE})")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    arguments = parser.parse_args(argv)
+    unknown = [name for name in arguments.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workload {unknown[0]!r}")
+    results = run_suite(arguments.scale, arguments.seed, arguments.repeat, arguments.workloads)
+    print(json.dumps(results, indent=2) if arguments.json else format_results(results))
+    if arguments.save:
+        with open(arguments.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            problems = compare(results, json.load(file), arguments.tolerance)
+        if problems:
+            print(f"\nREGRESSIONS ({len(problems)}):", file=sys.stderr)
+            for problem in problems:
+                print(f"  {problem}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .profiling import Profiler
+from .the_project import GROUP_TYPES, TOKEN_PATTERN, TOKEN_TYPES, WORD_TYPES, ParseError, Parser, lexer, tree_size
+
+QUOTES = ('"', "'")
+
+
+def edit_between(old, new):
+    """Return the single edit (offset, removed length, inserted text) turning
+    `old` into `new`.
+
+    The common prefix and suffix are found by binary search over slice
+    comparisons, which run at memcmp speed even on large buffers.
+    """
+    limit = min(len(old), len(new))
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[low:middle] == new[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+    limit -= prefix
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:len(old) - low] == new[len(new) - middle:len(new) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    suffix = low
+    return prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix]
+
+
+def shift_offsets(statements, delta):
+    """Move every node of `statements` `delta` characters later in the source."""
+    stack = list(statements)
+    # Compound assignments share the target Identifier with their Term
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        try:
+            node.offset += delta
+        except AttributeError:
+            pass
+        stack.extend(node.children)
+
+
+class ShiftedArray:
+    """Ascending positions in an array('i') with a pending shift for the tail.
+
+    Entries from `shift_from` on read `shift` higher than they are stored,
+    so moving everything after an edit costs nothing up front; the shift
+    is written into the stored values only over the stretch between one
+    edit and the next, which is short while someone is typing.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self.shift_from = len(values)
+        self.shift = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return array('i', (self[i] for i in range(*index.indices(len(self.values)))))
+        if index < 0:
+            index += len(self.values)
+        value = self.values[index]
+        return value + self.shift if index >= self.shift_from else value
+
+    def replace(self, first, end, new_values, delta):
+        """Replace entries [first, end) with `new_values` and move the ones after by `delta`."""
+        values = self.values
+        shift = self.shift
+        if shift and self.shift_from < first:
+            values[self.shift_from:first] = array('i', map(shift.__add__, values[self.shift_from:first]))
+        elif shift and self.shift_from > end:
+            values[end:self.shift_from] = array('i', map((-shift).__add__, values[end:self.shift_from]))
+        values[first:end] = new_values
+        self.shift_from = first + len(new_values)
+        self.shift = shift + delta
+
+    def array(self):
+        """The true values as a plain array('i')."""
+        self.replace(len(self.values), len(self.values), array('i'), 0)
+        self.shift = 0
+        return self.values
+
+
+class IncrementalDocument:
+    """A MiniScript source buffer kept lexed and parsed across edits.
+
+    edit() applies one change and updates `tokens` and `statements` in
+    place of a full rebuild: tokens before the change are kept, the lexer
+    runs from just before the change until its output lines up with the old
+    tokens again, and top-level statements are re-parsed from the one
+    enclosing the change until a statement starts where an old one did.
+    Token offsets, statement boundaries and node offsets after the change are
+    moved lazily (see ShiftedArray), so an edit costs about as much as the
+    distance to the previous one rather than the length of the file.
+    While the source does not parse, `error` holds the ParseError and
+    `statements` the last good parse; the damaged range stays pending and is
+    re-parsed with the next edit. `relexed` and `reparsed` count the tokens
+    and statements the last edit rebuilt; a `profiler` set on the document
+    records the re-lexing and re-parsing as its lex and parse phases.
+    """
+
+    def __init__(self, source='', profiler=None):
+        self.source = source
+        self.profiler = profiler or Profiler(enabled=False)
+        self.tokens = self.profiler.run('lex', lexer, source)
+        self.tokens.starts = ShiftedArray(self.tokens.starts)
+        self._statements = []
+        # Token index of the first token of each top-level statement
+        self.statement_starts = ShiftedArray(array('i'))
+        # Statements from offset_from on have offsets stored offset_shift too low
+        self.offset_from = 0
+        self.offset_shift = 0
+        self.error = None
+        # Token range [first, end) still to re-parse after a failed edit
+        self.pending = (0, max(len(self.tokens), 1))
+        self.relexed = len(self.tokens)
+        self.reparsed = 0
+        self.profiler.run('parse', self.reparse)
+
+    @property
+    def statements(self):
+        """The top-level statements, with every node's offset up to date."""
+        self.move_offset_shift(len(self._statements), len(self._statements))
+        self.offset_from = len(self._statements)
+        self.offset_shift = 0
+        return self._statements
+
+    def move_offset_shift(self, first, end):
+        """Give statements before `first` their true offsets and store the ones
+        from `end` on relative to the pending offset shift."""
+        if not self.offset_shift:
+            return
+        if self.offset_from < first:
+            shift_offsets(self._statements[self.offset_from:first], self.offset_shift)
+        elif self.offset_from > end:
+            shift_offsets(self._statements[end:self.offset_from], -self.offset_shift)
+
+    def edit(self, offset, removed, inserted):
+        """Replace `removed` characters at `offset` with the `inserted` text."""
+        old_source = self.source
+        removed_text = old_source[offset:offset + removed]
+        self.source = old_source[:offset] + inserted + old_source[offset + removed:]
+        first, old_end, new_end = self.profiler.run('lex', self.relex, offset, removed, inserted, removed_text)
+        self.profiler.count('lex', tokens=self.relexed)
+        token_delta = new_end - old_end
+
+        def shifted(index, end_of_range):
+            if index >= old_end:
+                return index + token_delta
+            if index < first:
+                return index
+            return new_end if end_of_range else first
+
+        # Statements starting in the re-lexed range keep a placeholder start
+        # at its first token until they are re-parsed
+        starts = self.statement_starts
+        inside = bisect_left(starts, first)
+        after = bisect_left(starts, old_end)
+        starts.replace(inside, after, array('i', [first]) * (after - inside), token_delta)
+        self.move_offset_shift(after, after)
+        self.offset_from = after
+        self.offset_shift += len(inserted) - removed
+        # Deleted tokens still damage the statement that held them
+        pending_first, pending_end = first, max(new_end, first + 1)
+        if self.pending is not None:
+            pending_first = min(pending_first, shifted(self.pending[0], False))
+            pending_end = max(pending_end, shifted(self.pending[1], True))
+        self.pending = (pending_first, pending_end)
+        self.profiler.run('parse', self.reparse)
+        return self
+
+    def relex(self, offset, removed, inserted, removed_text):
+        """Re-lex around an edit already applied to `source`.
+
+        Returns (first, old end, new end): tokens [first, old end) of the old
+        stream were replaced by tokens [first, new end) of the new one.
+        """
+        tokens = self.tokens
+        source = self.source
+        starts = tokens.starts
+        # Start a token early: the one before the change may grow into it
+        first = max(0, bisect_right(starts, offset) - 2)
+        restart = starts[first] if first else 0
+        if any(quote in inserted or quote in removed_text for quote in QUOTES):
+            # A string can only be left unclosed by the last quote in the
+            # source; a new quote after it closes it and re-lexes the gap
+            quote = max(source.rfind('"', 0, restart), source.rfind("'", 0, restart))
+            if quote >= 0:
+                index = bisect_right(starts, quote) - 1
+                if index < 0 or starts[index] + tokens.lengths[index] <= quote:
+                    first = index + 1
+                    restart = quote
+        delta = len(inserted) - removed
+        edit_end = offset + len(inserted)
+        old_count = len(tokens)
+        old_index = first
+        types, new_starts, lengths = array('i'), array('i'), array('i')
+        identifier = TOKEN_TYPES['IDENTIFIER']
+        for match in TOKEN_PATTERN.finditer(source, restart):
+            start, end = match.span()
+            if start >= edit_end:
+                # Past the change, stop as soon as a token matches an old one
+                while old_index < old_count and starts[old_index] + delta < start:
+                    old_index += 1
+                if (old_index < old_count and starts[old_index] + delta == start
+                        and tokens.lengths[old_index] == end - start):
+                    break
+            kind = match.lastgroup
+            types.append(WORD_TYPES.get(match.group(), identifier) if kind == 'WORD' else GROUP_TYPES[kind])
+            new_starts.append(start)
+            lengths.append(end - start)
+        else:
+            old_index = old_count
+        tokens.source = source
+        tokens.types[first:old_index] = types
+        tokens.lengths[first:old_index] = lengths
+        starts.replace(first, old_index, new_starts, delta)
+        self.relexed = len(types)
+        return first, old_index, first + len(types)
+
+    def reparse(self):
+        """Re-parse the pending token range, splicing the result into `statements`."""
+        if self.pending is None:
+            return
+        damage_first, damage_end = self.pending
+        starts = self.statement_starts
+        # Restart at the last statement starting before the damage: when the
+        # damage reaches a statement's first token, it can extend the
+        # expression that ends the statement before
+        index = max(bisect_left(starts, damage_first) - 1, 0)
+        start_token = starts[index] if index else 0
+        tokens = self.tokens
+        parser = Parser(tokens)
+        parser.seek(start_token)
+        parsed = []
+        parsed_starts = array('i')
+        resume = index
+        try:
+            while parser.text:
+                if parser.text == ';':
+                    parser.advance()
+                    continue
+                while resume < len(starts) and starts[resume] < parser.pos:
+                    resume += 1
+                # Past the damage, an old statement starting here is still valid
+                if resume < len(starts) and starts[resume] == parser.pos >= damage_end:
+                    break
+                parsed_starts.append(parser.pos)
+                parsed.append(parser.parse_TopLevelStatement())
+            else:
+                resume = len(starts)
+        except ParseError as error:
+            self.error = error
+            self.reparsed = 0
+            return
+        self.move_offset_shift(index, resume)
+        self._statements[index:resume] = parsed
+        starts.replace(index, resume, parsed_starts, 0)
+        self.offset_from = index + len(parsed)
+        self.error = None
+        self.pending = None
+        self.reparsed = len(parsed)
+        if self.profiler.enabled:
+            self.profiler.count('parse', tokens=parser.pos - start_token, nodes=tree_size(parsed))
@@ -0,0 +1,211 @@
+"""Flow-sensitive type inference: the static type of every expression.
+
+infer_types() walks the program in execution order, carrying an
+environment that maps each variable to the type it certainly holds at that
+point: int, float, string, bool or null. A variable missing from the
+environment may hold anything, or nothing yet. Where paths meet (after an
+if, at a loop head, after a loop) a variable keeps its type only if every
+path agrees. A loop body is walked again while its head environment still
+changes; environments only ever lose entries, so that settles after a
+pass or two.
+
+Operators are typed by the semantic analyzer's rules, so constant
+expressions are typed at compile time. A variable with a known type has
+been assigned on every path to that point, which is what lets the code
+generator read it without the VM's unassigned check.
+"""
+from .the_project import (LITERAL_NODES, Assignment, BreakStatement, ContinueStatement, ForStatement, Identifier,
+                          IfStatement, MiniScriptError, PrintStatement, ReturnStatement, Term, UnaryTerm,
+                          WhileStatement, literal_type, operation_type, unary_type)
+
+
+def join(first, second):
+    """The environment where two paths meet; None stands for a path that cannot get there."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return {name: type_ for name, type_ in first.items() if second.get(name) == type_}
+
+
+class TypeInference:
+    """Types the expressions of a parsed program (a list of statements).
+
+    Types are kept by node identity: syntax trees compare structurally, and
+    `x + 1` can have a different type in each place it appears. A node
+    that is shared between places, or was typed differently on an earlier
+    pass over a loop, is recorded as unknown.
+    """
+
+    def __init__(self):
+        # id(node) -> type, or None where occurrences disagree
+        self.types = {}
+        # Variable name -> the type of every value assigned to it, or None if they differ
+        self.variables = {}
+        # Keeps the typed nodes, and so their ids, alive
+        self.program = ()
+        # (environments at continue, environments at break) per enclosing loop
+        self.loops = []
+        self.statements = {
+            PrintStatement: self.infer_PrintStatement,
+            IfStatement: self.infer_IfStatement,
+            WhileStatement: self.infer_WhileStatement,
+            ForStatement: self.infer_ForStatement,
+            Assignment: self.infer_Assignment,
+            BreakStatement: self.infer_BreakStatement,
+            ContinueStatement: self.infer_ContinueStatement,
+            ReturnStatement: self.infer_ReturnStatement
+        }
+
+    def infer(self, statements):
+        self.program = statements
+        self.infer_block(statements, {})
+        return self
+
+    def type_of(self, node):
+        """The static type of expression `node`, or None if unknown."""
+        if isinstance(node, LITERAL_NODES):
+            return literal_type(node.value)
+        return self.types.get(id(node))
+
+    def record(self, node, type_):
+        key = id(node)
+        if self.types.get(key, type_) != type_:
+            type_ = None
+        self.types[key] = type_
+
+    def assign(self, environment, name, type_):
+        if self.variables.get(name, type_) != type_:
+            self.variables[name] = None
+        else:
+            self.variables[name] = type_
+        if type_ is None:
+            environment.pop(name, None)
+        else:
+            environment[name] = type_
+
+    def annotate(self, symbol_table):
+        """Set the type of each variable symbol that only ever holds one type."""
+        for symbol in symbol_table.symbols:
+            if symbol.kind == 'variable' and symbol.type is None:
+                symbol.type = self.variables.get(symbol.name)
+
+    def infer_block(self, statements, environment):
+        """Type `statements` from `environment`, which they may change; returns the one after them."""
+        for statement in statements:
+            if environment is None:
+                # Unreachable: nothing is typed, nothing is specialized
+                break
+            infer = self.statements.get(type(statement))
+            if infer is None:
+                raise MiniScriptError(f"Cannot infer types for {statement.type}")
+            environment = infer(statement, environment)
+        return environment
+
+    # Statements; each returns the environment after it, or None if control never leaves it
+
+    def infer_Assignment(self, node, environment):
+        self.assign(environment, node.variable.value, self.infer_expression(node.expression, environment))
+        return environment
+
+    def infer_PrintStatement(self, node, environment):
+        for expression in node.expression:
+            self.infer_expression(expression, environment)
+        return environment
+
+    def infer_ReturnStatement(self, node, environment):
+        if node.expression is not None:
+            self.infer_expression(node.expression, environment)
+        return None
+
+    def infer_BreakStatement(self, node, environment):
+        if self.loops:
+            self.loops[-1][1].append(environment)
+        return None
+
+    def infer_ContinueStatement(self, node, environment):
+        if self.loops:
+            self.loops[-1][0].append(environment)
+        return None
+
+    def infer_IfStatement(self, node, environment):
+        self.infer_expression(node.condition, environment)
+        then_environment = self.infer_block(node.then_statement, dict(environment))
+        return join(then_environment, self.infer_block(node.else_statement or (), environment))
+
+    def infer_WhileStatement(self, node, environment):
+        head = environment
+        while True:
+            self.infer_expression(node.condition, head)
+            back, breaks = self.infer_loop_body(node.statement, dict(head))
+            next_head = join(environment, back)
+            if next_head == head:
+                break
+            head = next_head
+        for exit_environment in breaks:
+            head = join(head, exit_environment)
+        return head
+
+    def infer_ForStatement(self, node, environment):
+        for argument in node.range_expression.arguments:
+            self.infer_expression(argument, environment)
+        variable = node.loop_variable.value
+        head = environment
+        while True:
+            body = dict(head)
+            # range() only produces ints
+            self.assign(body, variable, 'int')
+            back, breaks = self.infer_loop_body(node.statement, body)
+            next_head = join(environment, back)
+            if next_head == head:
+                break
+            head = next_head
+        for exit_environment in breaks:
+            head = join(head, exit_environment)
+        return head
+
+    def infer_loop_body(self, statements, environment):
+        """(environment back at the loop head, environments at each break)."""
+        self.loops.append(([], []))
+        back = self.infer_block(statements, environment)
+        continues, breaks = self.loops.pop()
+        for continue_environment in continues:
+            back = join(back, continue_environment)
+        return back, breaks
+
+    # Expressions
+
+    def infer_expression(self, expression, environment):
+        """Type `expression` and every expression in it; returns its type.
+
+        Uses an explicit stack: a long operator chain is a tree as deep as
+        it is long.
+        """
+        types = []
+        stack = [(expression, False)]
+        while stack:
+            node, operands_done = stack.pop()
+            if isinstance(node, Term):
+                if not operands_done:
+                    stack += ((node, True), (node.right, False), (node.left, False))
+                    continue
+                right = types.pop()
+                type_ = operation_type(node.operator, types.pop(), right)
+            elif isinstance(node, UnaryTerm):
+                if not operands_done:
+                    stack += ((node, True), (node.operand, False))
+                    continue
+                type_ = unary_type(node.operator, types.pop())
+            elif isinstance(node, Identifier):
+                type_ = environment.get(node.value)
+            else:
+                types.append(self.type_of(node))
+                continue
+            self.record(node, type_)
+            types.append(type_)
+        return types[0]
+
+
+def infer_types(statements):
+    """A TypeInference holding the type of every expression in `statements`."""
+    return TypeInference().infer(statements)
@@ -0,0 +1,465 @@
+"""Three-address intermediate representation and its control-flow graph.
+
+lower() flattens the syntax tree into basic blocks of instructions with at
+most one operator each, for example
+
+    b1:  %0 = x < 10            (x is live in, %0 a temporary)
+         branch %0 -> b2, b3
+
+so analyses walk a flat list and an explicit graph instead of re-walking
+nested if and while statements. The graph computes its reverse postorder,
+dominator tree, liveness and def-use chains on first use and keeps them.
+"""
+from .the_project import (Assignment, BooleanLiteral, BreakStatement, ContinueStatement, ForStatement,
+                         Identifier, IfStatement, MiniScriptError, NullLiteral, Number, PrintStatement,
+                         ReturnStatement, StringLiteral, Term, UnaryTerm, WhileStatement)
+from .vm import format_value
+
+# Instructions ending a block; the block's successors say where they go.
+# branch goes to successors[0] when its operand is true, else successors[1];
+# next assigns the iterator's next value and goes to successors[0], or to
+# successors[1] once it is exhausted.
+TERMINATORS = {'jump', 'branch', 'next', 'return'}
+
+UNARY_OPERATORS = {'not': 'not', '-': 'neg'}
+
+
+class Const:
+    """A constant operand; variables and temporaries are plain names."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Const) and type(self.value) is type(other.value) and self.value == other.value
+
+    def __hash__(self):
+        return hash((type(self.value), self.value))
+
+    def __repr__(self):
+        return f'Const({self.value!r})'
+
+    def __str__(self):
+        return repr(self.value) if isinstance(self.value, str) else format_value(self.value)
+
+
+class Instruction:
+    """`dest = op args`. `dest` is None for instructions that assign nothing."""
+
+    __slots__ = ('op', 'dest', 'args', 'offset')
+
+    def __init__(self, op, dest, args, offset=None):
+        self.op = op
+        self.dest = dest
+        self.args = args
+        self.offset = offset
+
+    def uses(self):
+        """Names this instruction reads."""
+        return [arg for arg in self.args if isinstance(arg, str)]
+
+    def __str__(self):
+        args = [str(arg) for arg in self.args]
+        if self.op == 'copy':
+            text = args[0]
+        elif len(args) == 2 and self.op not in TERMINATORS and self.op not in ('print', 'range'):
+            # == keeps an equality test apart from the assignment around it
+            text = f"{args[0]} {'==' if self.op == '=' else self.op} {args[1]}"
+        else:
+            text = f'{self.op} {", ".join(args)}'.rstrip()
+        return f'{self.dest} = {text}' if self.dest is not None else text
+
+
+class Block:
+    __slots__ = ('index', 'instructions', 'successors', 'predecessors')
+
+    def __init__(self, index):
+        self.index = index
+        self.instructions = []
+        self.successors = []
+        self.predecessors = []
+
+    @property
+    def terminator(self):
+        return self.instructions[-1] if self.instructions else None
+
+    def __repr__(self):
+        return f'b{self.index}'
+
+
+class Lowering:
+    """Lower a parsed program (a list of statements) to basic blocks."""
+
+    def __init__(self):
+        self.blocks = []
+        self.current = self.new_block()
+        self.temporaries = 0
+        # (continue target, break target) per enclosing loop
+        self.loops = []
+        self.offset = None
+        self.statements = {
+            PrintStatement: self.lower_PrintStatement,
+            IfStatement: self.lower_IfStatement,
+            WhileStatement: self.lower_WhileStatement,
+            ForStatement: self.lower_ForStatement,
+            Assignment: self.lower_Assignment,
+            BreakStatement: self.lower_BreakStatement,
+            ContinueStatement: self.lower_ContinueStatement,
+            ReturnStatement: self.lower_ReturnStatement
+        }
+
+    def lower(self, statements):
+        self.lower_block(statements)
+        self.terminate('return', ())
+        return ControlFlowGraph(self.blocks)
+
+    def new_block(self):
+        block = Block(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def temporary(self):
+        name = f'%{self.temporaries}'
+        self.temporaries += 1
+        return name
+
+    def emit(self, op, dest, *args):
+        self.block().instructions.append(Instruction(op, dest, args, self.offset))
+        return dest
+
+    def block(self):
+        """The block being filled; code after a jump or return starts an unreachable one."""
+        if self.current is None:
+            self.current = self.new_block()
+        return self.current
+
+    def terminate(self, op, args, *successors, dest=None):
+        block = self.block()
+        block.instructions.append(Instruction(op, dest, tuple(args), self.offset))
+        block.successors.extend(successors)
+        self.current = None
+
+    def jump(self, target):
+        self.terminate('jump', (), target)
+
+    def lower_block(self, statements):
+        for statement in statements:
+            lower = self.statements.get(type(statement))
+            if lower is None:
+                raise MiniScriptError(f"Cannot generate code for {statement.type}")
+            self.offset = getattr(statement, 'offset', None)
+            lower(statement)
+
+    def lower_PrintStatement(self, node):
+        self.emit('print', None, *[self.lower_expression(expression) for expression in node.expression])
+
+    def lower_Assignment(self, node):
+        value = self.lower_expression(node.expression)
+        self.emit('copy', node.variable.value, value)
+
+    def lower_IfStatement(self, node):
+        condition = self.lower_expression(node.condition)
+        then_block, after = self.new_block(), self.new_block()
+        else_block = self.new_block() if node.else_statement else after
+        self.terminate('branch', (condition,), then_block, else_block)
+        self.current = then_block
+        self.lower_block(node.then_statement)
+        self.jump(after)
+        if node.else_statement:
+            self.current = else_block
+            self.lower_block(node.else_statement)
+            self.jump(after)
+        self.current = after
+
+    def lower_WhileStatement(self, node):
+        header = self.new_block()
+        self.jump(header)
+        self.current = header
+        condition = self.lower_expression(node.condition)
+        body, after = self.new_block(), self.new_block()
+        self.terminate('branch', (condition,), body, after)
+        self.loops.append((header, after))
+        self.current = body
+        self.lower_block(node.statement)
+        self.loops.pop()
+        self.jump(header)
+        self.current = after
+
+    def lower_ForStatement(self, node):
+        arguments = [self.lower_expression(argument) for argument in node.range_expression.arguments]
+        iterator = self.emit('range', self.temporary(), *arguments)
+        header = self.new_block()
+        self.jump(header)
+        self.current = header
+        body, after = self.new_block(), self.new_block()
+        self.terminate('next', (iterator,), body, after, dest=node.loop_variable.value)
+        self.loops.append((header, after))
+        self.current = body
+        self.lower_block(node.statement)
+        self.loops.pop()
+        self.jump(header)
+        self.current = after
+
+    def lower_BreakStatement(self, node):
+        if not self.loops:
+            raise MiniScriptError("'break' outside loop")
+        self.jump(self.loops[-1][1])
+
+    def lower_ContinueStatement(self, node):
+        if not self.loops:
+            raise MiniScriptError("'continue' outside loop")
+        self.jump(self.loops[-1][0])
+
+    def lower_ReturnStatement(self, node):
+        if node.expression is None:
+            self.terminate('return', ())
+        else:
+            self.terminate('return', (self.lower_expression(node.expression),))
+
+    def lower_expression(self, node):
+        """Emit `node`'s instructions; returns the operand holding its value."""
+        # Walk down the left spine iteratively, as the code generator does
+        spine = []
+        while isinstance(node, Term):
+            spine.append(node)
+            node = node.left
+        left = self.lower_operand(node)
+        for term in reversed(spine):
+            operator = term.operator
+            if operator == 'and' or operator == 'or':
+                # result = left; if it decides the outcome skip the right operand
+                result = self.emit('copy', self.temporary(), left)
+                right_block, after = self.new_block(), self.new_block()
+                targets = (right_block, after) if operator == 'and' else (after, right_block)
+                self.terminate('branch', (result,), *targets)
+                self.current = right_block
+                self.emit('copy', result, self.lower_expression(term.right))
+                self.jump(after)
+                self.current = after
+                left = result
+            else:
+                right = self.lower_expression(term.right)
+                left = self.emit(operator, self.temporary(), left, right)
+        return left
+
+    def lower_operand(self, node):
+        if isinstance(node, Identifier):
+            return node.value
+        if isinstance(node, (Number, StringLiteral, BooleanLiteral, NullLiteral)):
+            return Const(node.value)
+        if isinstance(node, UnaryTerm):
+            operand = self.lower_expression(node.operand)
+            return self.emit(UNARY_OPERATORS[node.operator], self.temporary(), operand)
+        raise MiniScriptError(f"Cannot generate code for {node.type}")
+
+
+class ControlFlowGraph:
+    """Basic blocks reachable from the entry, blocks[0], and their edges.
+
+    The analyses below are computed on first use and cached; they are only
+    valid while the graph is not changed.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.remove_unreachable()
+        self._order = None
+        self._dominators = None
+        self._liveness = None
+        self._def_use = None
+
+    @property
+    def entry(self):
+        return self.blocks[0]
+
+    def remove_unreachable(self):
+        """Drop blocks the entry cannot reach, renumber the rest and link predecessors."""
+        reachable = {id(self.blocks[0])}
+        stack = [self.blocks[0]]
+        while stack:
+            for successor in stack.pop().successors:
+                if id(successor) not in reachable:
+                    reachable.add(id(successor))
+                    stack.append(successor)
+        self.blocks = [block for block in self.blocks if id(block) in reachable]
+        for index, block in enumerate(self.blocks):
+            block.index = index
+            block.predecessors = []
+        for block in self.blocks:
+            for successor in block.successors:
+                successor.predecessors.append(block)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def instructions(self):
+        """Yield (block, index in block, instruction) for every instruction."""
+        for block in self.blocks:
+            for index, instruction in enumerate(block.instructions):
+                yield block, index, instruction
+
+    # Analyses
+
+    def reverse_postorder(self):
+        """Blocks ordered so that, back edges aside, a block comes after its predecessors."""
+        if self._order is None:
+            blocks = self.blocks
+            order = []
+            visited = [False] * len(blocks)
+            visited[0] = True
+            # Depth-first with a stack of block indices and, per block, the
+            # next successor to try: no per-step allocation
+            next_successor = [0] * len(blocks)
+            stack = [0]
+            while stack:
+                index = stack[-1]
+                successors = blocks[index].successors
+                position = next_successor[index]
+                while position < len(successors) and visited[successors[position].index]:
+                    position += 1
+                if position < len(successors):
+                    next_successor[index] = position + 1
+                    successor = successors[position].index
+                    visited[successor] = True
+                    stack.append(successor)
+                else:
+                    stack.pop()
+                    order.append(blocks[index])
+            order.reverse()
+            self._order = order
+        return self._order
+
+    def dominators(self):
+        """Immediate dominator of each block, by block index; the entry's is itself.
+
+        The iterative algorithm of Cooper, Harvey and Kennedy over reverse
+        postorder, which settles in a couple of passes on the reducible
+        graphs structured code produces.
+        """
+        if self._dominators is None:
+            order = self.reverse_postorder()
+            position = [0] * len(self.blocks)
+            for number, block in enumerate(order):
+                position[block.index] = number
+            idom = [None] * len(self.blocks)
+            idom[0] = 0
+
+            def intersect(a, b):
+                while a != b:
+                    while position[a] > position[b]:
+                        a = idom[a]
+                    while position[b] > position[a]:
+                        b = idom[b]
+                return a
+
+            changed = True
+            while changed:
+                changed = False
+                for block in order[1:]:
+                    new = None
+                    for predecessor in block.predecessors:
+                        if idom[predecessor.index] is not None:
+                            new = predecessor.index if new is None else intersect(predecessor.index, new)
+                    if idom[block.index] != new:
+                        idom[block.index] = new
+                        changed = True
+            self._dominators = idom
+        return self._dominators
+
+    def dominates(self, a, b):
+        """Whether every path from the entry to block `b` passes through block `a`."""
+        idom = self.dominators()
+        a, b = a.index, b.index
+        while b != a and b != 0:
+            b = idom[b]
+        return b == a
+
+    def liveness(self):
+        """(live in, live out) frozensets of names of each block, by block index.
+
+        A worklist pass: a block is revisited only when the live-in set of a
+        successor grew, so the work follows the size of the live sets rather
+        than the number of names in the program.
+        """
+        if self._liveness is None:
+            uses = []
+            defines = []
+            for block in self.blocks:
+                used = set()
+                defined = set()
+                for instruction in block.instructions:
+                    for name in instruction.uses():
+                        if name not in defined:
+                            used.add(name)
+                    if instruction.dest is not None:
+                        defined.add(instruction.dest)
+                uses.append(frozenset(used))
+                defines.append(frozenset(defined))
+            empty = frozenset()
+            live_in = [empty] * len(self.blocks)
+            live_out = [empty] * len(self.blocks)
+            # Popping the reverse postorder visits successors before predecessors
+            worklist = [block.index for block in self.reverse_postorder()]
+            pending = [True] * len(self.blocks)
+            while worklist:
+                index = worklist.pop()
+                pending[index] = False
+                block = self.blocks[index]
+                successors = block.successors
+                if len(successors) == 1:
+                    out = live_in[successors[0].index]
+                else:
+                    out = empty.union(*(live_in[successor.index] for successor in successors))
+                live_out[index] = out
+                incoming = uses[index] | (out - defines[index])
+                if incoming != live_in[index]:
+                    live_in[index] = incoming
+                    for predecessor in block.predecessors:
+                        if not pending[predecessor.index]:
+                            pending[predecessor.index] = True
+                            worklist.append(predecessor.index)
+            self._liveness = live_in, live_out
+        return self._liveness
+
+    def def_use(self):
+        """(definitions, uses): each name's list of (block, instruction index)."""
+        if self._def_use is None:
+            definitions = {}
+            uses = {}
+            for block, index, instruction in self.instructions():
+                for name in instruction.uses():
+                    uses.setdefault(name, []).append((block, index))
+                if instruction.dest is not None:
+                    definitions.setdefault(instruction.dest, []).append((block, index))
+            self._def_use = definitions, uses
+        return self._def_use
+
+    def format(self, analyses=True):
+        """The graph as text; with `analyses`, each block's dominator and live names."""
+        lines = []
+        if analyses:
+            idom = self.dominators()
+            live_in, live_out = self.liveness()
+        for block in self.blocks:
+            header = f'b{block.index}:'
+            if block.predecessors:
+                header += f'  <- {", ".join(repr(p) for p in block.predecessors)}'
+            if analyses:
+                if block.index:
+                    header += f'  idom b{idom[block.index]}'
+                if live_in[block.index]:
+                    header += f'  live in {{{", ".join(sorted(live_in[block.index]))}}}'
+            lines.append(header)
+            for instruction in block.instructions:
+                text = str(instruction)
+                if block.successors and instruction is block.terminator:
+                    text += ' -> ' + ', '.join(repr(successor) for successor in block.successors)
+                lines.append(f'    {text}')
+        return '\n'.join(lines)
+
+
+def lower(statements):
+    """Lower `statements` to a ControlFlowGraph."""
+    return Lowering().lower(statements)
@@ -0,0 +1,328 @@
+"""Table-driven LL(1) recognizer for MiniScript.
+
+The grammar below is checked for LL(1) conflicts and compiled to a parse
+table; parse_ll1() validates a token stream against it with an explicit
+stack and no syntax tree, so it accepts nesting of any depth.
+"""
+from array import array
+
+from .the_project import ParseError, TOKEN_TYPES
+
+EPSILON = 'ε'
+END = '$'
+
+# Operators joined with an '=' written directly after them
+JOINED_OPERATORS = {'<', '>', '=', '+', '-', '*', '/'}
+
+# MiniScript as an LL(1) grammar. Terminals are token texts, plus the token
+# classes identifier, number and string, and bare_return for a return with
+# nothing after it on the same line. Like the Pratt parser, the terminal
+# mapping joins an operator and an '=' written right after it (<=, +=, ...)
+# and a float written as number . number into single terminals. Operator
+# precedence follows the Pratt parser in the_project.py: or < and < not <
+# comparisons < + - < * / < unary minus, and as in Python `not` cannot
+# appear inside an arithmetic operand.
+MINISCRIPT_GRAMMAR = """
+program -> statements
+statements -> statement statements | ; statements | ε
+block -> { statements }
+statement -> identifier assign_op expression
+    | print print_args
+    | if_statement
+    | while expression block
+    | for identifier in range ( expression range_stop ) block
+    | break
+    | continue
+    | return expression
+    | bare_return
+assign_op -> = | += | -= | *= | /=
+print_args -> ( print_list ) | print_value
+print_list -> expression print_more | ε
+print_more -> , expression print_more | ε
+print_value -> not negation conjunction_tail disjunction_tail
+    | print_unary product_tail sum_tail comparison_tail conjunction_tail disjunction_tail
+print_unary -> - unary | print_factor
+print_factor -> identifier | number | string | true | false | null
+if_statement -> if expression block else_part
+else_part -> else else_body | ε
+else_body -> block | if_statement
+range_stop -> , expression range_step | ε
+range_step -> , expression | ε
+expression -> conjunction disjunction_tail
+disjunction_tail -> or conjunction disjunction_tail | ε
+conjunction -> negation conjunction_tail
+conjunction_tail -> and negation conjunction_tail | ε
+negation -> not negation | comparison
+comparison -> sum comparison_tail
+comparison_tail -> comparison_op sum comparison_tail | ε
+comparison_op -> < | > | = | <= | >= | ==
+sum -> product sum_tail
+sum_tail -> + product sum_tail | - product sum_tail | ε
+product -> unary product_tail
+product_tail -> * unary product_tail | / unary product_tail | ε
+unary -> - unary | factor
+factor -> identifier | number | string | true | false | null | ( expression )
+"""
+
+
+class Grammar:
+    """Context-free grammar with FIRST/FOLLOW sets and LL(1) conflict checks."""
+
+    def __init__(self, productions, start=None):
+        self.productions = [(lhs, tuple(rhs)) for lhs, rhs in productions]
+        self.nonterminals = list(dict.fromkeys(lhs for lhs, _ in self.productions))
+        self.start = start or self.nonterminals[0]
+        nonterminals = set(self.nonterminals)
+        symbols = {symbol for _, rhs in self.productions for symbol in rhs}
+        self.terminals = sorted(symbols - nonterminals) + [END]
+        self.nullable = self.compute_nullable()
+        self.first = self.compute_first()
+        self.follow = self.compute_follow()
+
+    @classmethod
+    def from_text(cls, text, start=None):
+        """Read `lhs -> a b | c` rules; continuation lines start with `|`."""
+        productions = []
+        lhs = None
+        for line in text.strip().splitlines():
+            line = line.strip()
+            if '->' in line:
+                lhs, line = (part.strip() for part in line.split('->', 1))
+            elif line.startswith('|'):
+                line = line[1:]
+            for alternative in line.split('|'):
+                rhs = alternative.split()
+                productions.append((lhs, [] if rhs == [EPSILON] else rhs))
+        return cls(productions, start)
+
+    @classmethod
+    def from_parse_table(cls, parse_table, start=None):
+        """Build a grammar from a {nonterminal: {terminal: 'rhs'}} parse table."""
+        productions = []
+        for lhs, row in parse_table.items():
+            for rhs in dict.fromkeys(row.values()):
+                productions.append((lhs, rhs.split()))
+        return cls(productions, start)
+
+    def compute_nullable(self):
+        nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                if lhs not in nullable and all(symbol in nullable for symbol in rhs):
+                    nullable.add(lhs)
+                    changed = True
+        return nullable
+
+    def compute_first(self):
+        first = {nonterminal: set() for nonterminal in self.nonterminals}
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                before = len(first[lhs])
+                first[lhs] |= self.first_of(rhs, first)[0]
+                changed = changed or len(first[lhs]) != before
+        return first
+
+    def first_of(self, symbols, first=None):
+        """Return (FIRST set, nullable) for a sequence of grammar symbols."""
+        first = self.first if first is None else first
+        result = set()
+        for symbol in symbols:
+            if symbol not in first:
+                result.add(symbol)
+                return result, False
+            result |= first[symbol]
+            if symbol not in self.nullable:
+                return result, False
+        return result, True
+
+    def compute_follow(self):
+        follow = {nonterminal: set() for nonterminal in self.nonterminals}
+        follow[self.start].add(END)
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                for i, symbol in enumerate(rhs):
+                    if symbol not in follow:
+                        continue
+                    before = len(follow[symbol])
+                    rest_first, rest_nullable = self.first_of(rhs[i + 1:])
+                    follow[symbol] |= rest_first
+                    if rest_nullable:
+                        follow[symbol] |= follow[lhs]
+                    changed = changed or len(follow[symbol]) != before
+        return follow
+
+    def predict(self, index):
+        """Terminals that select production `index` in the LL(1) table."""
+        lhs, rhs = self.productions[index]
+        first, nullable = self.first_of(rhs)
+        return first | self.follow[lhs] if nullable else first
+
+    def build_table(self):
+        """Return ({(nonterminal, terminal): production}, conflicts).
+
+        Each conflict is (nonterminal, terminal, [production indices]) for a
+        table cell more than one production predicts.
+        """
+        cells = {}
+        for index in range(len(self.productions)):
+            lhs = self.productions[index][0]
+            for terminal in self.predict(index):
+                cells.setdefault((lhs, terminal), []).append(index)
+        table = {cell: indices[0] for cell, indices in cells.items()}
+        conflicts = [(lhs, terminal, indices) for (lhs, terminal), indices in cells.items() if len(indices) > 1]
+        return table, conflicts
+
+    def format_production(self, index):
+        lhs, rhs = self.productions[index]
+        return f"{lhs} -> {' '.join(rhs) or EPSILON}"
+
+    def compile(self):
+        table, conflicts = self.build_table()
+        if conflicts:
+            lhs, terminal, indices = conflicts[0]
+            raise ValueError(f"Grammar is not LL(1): {len(conflicts)} conflicts, first on "
+                             f"({lhs}, {terminal}): "
+                             + '; '.join(self.format_production(index) for index in indices))
+        return LL1Table(self, table)
+
+
+class LL1Table:
+    """LL(1) parse table compiled to dense integer arrays.
+
+    Terminals are numbered 0..T-1 and nonterminals T..T+N-1, so one
+    comparison tells them apart on the parse stack. `table` holds the
+    production index for row nonterminal, column terminal (or -1), and
+    `expansions[p]` is production p's right-hand side reversed, ready to be
+    pushed onto the stack.
+    """
+
+    def __init__(self, grammar, table):
+        self.grammar = grammar
+        self.terminals = grammar.terminals
+        self.terminal_ids = {terminal: i for i, terminal in enumerate(self.terminals)}
+        self.nonterminal_ids = {nonterminal: len(self.terminals) + i
+                                for i, nonterminal in enumerate(grammar.nonterminals)}
+        width = len(self.terminals)
+        self.table = array('i', [-1]) * (len(grammar.nonterminals) * width)
+        for (lhs, terminal), production in table.items():
+            row = self.nonterminal_ids[lhs] - width
+            self.table[row * width + self.terminal_ids[terminal]] = production
+        symbol_ids = {**self.terminal_ids, **self.nonterminal_ids}
+        self.expansions = [tuple(symbol_ids[symbol] for symbol in reversed(rhs))
+                           for _, rhs in grammar.productions]
+
+    def terminals_of(self, tokens):
+        """Map a TokenBuffer to (terminal ids, token indices), whitespace dropped."""
+        terminal_ids = self.terminal_ids
+        identifier, number, string = (terminal_ids['identifier'], terminal_ids['number'],
+                                      terminal_ids['string'])
+        bare_return = terminal_ids['bare_return']
+        types = tokens.types
+        count = len(tokens)
+        ids = array('i')
+        positions = array('i')
+        pending_return = -1
+        newline = False
+        i = 0
+        while i < count:
+            token_type = types[i]
+            text = tokens.text_at(i)
+            start = i
+            i += 1
+            if token_type == TOKEN_TYPES['SYMBOL'] and text.isspace():
+                newline = newline or '\n' in text
+                continue
+            if pending_return >= 0 and (newline or text in ('}', ';')):
+                ids[pending_return] = bare_return
+            if token_type == TOKEN_TYPES['IDENTIFIER']:
+                terminal = identifier
+            elif token_type == TOKEN_TYPES['LITERAL'] and text[0].isdigit():
+                terminal = number
+                if (i + 1 < count and tokens.text_at(i) == '.'
+                        and types[i + 1] == TOKEN_TYPES['LITERAL'] and tokens.text_at(i + 1)[0].isdigit()):
+                    i += 2
+            elif token_type == TOKEN_TYPES['LITERAL'] and text[0] in '"\'':
+                terminal = string
+            else:
+                if text in JOINED_OPERATORS and i < count and tokens.text_at(i) == '=':
+                    text += '='
+                    i += 1
+                if text not in terminal_ids:
+                    line, column = tokens.position(start)
+                    raise ParseError(f"Unexpected {text!r} at line {line}, column {column}", tokens.starts[start])
+                terminal = terminal_ids[text]
+            pending_return = len(ids) if text == 'return' else -1
+            newline = False
+            ids.append(terminal)
+            positions.append(start)
+        if pending_return >= 0:
+            ids[pending_return] = bare_return
+        return ids, positions
+
+    def parse(self, tokens):
+        """Run the predictive parser over a TokenBuffer.
+
+        Returns the leftmost derivation as an array of production indices.
+        The parse stack is an explicit list, so nesting depth is limited by
+        memory rather than by the interpreter's recursion limit.
+        """
+        ids, positions = self.terminals_of(tokens)
+        end = self.terminal_ids[END]
+        ids.append(end)
+        width = len(self.terminals)
+        table = self.table
+        expansions = self.expansions
+        derivation = array('i')
+        stack = [end, self.nonterminal_ids[self.grammar.start]]
+        pos = 0
+        lookahead = ids[0]
+        while stack:
+            top = stack.pop()
+            if top < width:
+                if top != lookahead:
+                    raise self.error(tokens, positions, pos, [self.terminals[top]])
+                pos += 1
+                if pos < len(ids):
+                    lookahead = ids[pos]
+                continue
+            production = table[(top - width) * width + lookahead]
+            if production < 0:
+                row = (top - width) * width
+                expected = [self.terminals[t] for t in range(width) if table[row + t] >= 0]
+                raise self.error(tokens, positions, pos, expected)
+            derivation.append(production)
+            stack += expansions[production]
+        return derivation
+
+    def error(self, tokens, positions, pos, expected):
+        expected = ', '.join(repr(terminal) for terminal in expected)
+        if pos >= len(positions):
+            return ParseError(f"Expected {expected} at end of input")
+        line, column = tokens.position(positions[pos])
+        return ParseError(f"Expected {expected} at line {line}, column {column}: "
+                          f"{tokens.text_at(positions[pos])!r}", tokens.starts[positions[pos]])
+
+
+_miniscript_table = None
+
+def miniscript_table():
+    """The compiled MiniScript LL(1) table, built on first use."""
+    global _miniscript_table
+    if _miniscript_table is None:
+        _miniscript_table = Grammar.from_text(MINISCRIPT_GRAMMAR).compile()
+    return _miniscript_table
+
+def parse_ll1(tokens):
+    """Check a TokenBuffer against the MiniScript grammar without recursion.
+
+    This is a recognizer: it validates the input and returns the derivation
+    but builds no syntax tree. The compiler keeps using the Pratt parser,
+    which limits nesting to MAX_NESTING_DEPTH.
+    """
+    return miniscript_table().parse(tokens)
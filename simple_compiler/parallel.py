@@ -0,0 +1,180 @@
+"""Lex one large input across processes, split where no token can straddle.
+
+A STRING token runs from a quote to the next quote, so quotes pair up in
+order: a newline is inside a string literal exactly when an odd number of
+quotes comes before it and another quote after it. split_points() picks
+newlines outside strings and cuts at the end of the whitespace run holding
+each one. The serial lexer starts a token there too, so each segment lexes
+to exactly the tokens a lex of the whole input has in it.
+
+The workers never receive the text. An in-memory source is copied once into
+a multiprocessing.shared_memory block, and a file is mapped by each worker
+with mmap. Workers lex their segment in place with lex_range(), which
+reports offsets into the whole input, so stitching the segments together
+is a concatenation of their arrays.
+"""
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from .the_project import (BYTES_QUOTE_PATTERN, BYTES_TOKEN_PATTERN, BYTES_WORD_TYPES, QUOTE_PATTERN,
+                          TOKEN_PATTERN_SOURCE, TokenBuffer, lex_range, lexer)
+
+# Segments smaller than this are not worth a process round trip
+MIN_SEGMENT_SIZE = 1 << 20
+
+# Bytes counted at a time when counting the quotes of an mmap
+COUNT_CHUNK_SIZE = 1 << 22
+
+SPACE_RUN = re.compile(r'\s*')
+BYTES_SPACE_RUN = re.compile(rb'\s*')
+
+# An ASCII str is shared as its bytes, but lexed as a str: \s in a str
+# pattern also matches \x1c-\x1f
+ASCII_TOKEN_PATTERN = re.compile(TOKEN_PATTERN_SOURCE.replace(r'\s', r'[\s\x1c-\x1f]').encode(), re.VERBOSE)
+
+
+def count_quotes(source, start, end):
+    if isinstance(source, (str, bytes, bytearray)):
+        quotes = ('"', "'") if isinstance(source, str) else (b'"', b"'")
+        return source.count(quotes[0], start, end) + source.count(quotes[1], start, end)
+    # mmap and memoryview have no count()
+    count = 0
+    for position in range(start, end, COUNT_CHUNK_SIZE):
+        chunk = bytes(source[position:min(end, position + COUNT_CHUNK_SIZE)])
+        count += chunk.count(b'"') + chunk.count(b"'")
+    return count
+
+
+def split_points(source, segments):
+    """Offsets cutting `source` into at most `segments` pieces that lex independently.
+
+    The first offset is 0; each other one is the end of a whitespace run
+    holding a newline outside every string literal, at or after an equal
+    share of the input.
+    """
+    if isinstance(source, str):
+        newline, quote_pattern, space_run = '\n', QUOTE_PATTERN, SPACE_RUN
+    else:
+        newline, quote_pattern, space_run = b'\n', BYTES_QUOTE_PATTERN, BYTES_SPACE_RUN
+    size = len(source)
+    points = [0]
+    # Quotes in source[:position]
+    quotes = 0
+    position = 0
+    for segment in range(1, segments):
+        target = size * segment // segments
+        if target > position:
+            quotes += count_quotes(source, position, target)
+            position = target
+        while True:
+            if quotes % 2:
+                closing = quote_pattern.search(source, position)
+                if closing is not None:
+                    # Inside a string: resume after its closing quote
+                    quotes += 1
+                    position = closing.end()
+                    continue
+                # The last quote has no partner, so it starts no string
+            line_end = source.find(newline, position)
+            if line_end == -1:
+                return points
+            quotes += count_quotes(source, position, line_end)
+            position = line_end
+            if not quotes % 2 or quote_pattern.search(source, position) is None:
+                break
+        position = space_run.match(source, position).end()
+        if position >= size:
+            return points
+        points.append(position)
+    return points
+
+
+def lex_segment(reference, start, end):
+    """Lex source[start:end] of a shared source; returns its (types, starts, lengths) arrays.
+
+    `reference` is ('memory', shared memory name, ascii) or ('file', path).
+    """
+    if reference[0] == 'memory':
+        from multiprocessing import shared_memory
+
+        block = shared_memory.SharedMemory(reference[1])
+        source, close = block.buf, block.close
+        pattern = ASCII_TOKEN_PATTERN if reference[2] else BYTES_TOKEN_PATTERN
+    else:
+        with open(reference[1], 'rb') as file:
+            source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        close = source.close
+        pattern = BYTES_TOKEN_PATTERN
+    try:
+        tokens = lex_range(TokenBuffer(None), source, pattern, BYTES_WORD_TYPES, start, end)
+    finally:
+        # The shared memory view has to go before the block can close
+        del source
+        close()
+    return tokens.types, tokens.starts, tokens.lengths
+
+
+def segment_count(size, workers):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, size // MIN_SEGMENT_SIZE))
+
+
+def stitch(source, results):
+    tokens = TokenBuffer(source)
+    for types, starts, lengths in results:
+        tokens.types.extend(types)
+        tokens.starts.extend(starts)
+        tokens.lengths.extend(lengths)
+    return tokens
+
+
+def lex_shared(source, reference, points, workers):
+    ends = points[1:] + [len(source)]
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(points))) as executor:
+        return stitch(source, executor.map(lex_segment, [reference] * len(points), points, ends))
+
+
+def parallel_lexer(code, workers=None):
+    """Tokenize `code` (a str or bytes-like object) like lexer(), with `workers` processes.
+
+    `workers` defaults to the number of CPUs. Inputs too small to split,
+    and a str that is not pure ASCII (shared as bytes, its offsets would
+    not be character offsets), are lexed in this process.
+    """
+    segments = segment_count(len(code), workers)
+    if isinstance(code, str) and not code.isascii():
+        segments = 1
+    points = split_points(code, segments) if segments > 1 else [0]
+    if len(points) == 1:
+        return lexer(code)
+    from multiprocessing import shared_memory
+
+    data = code.encode('ascii') if isinstance(code, str) else code
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        block.buf[:len(data)] = data
+        del data
+        return lex_shared(code, ('memory', block.name, isinstance(code, str)), points, workers)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def parallel_lex_file(path, workers=None):
+    """Tokenize the file at `path` like lexer() tokenizes its mmap, with `workers` processes.
+
+    Every worker maps the file itself. The TokenBuffer's source is a
+    read-only mmap of the file.
+    """
+    with open(path, 'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            return lexer(b'')
+        source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    segments = segment_count(len(source), workers)
+    points = split_points(source, segments) if segments > 1 else [0]
+    if len(points) == 1:
+        return lexer(source)
+    return lex_shared(source, ('file', os.path.abspath(path)), points, workers)
@@ -0,0 +1,184 @@
+"""Per-phase instrumentation of a compile: time, sizes and memory of each phase.
+
+    profiler = Profiler(memory=True, cprofile='parse')
+    tokens = profiler.run('lex', lexer, source)
+    statements = profiler.run('parse', parse_Miniscript, tokens)
+    print(profiler.format())
+
+A disabled Profiler only calls through, so the pipeline can be written once
+and profiled on demand. tracemalloc, cProfile and json are only imported
+when asked for, so the CLI can always create one.
+"""
+import io
+import time
+
+from .the_project import AST, TokenBuffer, tree_size
+
+PHASES = ('lex', 'parse', 'semantic', 'optimize', 'codegen', 'run')
+
+# Functions listed for the cProfile'd phase
+CPROFILE_LIMIT = 25
+
+
+class Phase:
+    """What one phase cost; a phase run several times adds up."""
+
+    __slots__ = ('name', 'calls', 'seconds', 'tokens', 'nodes', 'peak_bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.tokens = 0
+        self.nodes = 0
+        self.peak_bytes = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def statement_list(value):
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], AST):
+        return value
+    return None
+
+
+class Profiler:
+    """Records wall time, token and node counts and peak memory per phase.
+
+    run(name, function, *arguments) times one call. Tokens are counted from
+    a TokenBuffer passed in or returned, nodes from the statements passed in
+    (or, failing that, returned), so the parser is credited with the tree it
+    builds and later phases with the tree they consume; count() adds what a
+    phase cannot show that way.
+
+    With `memory`, each phase runs under tracemalloc and records the peak of
+    what it allocated; tracing slows Python code several times over, so
+    compare times from runs without it. With `cprofile` set to a phase
+    name, that phase also runs under cProfile and `cprofile_stats` holds
+    its pstats.Stats.
+    """
+
+    def __init__(self, enabled=True, memory=False, cprofile=None):
+        self.enabled = enabled
+        self.memory = memory
+        self.cprofile = cprofile
+        self.cprofile_stats = None
+        self.phases = {}
+
+    def phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = Phase(name)
+        return self.phases[name]
+
+    def run(self, name, function, *arguments):
+        if not self.enabled:
+            return function(*arguments)
+        phase = self.phase(name)
+        tracing = False
+        if self.memory:
+            import tracemalloc
+
+            tracing = not tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        profile = None
+        if name == self.cprofile:
+            import cProfile
+
+            profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            if profile is not None:
+                result = profile.runcall(function, *arguments)
+            else:
+                result = function(*arguments)
+        finally:
+            # A phase that raises is still accounted for
+            phase.seconds += time.perf_counter() - start
+            phase.calls += 1
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                phase.peak_bytes = max(phase.peak_bytes or 0, peak)
+            if tracing:
+                tracemalloc.stop()
+            if profile is not None:
+                self.add_cprofile(profile)
+        for value in (*arguments, result):
+            if isinstance(value, TokenBuffer):
+                phase.tokens += len(value)
+                break
+        statements = next(filter(None, map(statement_list, arguments)), None) or statement_list(result)
+        if statements is not None:
+            phase.nodes += tree_size(statements)
+        return result
+
+    def count(self, name, tokens=0, nodes=0):
+        if self.enabled:
+            phase = self.phase(name)
+            phase.tokens += tokens
+            phase.nodes += nodes
+
+    def add_cprofile(self, profile):
+        import pstats
+
+        if self.cprofile_stats is None:
+            self.cprofile_stats = pstats.Stats(profile, stream=io.StringIO())
+        else:
+            self.cprofile_stats.add(profile)
+
+    # Reports
+
+    def total_seconds(self):
+        return sum(phase.seconds for phase in self.phases.values())
+
+    def format_cprofile(self, limit=CPROFILE_LIMIT):
+        """The `limit` functions of the cProfile'd phase with the most cumulative time."""
+        if self.cprofile_stats is None:
+            return ''
+        stream = io.StringIO()
+        self.cprofile_stats.stream = stream
+        self.cprofile_stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def report(self):
+        """The measurements as plain data, ready for json.dump."""
+        report = {
+            'total_seconds': self.total_seconds(),
+            'memory': self.memory,
+            'phases': [phase.to_dict() for phase in self.phases.values()],
+        }
+        if self.cprofile is not None:
+            report['cprofile'] = {'phase': self.cprofile, 'stats': self.format_cprofile()}
+        return report
+
+    def to_json(self, indent=2):
+        import json
+
+        return json.dumps(self.report(), indent=indent)
+
+    def rows(self):
+        """(phase, ms, share, tokens, nodes, peak) display rows, with a total."""
+        total = self.total_seconds()
+        rows = []
+        for phase in self.phases.values():
+            rows.append((phase.name, f"{phase.seconds * 1000:.2f}",
+                         f"{phase.seconds / total:.0%}" if total else '-',
+                         f"{phase.tokens:,}" if phase.tokens else '',
+                         f"{phase.nodes:,}" if phase.nodes else '',
+                         f"{phase.peak_bytes:,}" if phase.peak_bytes is not None else ''))
+        rows.append(('total', f"{total * 1000:.2f}", '100%' if total else '-', '', '', ''))
+        return rows
+
+    def format(self):
+        headers = ('phase', 'ms', 'share', 'tokens', 'nodes', 'peak bytes')
+        lines = [f"{headers[0]:<10}" + ''.join(f"{header:>12}" for header in headers[1:])]
+        for row in self.rows():
+            lines.append(f"{row[0]:<10}" + ''.join(f"{cell:>12}" for cell in row[1:]))
+        profile = self.format_cprofile()
+        if profile:
+            lines.append(f"\ncProfile of {self.cprofile}:{profile}")
+        return '\n'.join(lines)
@@ -0,0 +1,333 @@
+"""Compile server: JSON-RPC 2.0 over stdio or a Unix socket.
+
+Each message is one JSON object on one line. Requests name a document by
+`uri` and `version` and carry its `text`; a document already seen at that
+version may be named without the text and its parse is reused. Methods:
+
+    lex      -> {"tokens": [[type, text, offset], ...]}
+    parse    -> {"statements": [str, ...]}
+    check    -> {"diagnostics": [{"code", "severity", "message", "line", "column", "offset"}, ...]}
+    compile  -> {"code": disassembly, "output": printed text if "run" is true}
+                (a run stopped after the server's step budget is an error)
+    stats    -> document cache statistics
+    shutdown -> stops the server
+
+Every result carries "elapsed_ms", the time the server spent on the request,
+and "cached", whether the parse came from the document cache.
+"""
+import asyncio
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .the_project import TOKEN_NAMES, CodeOptimization, MiniScriptError, SemanticAnalyzer, lexer, parse_Miniscript
+from .vm import VM, generate_code
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+COMPILE_ERROR = 1
+
+DEFAULT_CACHE_SIZE = 64
+
+# Longest request line accepted, in bytes
+MAX_MESSAGE_SIZE = 64 << 20
+
+# Instructions a "run" may execute before it is stopped, so a program that
+# never ends cannot hold a worker thread for good
+DEFAULT_MAX_STEPS = 10_000_000
+
+
+class RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class Document:
+    """One version of a source text, with its stages computed on first use."""
+
+    __slots__ = ('text', 'tokens', 'statements', 'error', 'diagnostics', 'symbol_table', 'bytecode')
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = lexer(text)
+        self.statements = None
+        self.error = None
+        try:
+            self.statements = parse_Miniscript(self.tokens)
+        except MiniScriptError as error:
+            self.error = error
+        self.diagnostics = None
+        self.symbol_table = None
+        # Bytecode per optimization level
+        self.bytecode = {}
+
+    def parsed(self):
+        if self.error is not None:
+            raise RequestError(COMPILE_ERROR, str(self.error))
+        return self.statements
+
+    def analyze(self):
+        if self.diagnostics is None:
+            analyzer = SemanticAnalyzer(lines=self.tokens.line_index())
+            diagnostics = analyzer.analyze(self.parsed())
+            self.symbol_table = analyzer.symbol_table
+            self.diagnostics = diagnostics
+        return self.diagnostics
+
+    def compile(self, level):
+        if level not in self.bytecode:
+            diagnostics = self.analyze()
+            errors = [diagnostic for diagnostic in diagnostics if diagnostic.severity == 'error']
+            if errors:
+                raise RequestError(COMPILE_ERROR, f"Semantic analysis found {len(errors)} error(s)")
+            statements = CodeOptimization(level).optimize(self.statements)
+            self.bytecode[level] = generate_code(statements, self.symbol_table)
+        return self.bytecode[level]
+
+
+class DocumentCache:
+    """The most recently used documents, keyed by (uri, version)."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            document = self.documents.get(key)
+            if document is None:
+                self.misses += 1
+                return None
+            self.documents.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def put(self, key, document):
+        with self.lock:
+            self.documents[key] = document
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.max_entries:
+                self.documents.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'documents': len(self.documents), 'hits': self.hits, 'misses': self.misses}
+
+
+class CompileServer:
+    """Answers compile requests; `serve_stdio` and `serve_unix` run it.
+
+    Requests are decoded on the event loop and computed on its default
+    thread pool, so a slow compile does not hold up reading, answering or
+    other connections.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, max_steps=DEFAULT_MAX_STEPS):
+        self.documents = DocumentCache(cache_size)
+        self.max_steps = max_steps
+        self.methods = {
+            'lex': self.lex,
+            'parse': self.parse,
+            'check': self.check,
+            'compile': self.compile,
+            'stats': self.stats,
+        }
+        self.stopped = None
+        # Task answering the shutdown request, once one arrives
+        self.shutdown_task = None
+        # Open streams and the tasks serving them
+        self.writers = set()
+        self.connections = set()
+
+    # Methods, run on worker threads
+
+    def document(self, params):
+        """The Document named by `params`, from the cache or built from its text."""
+        uri = params.get('uri', '')
+        text = params.get('text')
+        version = params.get('version')
+        if not isinstance(uri, str):
+            raise RequestError(INVALID_PARAMS, "'uri' must be a string")
+        if version is not None and (type(version) is not int and not isinstance(version, str)):
+            raise RequestError(INVALID_PARAMS, "'version' must be a string or an integer")
+        if version is None:
+            if not isinstance(text, str):
+                raise RequestError(INVALID_PARAMS, "need 'text' or a 'version' seen before")
+            version = hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+        document = self.documents.get((uri, version))
+        if document is not None:
+            return document, True
+        if not isinstance(text, str):
+            raise RequestError(INVALID_PARAMS, f"unknown version {version!r} of {uri!r} and no 'text'")
+        document = Document(text)
+        self.documents.put((uri, version), document)
+        return document, False
+
+    def lex(self, params):
+        document, cached = self.document(params)
+        tokens = document.tokens
+        rows = []
+        for i in range(len(tokens)):
+            text = tokens.text_at(i)
+            if params.get('all') or not text.isspace():
+                rows.append([TOKEN_NAMES[tokens.types[i]], text, tokens.starts[i]])
+        return {'tokens': rows}, cached
+
+    def parse(self, params):
+        document, cached = self.document(params)
+        return {'statements': [str(statement) for statement in document.parsed()]}, cached
+
+    def check(self, params):
+        document, cached = self.document(params)
+        return {'diagnostics': [diagnostic.to_dict() for diagnostic in document.analyze()]}, cached
+
+    def compile(self, params):
+        document, cached = self.document(params)
+        level = params.get('optimize', 1)
+        # bool is an int, and True == 1
+        if type(level) is not int or level not in (0, 1, 2):
+            raise RequestError(INVALID_PARAMS, f"optimize must be 0, 1 or 2, not {level!r}")
+        bytecode = document.compile(level)
+        result = {'code': bytecode.disassemble()}
+        if params.get('run'):
+            output = []
+            try:
+                VM(output.append, self.max_steps).run(bytecode)
+            except MiniScriptError as error:
+                raise RequestError(COMPILE_ERROR, f"Runtime error: {error}")
+            result['output'] = ''.join(output)
+        return result, cached
+
+    def stats(self, params):
+        return self.documents.stats(), False
+
+    # Protocol
+
+    def call(self, method, params):
+        start = time.perf_counter()
+        result, cached = self.methods[method](params)
+        result['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        result['cached'] = cached
+        return result
+
+    async def handle(self, line):
+        """Answer one request line; returns the response, or None for a notification."""
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return error_response(None, PARSE_ERROR, f"invalid JSON: {error}")
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return error_response(None, INVALID_REQUEST, "expected an object with a 'method'")
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params', {})
+        if method == 'shutdown':
+            self.shutdown_task = asyncio.current_task()
+            response = {'jsonrpc': '2.0', 'id': request_id, 'result': None}
+        elif method not in self.methods:
+            response = error_response(request_id, METHOD_NOT_FOUND, f"unknown method {method!r}")
+        elif not isinstance(params, dict):
+            response = error_response(request_id, INVALID_PARAMS, "params must be an object")
+        else:
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(None, self.call, method, params)
+                response = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+            except RequestError as error:
+                response = error_response(request_id, error.code, str(error))
+            except (MiniScriptError, RecursionError) as error:
+                response = error_response(request_id, COMPILE_ERROR, str(error))
+            except Exception as error:
+                # A bug, not a bad program: still answer, so the client is not left waiting
+                response = error_response(request_id, INTERNAL_ERROR, f"internal error: {error!r}")
+        return response if 'id' in request else None
+
+    async def connection(self, reader, writer):
+        """Serve one stream until it closes, answering requests concurrently."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+        self.connections.add(asyncio.current_task())
+        self.writers.add(writer)
+
+        async def answer(line):
+            response = await self.handle(line)
+            shutdown = self.shutdown_task is asyncio.current_task()
+            try:
+                if shutdown:
+                    # Finish what was asked before the shutdown, whatever became of it
+                    await asyncio.gather(*(tasks - {asyncio.current_task()}), return_exceptions=True)
+                if response is not None:
+                    async with write_lock:
+                        writer.write(json.dumps(response).encode() + b'\n')
+                        await writer.drain()
+            finally:
+                if shutdown:
+                    self.stopped.set()
+
+        try:
+            while self.shutdown_task is None:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            self.connections.discard(asyncio.current_task())
+
+    async def serve_unix(self, path):
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_unix_server(self.connection, path, limit=MAX_MESSAGE_SIZE)
+        async with server:
+            await self.stopped.wait()
+            # Closing the other clients' streams ends their read loops
+            for writer in list(self.writers):
+                writer.close()
+            if self.connections:
+                await asyncio.wait(self.connections)
+
+    async def serve_stdio(self):
+        self.stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_MESSAGE_SIZE)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        serving = asyncio.create_task(self.connection(reader, writer))
+        stopped = asyncio.create_task(self.stopped.wait())
+        await asyncio.wait({serving, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        serving.cancel()
+        stopped.cancel()
+
+
+def error_response(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+def serve(socket_path=None, cache_size=DEFAULT_CACHE_SIZE):
+    """Run a CompileServer on `socket_path`, or on stdin/stdout, until shutdown."""
+    server = CompileServer(cache_size)
+    if socket_path is None:
+        asyncio.run(server.serve_stdio())
+    else:
+        asyncio.run(server.serve_unix(socket_path))
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1] if len(sys.argv) > 1 else None)
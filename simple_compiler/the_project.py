@@ -1,12 +1,16 @@
+import operator
 import re
-from tabulate import tabulate
+import sys
+import time
+from array import array
+from bisect import bisect_right
 
 # Define the regular expressions for recognizing MiniScript tokens
 KEYWORDS = r'\b(if|while|for|print|return|break|continue|else|in|range|and|or|not)\b'
 IDENTIFIERS = r'[a-zA-Z_][a-zA-Z_0-9]*'
 LITERALS = r'(\d+)|(["\']([^"\']|\\.)*["\']|true|false|null)'
 
-SYMBOLS = r'[+\-*/()=<>.,;:]|(\s+)|(\n)|(\r\n)|(\r)'
+SYMBOLS = r'[+\-*/()=<>.,;:{}]|(\s+)|(\n)|(\r\n)|(\r)'
 
 # Define the token types
 TOKEN_TYPES = {
@@ -34,40 +38,262 @@ TOKEN_VALUES = {
         'not': TOKEN_TYPES['KEYWORD']
     },
     'IDENTIFIER': {},
-    'LITERAL': {},
+    'LITERAL': {
+        'true': TOKEN_TYPES['LITERAL'],
+        'false': TOKEN_TYPES['LITERAL'],
+        'null': TOKEN_TYPES['LITERAL']
+    },
     'SYMBOL': {}
 }
 
+# Every reserved word, resolved with a single dict lookup instead of re-matching
+WORD_TYPES = {**TOKEN_VALUES['KEYWORD'], **TOKEN_VALUES['LITERAL']}
+
+# Token type names, for display
+TOKEN_NAMES = {value: name for name, value in TOKEN_TYPES.items()}
+
+# One precompiled master pattern; the named group that matched classifies the token
+TOKEN_PATTERN_SOURCE = r"""
+    (?P<WORD>[a-zA-Z_][a-zA-Z_0-9]*)
+  | (?P<NUMBER>\d+)
+  | (?P<STRING>["'][^"']*["'])
+  | (?P<SYMBOL>[+\-*/()=<>.,;:{}])
+  | (?P<SPACE>\s+)
+"""
+TOKEN_PATTERN = re.compile(TOKEN_PATTERN_SOURCE, re.VERBOSE)
+
+# The same pattern for bytes, mmap and memoryview sources
+BYTES_TOKEN_PATTERN = re.compile(TOKEN_PATTERN_SOURCE.encode(), re.VERBOSE)
+BYTES_WORD_TYPES = {word.encode(): token_type for word, token_type in WORD_TYPES.items()}
+
+# Token type of every group except WORD, which needs the WORD_TYPES lookup
+GROUP_TYPES = {
+    'NUMBER': TOKEN_TYPES['LITERAL'],
+    'STRING': TOKEN_TYPES['LITERAL'],
+    'SYMBOL': TOKEN_TYPES['SYMBOL'],
+    'SPACE': TOKEN_TYPES['SYMBOL']
+}
+
+
+NEWLINE_PATTERN = re.compile('\n')
+BYTES_NEWLINE_PATTERN = re.compile(b'\n')
+
+
+class LineIndex:
+    """Maps offsets in a source text to 1-based (line, column).
+
+    The offsets where lines start are found on first use, in one pass, and
+    kept in an array('i'); every lookup after that is a binary search. So
+    tokens and nodes only keep a single offset, and a line and column are
+    worked out for the few that get reported.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._starts = None
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            pattern = NEWLINE_PATTERN if isinstance(self.source, str) else BYTES_NEWLINE_PATTERN
+            starts = array('i', [0])
+            starts.extend(match.end() for match in pattern.finditer(self.source))
+            self._starts = starts
+        return self._starts
+
+    def line(self, offset):
+        return bisect_right(self.starts, offset)
+
+    def position(self, offset):
+        starts = self.starts
+        line = bisect_right(starts, offset)
+        return line, offset - starts[line - 1] + 1
+
+    def node_line(self, node):
+        """The line `node` starts on, or 0 if it has no offset."""
+        offset = getattr(node, 'offset', None)
+        return 0 if offset is None else bisect_right(self.starts, offset)
+
+    def node_position(self, node):
+        """The (line, column) `node` starts at, or (0, 0) if it has no offset."""
+        offset = getattr(node, 'offset', None)
+        return (0, 0) if offset is None else self.position(offset)
+
+
+class TokenBuffer:
+    """Token stream stored as parallel int arrays over the source text.
+
+    Only the type, start offset and length of each token are kept; lexemes
+    are sliced out of the source when asked for. Indexing or iterating
+    yields the familiar {'type': ..., 'value': ...} dicts, built on demand.
+    """
+
+    def __init__(self, source, offset=0):
+        self.source = source
+        # Offset of source[0] in the whole input, for buffers holding one chunk
+        self.offset = offset
+        self.types = array('i')
+        self.starts = array('i')
+        self.lengths = array('i')
+        self._line_index = None
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {'type': self.types[index], 'value': self.value_at(index)}
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield {'type': self.types[i], 'value': self.value_at(i)}
+
+    def append(self, token_type, start, length):
+        self.types.append(token_type)
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def type_at(self, index):
+        return self.types[index]
+
+    def text_at(self, index):
+        start = self.starts[index]
+        text = self.source[start:start + self.lengths[index]]
+        if not isinstance(text, str):
+            text = str(text, 'utf-8')
+        return text
+
+    def value_at(self, index):
+        text = self.text_at(index)
+        if self.types[index] == TOKEN_TYPES['LITERAL'] and text[0].isdigit():
+            return int(text)
+        return text
+
+    def line_index(self):
+        """The LineIndex of `source`, built on first use and again if the source is replaced."""
+        index = self._line_index
+        if index is None or index.source is not self.source:
+            index = self._line_index = LineIndex(self.source)
+        return index
+
+    def position(self, index):
+        """Return the 1-based (line, column) where token `index` starts."""
+        return self.line_index().position(self.starts[index])
+
+    def rows(self):
+        """Yield [type name, value] pairs, as shown in the token tables."""
+        for i in range(len(self.types)):
+            yield [TOKEN_NAMES[self.types[i]], self.value_at(i)]
+
+
 def lexer(code):
-    tokens = []
-    for match in re.finditer(r'|'.join([KEYWORDS, IDENTIFIERS, LITERALS, SYMBOLS]), code):
-        token = match.group()
-        if token in KEYWORDS:
-            tokens.append({'type': TOKEN_TYPES['KEYWORD'], 'value': token})
-        elif re.match(IDENTIFIERS, token):
-            tokens.append({'type': TOKEN_TYPES['IDENTIFIER'], 'value': token})
-        elif re.match(LITERALS, token):
-            if token.startswith('"') or token.startswith("'"):
-                tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': token})
-            else:
-                try:
-                    value = int(token)
-                    tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': value})
-                except ValueError:
-                    tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': token})
-        elif re.match(SYMBOLS, token):
-            if token.isspace():
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            elif token == '\n':
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            elif token == '\r\n':
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            elif token == '\r':
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            else:
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
+    """Tokenize `code` (a str or bytes-like object) into a TokenBuffer."""
+    tokens = TokenBuffer(code)
+    if isinstance(code, str):
+        lex_range(tokens, code, TOKEN_PATTERN, WORD_TYPES)
+    else:
+        lex_range(tokens, code, BYTES_TOKEN_PATTERN, BYTES_WORD_TYPES)
+    return tokens
+
+
+def lex_range(tokens, code, pattern, word_types, pos=0, endpos=sys.maxsize):
+    """Append the tokens `pattern` finds in code[pos:endpos] to `tokens`, at their offsets in `code`.
+
+    Matching stops at `endpos` as if the input ended there, so lexing a range
+    that starts and ends on token boundaries gives the tokens a lex of the
+    whole input has there.
+    """
+    types_append = tokens.types.append
+    starts_append = tokens.starts.append
+    lengths_append = tokens.lengths.append
+    group_types = GROUP_TYPES
+    identifier = TOKEN_TYPES['IDENTIFIER']
+    for match in pattern.finditer(code, pos, endpos):
+        start, end = match.span()
+        kind = match.lastgroup
+        if kind == 'WORD':
+            types_append(word_types.get(match.group(), identifier))
+        else:
+            types_append(group_types[kind])
+        starts_append(start)
+        lengths_append(end - start)
     return tokens
 
+# Quote characters the STRING group starts with, for spotting strings left open at a chunk end
+QUOTE_PATTERN = re.compile(r"[\"']")
+BYTES_QUOTE_PATTERN = re.compile(rb"[\"']")
+
+CHUNK_SIZE = 1 << 16
+
+# Longest string literal stream_lexer() holds back waiting for its closing quote
+MAX_STRING_SIZE = 1 << 24
+
+def stream_lexer(file, chunk_size=CHUNK_SIZE, max_string_size=MAX_STRING_SIZE):
+    """Lex a text or binary file object (or mmap) without reading it whole.
+
+    Yields one TokenBuffer per chunk, with `offset` set to where the chunk
+    starts in the input. A token that may still continue past the end of the
+    data read so far (an identifier, number or whitespace run touching the
+    end, or a quote whose closing quote has not been read yet) is held back
+    and lexed again once more input arrives, so the concatenated batches are
+    exactly what lexer() returns for the whole input. Memory stays bounded by
+    the chunk size plus the longest token. A quote still unclosed
+    `max_string_size` characters later raises MiniScriptError rather than
+    holding back the rest of the input.
+    """
+    pending = file.read(chunk_size)
+    if isinstance(pending, str):
+        pattern, word_types, quote_pattern = TOKEN_PATTERN, WORD_TYPES, QUOTE_PATTERN
+    else:
+        pattern, word_types, quote_pattern = BYTES_TOKEN_PATTERN, BYTES_WORD_TYPES, BYTES_QUOTE_PATTERN
+    group_types = GROUP_TYPES
+    identifier = TOKEN_TYPES['IDENTIFIER']
+    offset = 0
+    read_size = chunk_size
+    eof = not pending
+    while pending:
+        types = array('i')
+        starts = array('i')
+        lengths = array('i')
+        size = len(pending)
+        done = 0
+        for match in pattern.finditer(pending):
+            start, end = match.span()
+            if not eof and (end == size or (start > done and quote_pattern.search(pending, done, start))):
+                break
+            kind = match.lastgroup
+            if kind == 'WORD':
+                types.append(word_types.get(match.group(), identifier))
+            else:
+                types.append(group_types[kind])
+            starts.append(start)
+            lengths.append(end - start)
+            done = end
+        else:
+            if eof or not quote_pattern.search(pending, done):
+                done = size
+        if types:
+            tokens = TokenBuffer(pending[:done], offset)
+            tokens.types, tokens.starts, tokens.lengths = types, starts, lengths
+            yield tokens
+        if eof:
+            break
+        if size - done > max_string_size:
+            quote = quote_pattern.search(pending, done)
+            if quote is not None and size - quote.start() > max_string_size:
+                raise MiniScriptError(f"Unterminated string at offset {offset + quote.start()}: "
+                                      f"no closing quote within {max_string_size:,} characters")
+        # Grow the read size while a single token spans several chunks
+        read_size = chunk_size if done else read_size * 2
+        pending = pending[done:]
+        offset += done
+        chunk = file.read(read_size)
+        if chunk:
+            pending += chunk
+        else:
+            eof = True
+
 # Test the lexer with sample input code
 code = """
     if x > 5 {
@@ -84,187 +310,620 @@ code = """
     }
 """
 
-tokens = lexer(code)
-
-# Print the tokens in a table format
-headers = ['Type', 'Value']
-table = []
-for token in tokens:
-    if token['type'] == TOKEN_TYPES['KEYWORD']:
-        token_type = 'KEYWORD'
-    elif token['type'] == TOKEN_TYPES['IDENTIFIER']:
-        token_type = 'IDENTIFIER'
-    elif token['type'] == TOKEN_TYPES['LITERAL']:
-        token_type = 'LITERAL'
-    else:
-        token_type = 'SYMBOL'
-    table.append([token_type, token['value']])
+if __name__ == '__main__':
+    from tabulate import tabulate
+
+    tokens = lexer(code)
 
-print(tabulate(table, headers, tablefmt='grid'))
+    # Print the tokens in a table format
+    headers = ['Type', 'Value']
+    print(tabulate(tokens.rows(), headers, tablefmt='grid'))
 
 ##################################################################
 
 
 
-def parse_Miniscript(tokens):
-    statement_list = []
-    i = 0
-    while i < len(tokens):
-        if tokens[i] == 'while':
-            statement_list.append(parse_WhileStatement(tokens[i:i+3]))
-            i += 3
-        elif tokens[i] == 'if':
-            statement_list.append(parse_IfStatement(tokens[i:i+3]))
-            i += 3
-        elif tokens[i] == 'print':
-            statement_list.append(parse_PrintStatement(tokens[i:i+2]))
-            i += 2
-        elif tokens[i] == 'for':
-            statement_list.append(parse_ForStatement(tokens[i:i+3]))
-            i += 3
-        else:
-            raise Exception("Invalid statement")
-    return statement_list
-
-def parse_IfStatement(tokens):
-    if tokens[1] == 'then':
-        condition = parse_Expression(tokens[2])
-        then_statement = parse_StatementList(tokens[3:])
-        else_statement = parse_StatementList(tokens[5:])
-        return IfStatement(tokens[0], condition, then_statement, else_statement)
-    else:
-        raise Exception("Invalid if statement")
-
-def parse_WhileStatement(tokens):
-    condition = parse_Expression(tokens[1])
-    statement = parse_StatementList(tokens[2:])
-    return WhileStatement(tokens[0], condition, statement)
-
-def parse_PrintStatement(tokens):
-    return PrintStatement([parse_Factor(tokens[1])])
-
-def parse_ForStatement(tokens):
-    loop_variable = parse_Factor(tokens[1])
-    range_expression = parse_Expression(tokens[2])
-    statement = parse_StatementList(tokens[3:])
-    return ForStatement(tokens[0], loop_variable, range_expression, statement)
-
-def parse_StatementList(tokens):
-    statement_list = []
-    i = 0
-    while i < len(tokens):
-        statement_list.append(parse_Statement(tokens[i:i+1]))
-        i += 1
-    return statement_list
-
-def parse_Statement(tokens):
-    if tokens[0] == 'print':
-        return parse_PrintStatement(tokens)
-    elif tokens[0] == 'if':
-        return parse_IfStatement(tokens)
-    elif tokens[0] == 'while':
-        return parse_WhileStatement(tokens)
-    elif tokens[0] == 'for':
-        return parse_ForStatement(tokens)
-    else:
-        raise Exception("Invalid statement")
+class MiniScriptError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
 
-def parse_Expression(tokens):
-    if len(tokens) == 1:
-        return parse_Factor(tokens[0])
-    else:
-        return Term(parse_Expression(tokens[:len(tokens)//2]), tokens[len(tokens)//2], parse_Expression(tokens[len(tokens)//2+1:]))
-
-def parse_Factor(tokens):
-    if re.match(IDENTIFIERS, tokens[0]):
-        return Identifier(tokens[0])
-    elif re.match(LITERALS, tokens[0]):
-        if tokens[0].startswith('"') or tokens[0].startswith("'"):
-            return StringLiteral(tokens[0])
-        else:
-            return Number(int(tokens[0]))
-    else:
-        raise Exception("Invalid factor")
+class ParseError(MiniScriptError):
+    """A syntax error; `offset` is where in the source it was found, or None at the end of input."""
 
-def parse_Term(tokens):
-    if len(tokens) == 1:
-        return parse_Factor(tokens[0])
-    else:
-        return Term(parse_Term(tokens[:len(tokens)//2]), tokens[len(tokens)//2], parse_Term(tokens[len(tokens)//2+1:]))
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+# Binding power of each binary operator; higher binds tighter
+BINARY_PRECEDENCE = {
+    'or': 1,
+    'and': 2,
+    '<': 4, '>': 4, '=': 4, '<=': 4, '>=': 4,
+    '+': 5, '-': 5,
+    '*': 6, '/': 6
+}
+
+# Binding power a prefix operator parses its operand with
+UNARY_PRECEDENCE = {
+    'not': 3,
+    '-': 6
+}
+
+# Operators that may be followed directly by '=' to form one operator
+COMPARISON_PREFIXES = {'<': '<=', '>': '>=', '=': '='}
+ASSIGNMENT_OPERATORS = {'+', '-', '*', '/'}
+
+# Deepest nesting of blocks and expressions the parser accepts; every pass
+# over the tree recurses once per level, so this keeps them all well inside
+# the interpreter's recursion limit
+MAX_NESTING_DEPTH = 200
+
+
+class SpanTable:
+    """The source range of each node a parser built, kept beside the tree.
+
+    Nodes only store where they start; the table holds start and end
+    offsets in two array('i') columns, found through a dict keyed by node
+    identity, so a tree parsed without one carries no cost for it. The
+    table keeps its nodes alive, which keeps their ids from being reused.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.nodes = []
+        self.starts = array('i')
+        self.ends = array('i')
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, node, start, end):
+        """Record that `node` covers source[start:end]; a shared node keeps its first range."""
+        if id(node) not in self.index:
+            self.index[id(node)] = len(self.nodes)
+            self.nodes.append(node)
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def span(self, node):
+        """The (start, end) offsets of `node`, or None if the parser did not build it."""
+        i = self.index.get(id(node))
+        return None if i is None else (self.starts[i], self.ends[i])
+
+
+class Parser:
+    """Recursive-descent statement parser with Pratt expression parsing.
+
+    The parser walks a TokenBuffer with a single cursor, skipping whitespace
+    tokens as it goes, so it never copies or slices the token stream and runs
+    in time linear in the number of tokens. Binary operators are handled by
+    precedence climbing in a loop, so long flat expressions do not recurse.
+    Nesting deeper than MAX_NESTING_DEPTH is reported as a ParseError.
+    Every node records the offset of its first token; with `spans`, the
+    parser also fills `spans`, a SpanTable of where each node ends.
+    """
+
+    def __init__(self, tokens, hash_cons=False, spans=False):
+        self.tokens = tokens
+        self.count = len(tokens)
+        self.pos = -1
+        self.type = None
+        self.text = ''
+        # Offset of the current token, and the end of the one before it
+        self.offset = 0
+        self.end = 0
+        # Structurally equal nodes built so far, when sharing subtrees
+        self.nodes = {} if hash_cons else None
+        self.spans = SpanTable() if spans else None
+        # Blocks and expressions the cursor is currently inside
+        self.depth = 0
+        self.statements = {
+            'print': self.parse_PrintStatement,
+            'if': self.parse_IfStatement,
+            'while': self.parse_WhileStatement,
+            'for': self.parse_ForStatement,
+            'break': self.parse_BreakStatement,
+            'continue': self.parse_ContinueStatement,
+            'return': self.parse_ReturnStatement
+        }
+        self.advance()
+
+    def advance(self):
+        """Move the cursor to the next token that is not whitespace."""
+        tokens = self.tokens
+        types = tokens.types
+        starts = tokens.starts
+        symbol = TOKEN_TYPES['SYMBOL']
+        pos = self.pos
+        if pos >= 0:
+            self.end = starts[pos] + tokens.lengths[pos]
+        pos += 1
+        newline_before = False
+        while pos < self.count:
+            text = tokens.text_at(pos)
+            if types[pos] != symbol or not text.isspace():
+                self.type = types[pos]
+                self.offset = starts[pos]
+                break
+            newline_before = newline_before or '\n' in text
+            pos += 1
+        else:
+            self.type = None
+            self.offset = self.end
+            text = ''
+        self.pos = pos
+        self.text = text
+        self.newline_before = newline_before
+
+    def seek(self, index):
+        """Move the cursor to the first token at or after token `index`."""
+        self.pos = index - 1
+        self.type = None
+        self.text = ''
+        self.advance()
+
+    def followed_by(self, text):
+        """Whether the token right after the cursor, with no space between, is `text`."""
+        following = self.pos + 1
+        return following < self.count and self.tokens.text_at(following) == text
+
+    def make(self, node, offset):
+        """Return `node` starting at `offset` and ending with the last token
+        consumed, or an equal node built earlier when hash-consing (which
+        keeps the offset of its first occurrence)."""
+        node.offset = offset
+        if self.nodes is not None:
+            node = self.nodes.setdefault(node, node)
+        if self.spans is not None:
+            self.spans.add(node, offset, self.end)
+        return node
+
+    def error(self, message):
+        if self.pos < self.count:
+            line, column = self.tokens.position(self.pos)
+            return ParseError(f"{message} at line {line}, column {column}: {self.text!r}", self.offset)
+        return ParseError(f"{message} at end of input")
+
+    def nest(self):
+        """Enter one more level of blocks or expressions."""
+        self.depth += 1
+        if self.depth > MAX_NESTING_DEPTH:
+            raise self.error(f"Nesting deeper than {MAX_NESTING_DEPTH} levels")
+
+    def expect(self, text):
+        if self.text != text:
+            raise self.error(f"Expected {text!r}")
+        self.advance()
+
+    def iter_statements(self):
+        """Yield the top-level statements one at a time, so each can be dropped once used."""
+        while self.text:
+            if self.text == ';':
+                self.advance()
+            else:
+                yield self.parse_TopLevelStatement()
+
+    def parse_Miniscript(self):
+        return list(self.iter_statements())
+
+    def parse_StatementList(self):
+        self.nest()
+        self.expect('{')
+        statement_list = []
+        while self.text != '}':
+            if not self.text:
+                raise self.error("Expected '}'")
+            if self.text == ';':
+                self.advance()
+            else:
+                statement_list.append(self.parse_Statement())
+        self.advance()
+        self.depth -= 1
+        return tuple(statement_list)
+
+    def parse_TopLevelStatement(self):
+        """parse_Statement() for a statement that is not nested in another.
+
+        MAX_NESTING_DEPTH normally stops the parser first; should the
+        interpreter's own recursion limit be lower, running into it is
+        reported as a ParseError at the token the parser had reached too.
+        """
+        try:
+            return self.parse_Statement()
+        except RecursionError:
+            raise self.error("Nesting too deep") from None
+
+    def parse_Statement(self):
+        parse = self.statements.get(self.text)
+        if parse is not None:
+            return parse()
+        if self.type == TOKEN_TYPES['IDENTIFIER']:
+            return self.parse_Assignment()
+        raise self.error("Invalid statement")
+
+    def parse_Assignment(self):
+        offset = self.offset
+        name = self.text
+        self.advance()
+        variable = self.make(Identifier(name), offset)
+        operator = self.text
+        if operator in ASSIGNMENT_OPERATORS and self.followed_by('='):
+            self.advance()
+        elif operator != '=':
+            raise self.error("Expected '='")
+        self.advance()
+        expression = self.parse_Expression()
+        if operator != '=':
+            # Compound assignment: x -= 1 is x = x - 1
+            expression = self.make(Term(variable, operator, expression), offset)
+        return self.make(Assignment(variable, expression), offset)
+
+    def parse_PrintStatement(self):
+        offset = self.offset
+        self.advance()
+        if self.text != '(':
+            return self.make(PrintStatement((self.parse_Expression(),)), offset)
+        self.advance()
+        expression = []
+        if self.text != ')':
+            expression.append(self.parse_Expression())
+            while self.text == ',':
+                self.advance()
+                expression.append(self.parse_Expression())
+        self.expect(')')
+        return self.make(PrintStatement(tuple(expression)), offset)
+
+    def parse_IfStatement(self):
+        offset = self.offset
+        keyword = self.text
+        self.advance()
+        condition = self.parse_Expression()
+        then_statement = self.parse_StatementList()
+        else_statement = ()
+        if self.text == 'else':
+            self.advance()
+            if self.text == 'if':
+                # Each else if nests inside the one before it
+                self.nest()
+                else_statement = (self.parse_IfStatement(),)
+                self.depth -= 1
+            else:
+                else_statement = self.parse_StatementList()
+        return self.make(IfStatement(keyword, condition, then_statement, else_statement), offset)
+
+    def parse_WhileStatement(self):
+        offset = self.offset
+        keyword = self.text
+        self.advance()
+        condition = self.parse_Expression()
+        statement = self.parse_StatementList()
+        return self.make(WhileStatement(keyword, condition, statement), offset)
+
+    def parse_ForStatement(self):
+        offset = self.offset
+        keyword = self.text
+        self.advance()
+        if self.type != TOKEN_TYPES['IDENTIFIER']:
+            raise self.error("Expected loop variable")
+        name, name_offset = self.text, self.offset
+        self.advance()
+        loop_variable = self.make(Identifier(name), name_offset)
+        self.expect('in')
+        range_offset = self.offset
+        self.expect('range')
+        self.expect('(')
+        arguments = [self.parse_Expression()]
+        while self.text == ',' and len(arguments) < 3:
+            self.advance()
+            arguments.append(self.parse_Expression())
+        self.expect(')')
+        range_expression = self.make(RangeExpression(tuple(arguments)), range_offset)
+        statement = self.parse_StatementList()
+        return self.make(ForStatement(keyword, loop_variable, range_expression, statement), offset)
+
+    def parse_BreakStatement(self):
+        offset = self.offset
+        self.advance()
+        return self.make(BreakStatement(), offset)
+
+    def parse_ContinueStatement(self):
+        offset = self.offset
+        self.advance()
+        return self.make(ContinueStatement(), offset)
+
+    def parse_ReturnStatement(self):
+        offset = self.offset
+        self.advance()
+        # A return value has to start on the same line as the keyword
+        if not self.text or self.newline_before or self.text in ('}', ';'):
+            return self.make(ReturnStatement(None), offset)
+        return self.make(ReturnStatement(self.parse_Expression()), offset)
+
+    def parse_Expression(self, min_precedence=0):
+        self.nest()
+        # As in Python, `not` may start an operand of and/or/not but not of
+        # a comparison or arithmetic operator
+        if self.text == 'not' and min_precedence <= UNARY_PRECEDENCE['not']:
+            offset = self.offset
+            self.advance()
+            left = self.make(UnaryTerm('not', self.parse_Expression(UNARY_PRECEDENCE['not'])), offset)
+        else:
+            left = self.parse_Factor()
+        while True:
+            operator = self.text
+            precedence = BINARY_PRECEDENCE.get(operator)
+            if precedence is None or precedence <= min_precedence:
+                self.depth -= 1
+                return left
+            if operator in COMPARISON_PREFIXES and self.followed_by('='):
+                operator = COMPARISON_PREFIXES[operator]
+                self.advance()
+            self.advance()
+            left = self.make(Term(left, operator, self.parse_Expression(precedence)), left.offset)
+
+    def parse_Factor(self):
+        text = self.text
+        offset = self.offset
+        if self.type == TOKEN_TYPES['IDENTIFIER']:
+            self.advance()
+            return self.make(Identifier(text), offset)
+        if self.type == TOKEN_TYPES['LITERAL']:
+            if text[0].isdigit() and self.followed_by('.') and self.is_number(self.pos + 2):
+                # 3.25 is lexed as 3 . 25
+                self.advance()
+                self.advance()
+                fraction = self.text
+                self.advance()
+                return self.make(Number(float(f"{text}.{fraction}")), offset)
+            self.advance()
+            if text[0] in '"\'':
+                return self.make(StringLiteral(text[1:-1]), offset)
+            if text in ('true', 'false'):
+                return self.make(BooleanLiteral(text == 'true'), offset)
+            if text == 'null':
+                return self.make(NullLiteral(None), offset)
+            return self.make(Number(int(text)), offset)
+        if text == '(':
+            self.advance()
+            expression = self.parse_Expression()
+            self.expect(')')
+            return expression
+        if text == '-':
+            self.advance()
+            return self.make(UnaryTerm(text, self.parse_Expression(UNARY_PRECEDENCE[text])), offset)
+        raise self.error("Invalid factor")
+
+    def is_number(self, pos):
+        return (pos < self.count
+                and self.tokens.types[pos] == TOKEN_TYPES['LITERAL']
+                and self.tokens.text_at(pos)[0].isdigit())
+
+def parse_Miniscript(tokens, hash_cons=False):
+    """Parse a TokenBuffer into the list of top-level statements.
+
+    With `hash_cons`, structurally equal subtrees (repeated constant
+    expressions, identical statements) are built once and shared.
+    """
+    return Parser(tokens, hash_cons).parse_Miniscript()
 
 class AST:
-    def __init__(self, type, children=None):
-        self.type = type
-        self.children = children if children else []
+    """Base class of the syntax tree nodes.
+
+    Every node class declares its fields in __slots__ and its node kind as an
+    integer class attribute, so an instance holds nothing but its fields.
+    Nodes are treated as immutable once built: statement bodies and argument
+    lists are tuples, equality is structural and the hash is cached on first
+    use, which lets later passes key caches on subtrees and lets the parser
+    share equal subtrees (hash-consing).
+
+    `offset` is where the node's first token starts in the source; a
+    LineIndex turns it into a line and column when one is reported. Like the
+    cached hash it lives in the base class slots, so equality and hashing
+    ignore it; nodes built after parsing (by the optimizer, say) may not
+    have one.
+    """
+    __slots__ = ('_hash', 'offset')
+    kind = 0
+
+    @property
+    def type(self):
+        return type(self).__name__
+
+    @property
+    def children(self):
+        children = []
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, AST):
+                children.append(value)
+            elif isinstance(value, tuple):
+                children.extend(value)
+        return children
 
     def __str__(self):
-        return f'{self.type}({", ".join(str(child) for child in self.children)})'
+        fields = []
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, tuple):
+                fields.append(f'[{", ".join(str(child) for child in value)}]')
+            elif isinstance(value, AST):
+                fields.append(str(value))
+            else:
+                fields.append(repr(value))
+        return f'{self.type}({", ".join(fields)})'
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            pass
+        # Hash bottom-up with an explicit stack: a long operator chain is a
+        # tree as deep as it is long
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            pending = [child for child in node.children if not hasattr(child, '_hash')]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            node._hash = hash((node.kind,) + tuple(getattr(node, name) for name in node.__slots__))
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(self) is not type(other) or hash(self) != hash(other):
+            return False
+        stack = [(self, other)]
+        while stack:
+            left, right = stack.pop()
+            if left is right:
+                continue
+            if type(left) is not type(right):
+                return False
+            for name in left.__slots__:
+                a = getattr(left, name)
+                b = getattr(right, name)
+                if isinstance(a, AST):
+                    stack.append((a, b))
+                elif isinstance(a, tuple):
+                    if not isinstance(b, tuple) or len(a) != len(b):
+                        return False
+                    stack.extend(zip(a, b))
+                elif type(a) is not type(b) or a != b:
+                    # 1 and 1.0 print differently, so they are different nodes
+                    return False
+        return True
 
 class PrintStatement(AST):
+    __slots__ = ('expression',)
+    kind = 1
+
     def __init__(self, expression):
-        super().__init__('PrintStatement')
         self.expression = expression
 
 class IfStatement(AST):
+    __slots__ = ('keyword', 'condition', 'then_statement', 'else_statement')
+    kind = 2
+
     def __init__(self, keyword, condition, then_statement, else_statement):
-        super().__init__('IfStatement')
-        self.keyword = keyword
+        self.keyword = sys.intern(keyword)
         self.condition = condition
         self.then_statement = then_statement
         self.else_statement = else_statement
 
 class WhileStatement(AST):
+    __slots__ = ('keyword', 'condition', 'statement')
+    kind = 3
+
     def __init__(self, keyword, condition, statement):
-        super().__init__('WhileStatement')
-        self.keyword = keyword
+        self.keyword = sys.intern(keyword)
         self.condition = condition
         self.statement = statement
 
 class ForStatement(AST):
+    __slots__ = ('keyword', 'loop_variable', 'range_expression', 'statement')
+    kind = 4
+
     def __init__(self, keyword, loop_variable, range_expression, statement):
-        super().__init__('ForStatement')
-        self.keyword = keyword
+        self.keyword = sys.intern(keyword)
         self.loop_variable = loop_variable
         self.range_expression = range_expression
         self.statement = statement
 
+class Assignment(AST):
+    __slots__ = ('variable', 'expression')
+    kind = 5
+
+    def __init__(self, variable, expression):
+        self.variable = variable
+        self.expression = expression
+
+class BreakStatement(AST):
+    __slots__ = ()
+    kind = 6
+
+class ContinueStatement(AST):
+    __slots__ = ()
+    kind = 7
+
+class ReturnStatement(AST):
+    __slots__ = ('expression',)
+    kind = 8
+
+    def __init__(self, expression):
+        self.expression = expression
+
+class RangeExpression(AST):
+    __slots__ = ('arguments',)
+    kind = 9
+
+    def __init__(self, arguments):
+        self.arguments = arguments
+
 class Term(AST):
+    __slots__ = ('left', 'operator', 'right')
+    kind = 10
+
     def __init__(self, left, operator, right):
-        super().__init__('Term')
         self.left = left
-        self.operator = operator
+        self.operator = sys.intern(operator)
         self.right = right
 
+class UnaryTerm(AST):
+    __slots__ = ('operator', 'operand')
+    kind = 11
+
+    def __init__(self, operator, operand):
+        self.operator = sys.intern(operator)
+        self.operand = operand
+
 class Factor(AST):
+    __slots__ = ('value',)
+    kind = 12
+
     def __init__(self, value):
-        super().__init__('Factor')
         self.value = value
 
 class Number(AST):
+    __slots__ = ('value',)
+    kind = 13
+
     def __init__(self, value):
-        super().__init__('Number')
         self.value = value
 
 class Identifier(AST):
+    __slots__ = ('value',)
+    kind = 14
+
     def __init__(self, value):
-        super().__init__('Identifier')
-        self.value = value
+        self.value = sys.intern(value)
 
 class StringLiteral(AST):
+    __slots__ = ('value',)
+    kind = 15
+
     def __init__(self, value):
-        super().__init__('StringLiteral')
         self.value = value
 
 class BooleanLiteral(AST):
+    __slots__ = ('value',)
+    kind = 16
+
     def __init__(self, value):
-        super().__init__('BooleanLiteral')
         self.value = value
 
 class NullLiteral(AST):
+    __slots__ = ('value',)
+    kind = 17
+
     def __init__(self, value):
-        super().__init__('NullLiteral')
         self.value = value
 
+# Node class for each integer kind tag
+NODE_CLASSES = {cls.kind: cls for cls in AST.__subclasses__()}
+
 
 
 
@@ -292,118 +951,538 @@ class Variable:
 
 
 
-import sys
+class Symbol:
+    """One declared name: where it lives and where it is used.
+
+    `depth` is the nesting depth of the declaring scope (0 is global) and
+    `slot` its index in that scope, so (depth, slot) addresses the variable
+    without a name lookup. `line` is the line of the declaration and
+    `references` the lines of later uses.
+    """
+    __slots__ = ('name', 'kind', 'type', 'depth', 'slot', 'line', 'references', 'parameters')
+
+    def __init__(self, name, kind, type, depth, slot, line=0, parameters=None):
+        self.name = name
+        self.kind = kind
+        self.type = type
+        self.depth = depth
+        self.slot = slot
+        self.line = line
+        self.references = array('i')
+        self.parameters = parameters
+
 
 class SymbolTable:
-    def __init__(self):
-        self.symbols = {}
+    """Nested scopes of Symbols.
 
-    def add_variable(self, name, var_type):
-        self.symbols[name] = {'type': 'variable', 'var_type': var_type}
+    The scopes form a stack of dicts, so entering and leaving a scope is a
+    single append or pop, and a name resolves to the innermost scope that
+    declares it. Analysis resolves each use once, through reference(), which
+    also records the line; lookup() is the plain query and records nothing.
+    """
 
-    def add_function(self, name, return_type, parameters):
-        self.symbols[name] = {'type': 'function', 'return_type': return_type, 'parameters': parameters}
+    def __init__(self):
+        self.scopes = [{}]
+        # Every symbol ever declared, in order, kept after its scope is popped
+        self.symbols = []
+
+    @property
+    def depth(self):
+        return len(self.scopes) - 1
+
+    def push_scope(self):
+        self.scopes.append({})
+
+    def pop_scope(self):
+        if len(self.scopes) == 1:
+            raise MiniScriptError("Cannot pop the global scope")
+        return self.scopes.pop()
+
+    def declare(self, name, kind='variable', type=None, line=0, parameters=None):
+        """Declare `name` in the innermost scope, or return the symbol it already has there."""
+        scope = self.scopes[-1]
+        symbol = scope.get(name)
+        if symbol is None:
+            symbol = scope[name] = Symbol(name, kind, type, len(self.scopes) - 1, len(scope), line, parameters)
+            self.symbols.append(symbol)
+        return symbol
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+        return None
+
+    def reference(self, name, line=0):
+        """Resolve a use of `name` on `line`, recording the line on the symbol."""
+        symbol = self.lookup(name)
+        if symbol is not None:
+            symbol.references.append(line)
+        return symbol
+
+    def resolve(self, name):
+        """Return the (depth, slot) address of `name`, or None if undeclared."""
+        symbol = self.lookup(name)
+        return None if symbol is None else (symbol.depth, symbol.slot)
+
+    def add_variable(self, name, var_type, line=0):
+        return self.declare(name, 'variable', var_type, line)
+
+    def add_function(self, name, return_type, parameters, line=0):
+        return self.declare(name, 'function', return_type, line, parameters)
 
     def get_symbol(self, name):
-        return self.symbols.get(name, None)
+        return self.lookup(name)
+
+    def rows(self):
+        """Yield one row per symbol, as shown in the symbol table."""
+        for symbol in self.symbols:
+            type_ = symbol.type
+            if symbol.kind == 'function':
+                type_ = f"{type_}({', '.join(symbol.parameters)})"
+            yield [symbol.name, symbol.kind, type_ or '', symbol.depth, symbol.slot, symbol.line or '',
+                   ', '.join(map(str, symbol.references))]
+
+    def format_table(self):
+        from tabulate import tabulate
+
+        headers = ['Name', 'Kind', 'Type', 'Depth', 'Slot', 'Line Declared', 'Reference Lines']
+        return tabulate(self.rows(), headers)
 
     def print_table(self):
         print("Symbol Table:")
-        for name, symbol_info in self.symbols.items():
-            if symbol_info['type'] == 'variable':
-                print(f"Variable: {name}, Type: {symbol_info['var_type']}")
-            elif symbol_info['type'] == 'function':
-                print(f"Function: {name}, Return Type: {symbol_info['return_type']}, Parameters: {symbol_info['parameters']}")
+        print(self.format_table())
+
+
+def collect_symbols(statements, symbol_table=None, lines=None):
+    """Declare the variables of a parsed program in a SymbolTable.
+
+    A variable is declared by its first assignment (or as a loop variable);
+    later assignments and reads are recorded as references. Blocks do not
+    open a scope in MiniScript, so everything lands in the global scope.
+    Reads of names never assigned before are left for the semantic analyzer
+    to report. Lines come from `lines`, the LineIndex of the source; without
+    one they are all 0.
+    """
+    symbol_table = SymbolTable() if symbol_table is None else symbol_table
+    node_line = (lambda node: 0) if lines is None else lines.node_line
+
+    def use(identifier):
+        symbol_table.reference(identifier.value, node_line(identifier))
+
+    def assign(identifier):
+        if symbol_table.lookup(identifier.value) is None:
+            symbol_table.declare(identifier.value, line=node_line(identifier))
+        else:
+            use(identifier)
+
+    def read(expression):
+        # Left to right, with an explicit stack for long operator chains
+        stack = [expression]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Identifier):
+                use(node)
+            else:
+                stack.extend(reversed(node.children))
+
+    def visit(statements):
+        for statement in statements:
+            if isinstance(statement, Assignment):
+                read(statement.expression)
+                assign(statement.variable)
+            elif isinstance(statement, (PrintStatement, ReturnStatement)):
+                for child in statement.children:
+                    read(child)
+            elif isinstance(statement, IfStatement):
+                read(statement.condition)
+                visit(statement.then_statement)
+                visit(statement.else_statement or ())
+            elif isinstance(statement, WhileStatement):
+                read(statement.condition)
+                visit(statement.statement)
+            elif isinstance(statement, ForStatement):
+                read(statement.range_expression)
+                assign(statement.loop_variable)
+                visit(statement.statement)
+
+    visit(statements)
+    return symbol_table
 
 # Example usage:
-symbol_table = SymbolTable()
+if __name__ == '__main__':
+    symbol_table = SymbolTable()
 
-# Add variables
-symbol_table.add_variable('x', 'int')
-symbol_table.add_variable('y', 'float')
+    # Add variables
+    symbol_table.add_variable('x', 'int')
+    symbol_table.add_variable('y', 'float')
 
-# Add functions
-symbol_table.add_function('add', 'int', ['int', 'int'])
-symbol_table.add_function('multiply', 'float', ['float', 'float'])
+    # Add functions
+    symbol_table.add_function('add', 'int', ['int', 'int'])
+    symbol_table.add_function('multiply', 'float', ['float', 'float'])
 
-# Print symbol table
-symbol_table.print_table()
+    # Print symbol table
+    symbol_table.print_table()
 
 
 
-class SemanticAnalyzer:
-    def __init__(self):
-        self.symbol_table = SymbolTable()
+# Diagnostic codes: E for errors, W for warnings
+DIAGNOSTIC_MESSAGES = {
+    'E001': "Undefined variable: '{name}'",
+    'E002': "'break' outside loop",
+    'E003': "'continue' outside loop",
+    'E004': "Unsupported operand types for {operator!r}: {types}",
+    'E005': "range() arguments must be integers, not {type}",
+    'W001': "Variable '{name}' may be used before it is assigned",
+    'W002': "Division by zero",
+    'W003': "Unreachable code",
+    'W004': "Variable '{name}' is assigned but never used"
+}
 
-    def analyze(self, ast):
-        try:
-            for node in ast:
-                if node['type'] == 'function_declaration':
-                    self.analyze_function_declaration(node)
-                elif node['type'] == 'assignment':
-                    self.analyze_assignment(node)
-                elif node['type'] == 'variable':
-                    self.analyze_variable(node)
-        except MiniScriptError as e:
-            print(f"Error: {e}")
-            response = input("Do you want to continue executing the program? (y/n): ")
-            if response.lower() == 'y':
-                # Continue executing the program
-                pass
-            else:
-                # Exit the program
-                sys.exit(1)
+NUMERIC_TYPES = {'int', 'float', 'bool'}
+ORDERING_OPERATORS = {'<', '>', '<=', '>='}
 
-    def analyze_function_declaration(self, node):
-        function_name = node['children'][0]
-        self.symbol_table.add_symbol(function_name, None)
-        print(f"Function '{function_name}' declared.")
 
-    def analyze_assignment(self, node):
-        variable_name = node['children'][0]
-        value = node['children'][1]
+class Diagnostic:
+    """One finding of the semantic analyzer, at `offset` in the source.
 
-        if not isinstance(variable_name, str):
-            raise MiniScriptError("Invalid variable name in assignment.")
+    `line` and `column` are 1-based, or 0 when the offset is unknown (None).
+    """
+    __slots__ = ('code', 'message', 'offset', 'line', 'column')
 
-        if not self.symbol_table.get_symbol(variable_name):
-            raise MiniScriptError(f"Undefined variable: '{variable_name}'.")
-        else:
-            print(f"Variable '{variable_name}' assigned.")
+    def __init__(self, code, offset=None, line=0, column=0, **arguments):
+        self.code = code
+        self.message = DIAGNOSTIC_MESSAGES[code].format(**arguments)
+        self.offset = offset
+        self.line = line
+        self.column = column
 
-    def analyze_variable(self, node):
-        variable_name = node['children'][0]
+    @property
+    def severity(self):
+        return 'error' if self.code[0] == 'E' else 'warning'
 
-        if not isinstance(variable_name, str):
-            raise MiniScriptError("Invalid variable name.")
+    def to_dict(self):
+        return {'code': self.code, 'severity': self.severity, 'message': self.message, 'line': self.line,
+                'column': self.column, 'offset': self.offset}
 
-        if not self.symbol_table.get_symbol(variable_name):
-            raise MiniScriptError(f"Undefined variable: '{variable_name}'.")
-        else:
-            print(f"Variable '{variable_name}' used.")
+    def __repr__(self):
+        return f"Diagnostic({self.code!r}, line={self.line}, column={self.column}, message={self.message!r})"
 
-class MiniScriptError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
+    def __str__(self):
+        return f"line {self.line}, column {self.column}: {self.severity} {self.code}: {self.message}"
+
+
+def literal_type(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, str):
+        return 'string'
+    return 'int' if isinstance(value, int) else 'float'
+
+
+def operation_type(operator, left, right):
+    """Static type of `left operator right` from its operand types, or None.
+
+    None means the operand types are unknown or the operation fails for
+    them; the two cases differ only in whether an operand type was None.
+    """
+    if operator in ('and', 'or'):
+        return left if left == right else None
+    if operator == '=':
+        return 'bool'
+    if left is None or right is None:
+        return 'bool' if operator in ORDERING_OPERATORS else None
+    if operator in ORDERING_OPERATORS:
+        return 'bool' if left in NUMERIC_TYPES and right in NUMERIC_TYPES or left == right == 'string' else None
+    if left in NUMERIC_TYPES and right in NUMERIC_TYPES:
+        return 'float' if operator == '/' or 'float' in (left, right) else 'int'
+    if operator == '+' and left == right == 'string':
+        return 'string'
+    if operator == '*' and {left, right} in ({'string', 'int'}, {'string', 'bool'}):
+        return 'string'
+    return None
+
+
+def unary_type(operator, operand):
+    """Static type of a unary operation from its operand type, or None."""
+    if operator == 'not':
+        return 'bool'
+    if operand in NUMERIC_TYPES:
+        return 'float' if operand == 'float' else 'int'
+    return None
 
-# Example AST nodes
-ast = [
-    {'type': 'function_declaration', 'children': ['add']},
-    {'type': 'assignment', 'children': ['x', 10]},
-    {'type': 'variable', 'children': ['x']},
-    {'type': 'assignment', 'children': ['y', 20]},
-    {'type': 'variable', 'children': ['y']},
-    {'type': 'variable', 'children': ['z']}  # This will raise an error as 'z' is not assigned in any function
-]
 
-# Perform semantic analysis
-analyzer = SemanticAnalyzer()
-try:
-    analyzer.analyze(ast)
-    print("Semantic analysis passed successfully.")
-    analyzer.symbol_table.print_table()  
-except Exception as e:
-    print("Semantic analysis failed:", e)
+class SemanticAnalyzer:
+    """Check a parsed program in one traversal, collecting diagnostics.
+
+    Nodes go to visit_<NodeClass> methods through a per-class table filled
+    on first use. Expression visitors receive their operands' static types
+    (known for literals, None otherwise) and return their own, which is
+    enough to catch operations that fail whatever the variables hold.
+    Variables are declared in `symbol_table` as they are assigned. A read of
+    a variable not assigned on every path to it gets a warning, or an error
+    if nothing ever assigns it. analyze() returns the diagnostics sorted by
+    position; nothing is printed and nothing stops the traversal.
+
+    Nodes only carry offsets. The traversal records offsets, and analyze()
+    turns them into the lines and columns of symbols and diagnostics at the
+    end, with `lines`, the LineIndex of the source; without it they are all
+    0.
+    """
+
+    dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.dispatch = {}
+
+    def __init__(self, symbol_table=None, lines=None):
+        self.symbol_table = SymbolTable() if symbol_table is None else symbol_table
+        self.lines = lines
+        self.diagnostics = []
+        # Variables assigned on every path to the current statement
+        self.assigned = set()
+        # Names read anywhere, for the never-used check
+        self.read = set()
+        # (name, node) of reads that came before any assignment of the name
+        self.unresolved = []
+        # Name -> the identifier that declared it
+        self.declarations = {}
+        # (symbol, offset) of every later assignment or read of a declared name
+        self.uses = []
+        self.loop_depth = 0
+        # Whether the current statement can be reached
+        self.reachable = True
+
+    def analyze(self, statements):
+        self.visit_block(statements)
+        symbol_table = self.symbol_table
+        for name, node in self.unresolved:
+            symbol = symbol_table.lookup(name)
+            if symbol is None:
+                self.report('E001', node, name=name)
+            else:
+                # Assigned later in the program, as in a loop body that reads
+                # a variable on one iteration and sets it for the next
+                self.report('W001', node, name=name)
+                self.uses.append((symbol, getattr(node, 'offset', None)))
+        self.locate_symbols()
+        for symbol in symbol_table.symbols:
+            symbol.references = array('i', sorted(symbol.references))
+            if symbol.kind == 'variable' and symbol.name not in self.read:
+                declaration = self.declarations.get(symbol.name)
+                if declaration is None:
+                    # Declared before the analysis, where only its line is known
+                    self.diagnostics.append(Diagnostic('W004', None, symbol.line, name=symbol.name))
+                else:
+                    self.report('W004', declaration, name=symbol.name)
+        self.locate_diagnostics()
+        self.diagnostics.sort(key=lambda diagnostic: (diagnostic.line, diagnostic.column))
+        return self.diagnostics
+
+    def locate_symbols(self):
+        """Give the declared symbols their lines and the lines of their uses."""
+        starts = self.lines.starts if self.lines is not None else None
+        for name, node in self.declarations.items():
+            offset = getattr(node, 'offset', None)
+            if starts is not None and offset is not None:
+                self.symbol_table.lookup(name).line = bisect_right(starts, offset)
+        for symbol, offset in self.uses:
+            symbol.references.append(0 if starts is None or offset is None else bisect_right(starts, offset))
+
+    def locate_diagnostics(self):
+        if self.lines is None:
+            return
+        starts = self.lines.starts
+        for diagnostic in self.diagnostics:
+            offset = diagnostic.offset
+            if offset is not None:
+                line = bisect_right(starts, offset)
+                diagnostic.line = line
+                diagnostic.column = offset - starts[line - 1] + 1
+
+    @property
+    def errors(self):
+        return [diagnostic for diagnostic in self.diagnostics if diagnostic.severity == 'error']
+
+    def report(self, code, node, **arguments):
+        """Record diagnostic `code` at the start of `node` (None if it has no place)."""
+        self.diagnostics.append(Diagnostic(code, getattr(node, 'offset', None), **arguments))
+
+    def method(self, node_class):
+        method = self.dispatch.get(node_class)
+        if method is None:
+            method = self.dispatch[node_class] = getattr(type(self), 'visit_' + node_class.__name__)
+        return method
+
+    def visit(self, node, *operand_types):
+        return self.method(type(node))(self, node, *operand_types)
+
+    def visit_block(self, statements):
+        warned = False
+        for statement in statements:
+            if not self.reachable and not warned:
+                self.report('W003', statement)
+                warned = True
+            self.visit(statement)
+
+    def assign(self, variable):
+        symbol = self.symbol_table.lookup(variable.value)
+        if symbol is None:
+            self.symbol_table.declare(variable.value)
+            self.declarations[variable.value] = variable
+        else:
+            self.uses.append((symbol, getattr(variable, 'offset', None)))
+        self.assigned.add(variable.value)
+
+    # Statements
+
+    def visit_Assignment(self, node):
+        self.visit_expression(node.expression)
+        self.assign(node.variable)
+
+    def visit_PrintStatement(self, node):
+        for expression in node.expression:
+            self.visit_expression(expression)
+
+    def visit_ReturnStatement(self, node):
+        if node.expression is not None:
+            self.visit_expression(node.expression)
+        self.reachable = False
+
+    def visit_BreakStatement(self, node):
+        if not self.loop_depth:
+            self.report('E002', node)
+        self.reachable = False
+
+    def visit_ContinueStatement(self, node):
+        if not self.loop_depth:
+            self.report('E003', node)
+        self.reachable = False
+
+    def visit_IfStatement(self, node):
+        self.visit_expression(node.condition)
+        before = self.assigned
+        self.assigned = set(before)
+        self.visit_block(node.then_statement)
+        then_assigned, then_reachable = self.assigned, self.reachable
+        self.assigned, self.reachable = set(before), True
+        self.visit_block(node.else_statement or ())
+        # A branch that cannot fall through says nothing about what follows
+        if not self.reachable:
+            self.assigned = then_assigned
+        elif then_reachable:
+            self.assigned &= then_assigned
+        self.reachable = then_reachable or self.reachable
+
+    def visit_WhileStatement(self, node):
+        self.visit_expression(node.condition)
+        self.visit_loop_body(node.statement, None)
+
+    def visit_ForStatement(self, node):
+        for argument in node.range_expression.arguments:
+            argument_type = self.visit_expression(argument)
+            if argument_type is not None and argument_type not in ('int', 'bool'):
+                self.report('E005', argument, type=argument_type)
+        self.visit_loop_body(node.statement, node.loop_variable)
+
+    def visit_loop_body(self, statements, loop_variable):
+        # The body may run no times, so it assigns nothing for the code after the loop
+        before = self.assigned
+        self.assigned = set(before)
+        if loop_variable is not None:
+            self.assign(loop_variable)
+        self.loop_depth += 1
+        self.visit_block(statements)
+        self.loop_depth -= 1
+        self.assigned = before
+        self.reachable = True
+
+    # Expressions
+
+    def visit_expression(self, expression):
+        """Visit `expression` bottom-up and return its static type (or None).
+
+        Uses an explicit stack: a long operator chain is a tree as deep as
+        it is long.
+        """
+        types = []
+        stack = [(expression, False)]
+        while stack:
+            node, operands_done = stack.pop()
+            if isinstance(node, Term):
+                if not operands_done:
+                    stack += ((node, True), (node.right, False), (node.left, False))
+                    continue
+                right = types.pop()
+                types.append(self.visit(node, types.pop(), right))
+            elif isinstance(node, UnaryTerm):
+                if not operands_done:
+                    stack += ((node, True), (node.operand, False))
+                    continue
+                types.append(self.visit(node, types.pop()))
+            else:
+                types.append(self.visit(node))
+        return types[0]
+
+    def visit_Identifier(self, node):
+        name = node.value
+        self.read.add(name)
+        symbol = self.symbol_table.lookup(name)
+        if symbol is None:
+            self.unresolved.append((name, node))
+            return None
+        self.uses.append((symbol, getattr(node, 'offset', None)))
+        if name not in self.assigned:
+            self.report('W001', node, name=name)
+        return None
+
+    def visit_Number(self, node):
+        return literal_type(node.value)
+
+    visit_StringLiteral = visit_BooleanLiteral = visit_NullLiteral = visit_Number
+
+    def visit_Term(self, node, left, right):
+        operator = node.operator
+        if operator == '/' and isinstance(node.right, (Number, BooleanLiteral)) and not node.right.value:
+            self.report('W002', node)
+        result = operation_type(operator, left, right)
+        if result is None and left is not None and right is not None and operator not in ('and', 'or'):
+            self.report('E004', node, operator=operator, types=f"{left} and {right}")
+        return result
+
+    def visit_UnaryTerm(self, node, operand):
+        result = unary_type(node.operator, operand)
+        if result is None and operand is not None:
+            self.report('E004', node, operator=node.operator, types=operand)
+        return result
+
+# Example program with problems for the analyzer to find
+if __name__ == '__main__':
+    example = """
+    x = 10
+    if x > 5 {
+        y = x * 2
+    }
+    print(y, z)
+    total = "sum: " - 1
+    while x > 0 {
+        x -= 1
+        continue
+        print x
+    }
+    break
+    """
+
+    # Perform semantic analysis
+    tokens = lexer(example)
+    analyzer = SemanticAnalyzer(lines=tokens.line_index())
+    for diagnostic in analyzer.analyze(parse_Miniscript(tokens)):
+        print(diagnostic)
+    analyzer.symbol_table.print_table()
 
 
 
@@ -419,23 +1498,421 @@ except Exception as e:
 
 
 
-class CodeOptimization:
-    # ...
+LITERAL_NODES = (Number, StringLiteral, BooleanLiteral, NullLiteral)
 
-    def optimize_expression(self, expression):
-        # Implement expression simplification logic here
-        pass
+FOLDABLE_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '<': operator.lt,
+    '>': operator.gt,
+    '=': operator.eq,
+    '<=': operator.le,
+    '>=': operator.ge
+}
+
+# not (a < b) is a >= b and so on
+NEGATED_COMPARISONS = {'<': '>=', '>': '<=', '<=': '>', '>=': '<'}
+
+# Longest string constant folding may build ("-" * 1000000 stays a run-time job)
+FOLD_STRING_LIMIT = 4096
+
+OPTIMIZATION_LEVELS = {
+    0: (),
+    1: ('constant_folding', 'algebraic_simplification', 'dead_code_elimination'),
+    # Hoisting can leave constants at the top level, so fold again after it
+    2: ('constant_folding', 'algebraic_simplification', 'dead_code_elimination', 'loop_optimization',
+        'constant_folding', 'dead_code_elimination')
+}
 
-    def constant_folding(self, expression):
-        # Implement constant folding logic here
-        pass
 
-    def dead_code_elimination(self, node):
-        # Implement dead code elimination logic here
-        pass
+def literal_node(value):
+    if value is None:
+        return NullLiteral(None)
+    if isinstance(value, bool):
+        return BooleanLiteral(value)
+    if isinstance(value, str):
+        return StringLiteral(value)
+    return Number(value)
+
+
+def tree_size(statements):
+    """Number of nodes in a statement list, counting shared subtrees each time."""
+    count = 0
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def transform_expression(expression, function):
+    """Rebuild `expression` bottom-up, replacing every node by function(node).
+
+    `function` sees each node after its operands have been transformed.
+    Unchanged subtrees are kept as they are. The walk uses an explicit stack,
+    since a long operator chain is a tree as deep as it is long.
+    """
+    results = []
+    stack = [(expression, False)]
+    while stack:
+        node, operands_done = stack.pop()
+        if isinstance(node, Term):
+            if not operands_done:
+                stack += ((node, True), (node.right, False), (node.left, False))
+                continue
+            right = results.pop()
+            left = results.pop()
+            if left is not node.left or right is not node.right:
+                node = Term(left, node.operator, right)
+        elif isinstance(node, UnaryTerm):
+            if not operands_done:
+                stack += ((node, True), (node.operand, False))
+                continue
+            operand = results.pop()
+            if operand is not node.operand:
+                node = UnaryTerm(node.operator, operand)
+        results.append(function(node))
+    return results[0]
+
+
+def referenced_names(expression):
+    names = set()
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Identifier):
+            names.add(node.value)
+        else:
+            stack.extend(node.children)
+    return names
+
+
+def assigned_names(statements):
+    """Variables assigned anywhere in `statements`, loop variables included."""
+    names = set()
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Assignment):
+            names.add(node.variable.value)
+        elif isinstance(node, ForStatement):
+            names.add(node.loop_variable.value)
+            stack.extend(node.statement)
+        elif isinstance(node, IfStatement):
+            stack.extend(node.then_statement)
+            stack.extend(node.else_statement or ())
+        elif isinstance(node, WhileStatement):
+            stack.extend(node.statement)
+    return names
 
-    def loop_optimization(self, node):
-        # Implement loop optimization logic here
-        pass
 
+class CodeOptimization:
+    """Pass manager for AST optimizations.
+
+    Every pass takes a tuple of statements and returns a new one, building
+    new nodes rather than changing the (immutable) input tree. `level`
+    picks the passes the way -O0, -O1 and -O2 would; after optimize(),
+    `report` holds (pass name, seconds, nodes before, nodes after) for each
+    pass that ran.
+    """
+
+    def __init__(self, level=1):
+        self.level = level
+        self.passes = [(name, getattr(self, name)) for name in OPTIMIZATION_LEVELS[level]]
+        self.report = []
+
+    def optimize(self, statements):
+        statements = tuple(statements)
+        self.report = []
+        for name, optimization in self.passes:
+            before = tree_size(statements)
+            start = time.perf_counter()
+            statements = optimization(statements)
+            elapsed = time.perf_counter() - start
+            self.report.append((name, elapsed, before, tree_size(statements)))
+        return list(statements)
+
+    def format_report(self):
+        from tabulate import tabulate
+
+        rows = [[name, f"{elapsed * 1000:.3f}", before, after, after - before]
+                for name, elapsed, before, after in self.report]
+        return tabulate(rows, headers=['Pass', 'ms', 'Nodes before', 'Nodes after', 'Delta'])
 
+    def optimize_expression(self, expression):
+        """Fold and simplify a single expression."""
+        return self.simplify(self.fold(expression, {}))
+
+    # Constant folding and propagation
+
+    def constant_folding(self, statements):
+        return self.fold_block(statements, {})
+
+    def fold(self, expression, constants):
+        """Fold `expression`, replacing variables in `constants` by their values."""
+        def fold_node(node):
+            if isinstance(node, Identifier):
+                return constants.get(node.value, node)
+            if isinstance(node, Term):
+                left, right = node.left, node.right
+                if not isinstance(left, LITERAL_NODES):
+                    return node
+                # A constant left operand decides and/or on its own
+                if node.operator == 'and':
+                    return right if left.value else left
+                if node.operator == 'or':
+                    return left if left.value else right
+                if isinstance(right, LITERAL_NODES):
+                    return self.evaluate(node, FOLDABLE_OPERATORS[node.operator], left.value, right.value)
+                return node
+            if isinstance(node, UnaryTerm) and isinstance(node.operand, LITERAL_NODES):
+                if node.operator == 'not':
+                    return BooleanLiteral(not node.operand.value)
+                return self.evaluate(node, operator.neg, node.operand.value)
+            return node
+        return transform_expression(expression, fold_node)
+
+    def evaluate(self, node, function, *values):
+        if function is operator.mul:
+            # Size a repeated string up before building it
+            text, count = values if isinstance(values[0], str) else values[::-1]
+            if isinstance(text, str) and isinstance(count, int) and len(text) * count > FOLD_STRING_LIMIT:
+                return node
+        try:
+            value = function(*values)
+        except (TypeError, ZeroDivisionError, OverflowError, MemoryError):
+            # Leave the error to happen at run time
+            return node
+        if isinstance(value, str) and len(value) > FOLD_STRING_LIMIT:
+            return node
+        return literal_node(value)
+
+    def fold_block(self, statements, constants):
+        """Fold a block; `constants` maps variables to literal nodes and is
+        updated to what is known after the block."""
+        folded = []
+        for statement in statements:
+            if isinstance(statement, Assignment):
+                expression = self.fold(statement.expression, constants)
+                name = statement.variable.value
+                if isinstance(expression, LITERAL_NODES):
+                    constants[name] = expression
+                else:
+                    constants.pop(name, None)
+                if expression is not statement.expression:
+                    statement = Assignment(statement.variable, expression)
+            elif isinstance(statement, PrintStatement):
+                statement = PrintStatement(tuple(self.fold(expression, constants)
+                                                 for expression in statement.expression))
+            elif isinstance(statement, ReturnStatement) and statement.expression is not None:
+                statement = ReturnStatement(self.fold(statement.expression, constants))
+            elif isinstance(statement, IfStatement):
+                condition = self.fold(statement.condition, constants)
+                then_constants = dict(constants)
+                then_statement = self.fold_block(statement.then_statement, then_constants)
+                else_constants = dict(constants)
+                else_statement = statement.else_statement
+                if else_statement:
+                    else_statement = self.fold_block(else_statement, else_constants)
+                # Only what both branches agree on is known afterwards
+                constants.clear()
+                constants.update((name, value) for name, value in then_constants.items()
+                                 if else_constants.get(name) == value)
+                statement = IfStatement(statement.keyword, condition, then_statement, else_statement)
+            elif isinstance(statement, (WhileStatement, ForStatement)):
+                # A variable the loop assigns may change between iterations
+                for name in assigned_names((statement,)):
+                    constants.pop(name, None)
+                if isinstance(statement, WhileStatement):
+                    condition = self.fold(statement.condition, constants)
+                    body = self.fold_block(statement.statement, dict(constants))
+                    statement = WhileStatement(statement.keyword, condition, body)
+                else:
+                    arguments = tuple(self.fold(argument, constants)
+                                      for argument in statement.range_expression.arguments)
+                    body = self.fold_block(statement.statement, dict(constants))
+                    statement = ForStatement(statement.keyword, statement.loop_variable,
+                                             RangeExpression(arguments), body)
+            folded.append(statement)
+        return tuple(folded)
+
+    # Algebraic simplification
+
+    def algebraic_simplification(self, statements):
+        return self.map_expressions(statements, self.simplify, self.simplify_condition)
+
+    def simplify(self, expression):
+        """Apply identities that hold for every operand value.
+
+        x * 1 or x - 0 only simplify when x is certainly a number: for true,
+        true * 1 is 1, and for a string they are run-time errors. x + 0 is
+        left alone as well, since -0.0 + 0 is 0.0.
+        """
+        # ids of the rebuilt nodes that certainly evaluate to a number (or fail)
+        numeric = set()
+
+        def simplify_node(node):
+            if isinstance(node, UnaryTerm) and node.operator == 'not' and isinstance(node.operand, Term):
+                negated = NEGATED_COMPARISONS.get(node.operand.operator)
+                if negated:
+                    node = Term(node.operand.left, negated, node.operand.right)
+            elif isinstance(node, Term):
+                left, right = node.left, node.right
+                if node.operator == '*' and id(left) in numeric and isinstance(right, Number) and right.value == 1:
+                    node = left
+                elif node.operator == '*' and id(right) in numeric and isinstance(left, Number) and left.value == 1:
+                    node = right
+                elif node.operator == '-' and id(left) in numeric and isinstance(right, Number) and right.value == 0:
+                    node = left
+            if (isinstance(node, Number)
+                    or isinstance(node, UnaryTerm) and node.operator == '-' and id(node.operand) in numeric
+                    or isinstance(node, Term) and node.operator in ('+', '-', '*', '/')
+                    and id(node.left) in numeric and id(node.right) in numeric):
+                numeric.add(id(node))
+            return node
+        return transform_expression(expression, simplify_node)
+
+    def simplify_condition(self, expression):
+        """Simplify an if/while condition, where only its truth value matters."""
+        expression = self.simplify(expression)
+        while True:
+            if isinstance(expression, UnaryTerm) and expression.operator == 'not' \
+                    and isinstance(expression.operand, UnaryTerm) and expression.operand.operator == 'not':
+                expression = expression.operand.operand
+            elif isinstance(expression, Term) and isinstance(expression.right, BooleanLiteral) \
+                    and (expression.operator, expression.right.value) in (('and', True), ('or', False)):
+                expression = expression.left
+            else:
+                return expression
+
+    def map_expressions(self, statements, function, condition_function):
+        mapped = []
+        for statement in statements:
+            if isinstance(statement, Assignment):
+                statement = Assignment(statement.variable, function(statement.expression))
+            elif isinstance(statement, PrintStatement):
+                statement = PrintStatement(tuple(function(expression) for expression in statement.expression))
+            elif isinstance(statement, ReturnStatement) and statement.expression is not None:
+                statement = ReturnStatement(function(statement.expression))
+            elif isinstance(statement, IfStatement):
+                else_statement = statement.else_statement
+                if else_statement:
+                    else_statement = self.map_expressions(else_statement, function, condition_function)
+                statement = IfStatement(statement.keyword, condition_function(statement.condition),
+                                        self.map_expressions(statement.then_statement, function,
+                                                             condition_function),
+                                        else_statement)
+            elif isinstance(statement, WhileStatement):
+                statement = WhileStatement(statement.keyword, condition_function(statement.condition),
+                                           self.map_expressions(statement.statement, function,
+                                                                condition_function))
+            elif isinstance(statement, ForStatement):
+                arguments = tuple(function(argument) for argument in statement.range_expression.arguments)
+                statement = ForStatement(statement.keyword, statement.loop_variable, RangeExpression(arguments),
+                                         self.map_expressions(statement.statement, function, condition_function))
+            mapped.append(statement)
+        return tuple(mapped)
+
+    # Dead code elimination
+
+    def dead_code_elimination(self, statements):
+        """Drop branches and loops a constant condition rules out, and
+        statements after break, continue or return."""
+        kept = []
+        for statement in statements:
+            if isinstance(statement, IfStatement):
+                then_statement = self.dead_code_elimination(statement.then_statement)
+                else_statement = self.dead_code_elimination(statement.else_statement or ())
+                if isinstance(statement.condition, LITERAL_NODES):
+                    # Blocks do not open a scope, so the taken branch can be inlined
+                    kept.extend(then_statement if statement.condition.value else else_statement)
+                    if kept and isinstance(kept[-1], (BreakStatement, ContinueStatement, ReturnStatement)):
+                        break
+                    continue
+                statement = IfStatement(statement.keyword, statement.condition, then_statement,
+                                        else_statement or None)
+            elif isinstance(statement, WhileStatement):
+                if isinstance(statement.condition, LITERAL_NODES) and not statement.condition.value:
+                    continue
+                statement = WhileStatement(statement.keyword, statement.condition,
+                                           self.dead_code_elimination(statement.statement))
+            elif isinstance(statement, ForStatement):
+                if self.range_length(statement.range_expression) == 0:
+                    continue
+                statement = ForStatement(statement.keyword, statement.loop_variable, statement.range_expression,
+                                         self.dead_code_elimination(statement.statement))
+            kept.append(statement)
+            if isinstance(statement, (BreakStatement, ContinueStatement, ReturnStatement)):
+                break
+        return tuple(kept)
+
+    def range_length(self, range_expression):
+        """Number of iterations of a constant range, or None if not known."""
+        arguments = range_expression.arguments
+        if not all(isinstance(argument, Number) for argument in arguments):
+            return None
+        try:
+            return len(range(*(argument.value for argument in arguments)))
+        except (TypeError, ValueError):
+            return None
+
+    # Loop-invariant code motion
+
+    def loop_optimization(self, statements):
+        """Hoist invariant assignments out of loops.
+
+        Only the leading run of assignments in a loop body is considered, so
+        hoisting never reorders an assignment with the statements before it,
+        and an assignment is invariant when nothing it reads is assigned in
+        the rest of the loop and its variable is assigned nowhere else in the
+        loop, nor read by the loop condition. A while loop becomes
+        `if c { hoisted; while c { rest } }`, so the hoisted code still only
+        runs when the loop would; for loops are only handled when their range
+        is constant and not empty.
+        """
+        optimized = []
+        for statement in statements:
+            if isinstance(statement, IfStatement):
+                else_statement = statement.else_statement
+                if else_statement:
+                    else_statement = self.loop_optimization(else_statement)
+                statement = IfStatement(statement.keyword, statement.condition,
+                                        self.loop_optimization(statement.then_statement), else_statement)
+            elif isinstance(statement, WhileStatement):
+                body = self.loop_optimization(statement.statement)
+                hoisted, body = self.split_invariant(body, referenced_names(statement.condition), set())
+                statement = WhileStatement(statement.keyword, statement.condition, body)
+                if hoisted:
+                    statement = IfStatement('if', statement.condition, hoisted + (statement,), None)
+            elif isinstance(statement, ForStatement):
+                body = self.loop_optimization(statement.statement)
+                hoisted = ()
+                if self.range_length(statement.range_expression):
+                    loop_variable = {statement.loop_variable.value}
+                    hoisted, body = self.split_invariant(body, loop_variable, loop_variable)
+                optimized.extend(hoisted)
+                statement = ForStatement(statement.keyword, statement.loop_variable,
+                                         statement.range_expression, body)
+            optimized.append(statement)
+        return tuple(optimized)
+
+    def split_invariant(self, body, reserved, changing):
+        """Split `body` into (invariant leading assignments, rest).
+
+        A hoisted assignment may not assign a name in `reserved` nor read one
+        in `changing`, besides what the loop body itself assigns.
+        """
+        count = 0
+        while count < len(body) and isinstance(body[count], Assignment):
+            statement = body[count]
+            name = statement.variable.value
+            rest = body[count + 1:]
+            assigned_later = assigned_names(rest)
+            if (name in reserved or name in assigned_later
+                    or referenced_names(statement.expression) & (assigned_later | changing | {name})):
+                break
+            count += 1
+        return body[:count], body[count:]
@@ -1,123 +1,237 @@
-import pandas as pd
+import os
+import queue
+import sys
+import threading
 import tkinter as tk
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from tkinter.scrolledtext import ScrolledText
 from tkinter import ttk, filedialog
-import re
+from .the_project import (TOKEN_NAMES, CodeOptimization, MiniScriptError, SemanticAnalyzer, SymbolTable, lexer,
+                         stream_lexer)
+from .export import export_parse_table
+from .incremental import IncrementalDocument, edit_between
+from .inference import infer_types
+from .ll1 import Grammar
+from .profiling import Profiler
+from .vm import VM, generate_code
 
-# Define the regular expressions for recognizing MiniScript tokens
-KEYWORDS = r'\b(if|while|for|print|return|break|continue|else)\b'
-IDENTIFIERS = r'[a-zA-Z_][a-zA-Z_0-9]*'
-LITERALS = r'(\d+)|(["\']([^"\']|\\.)*["\']|true|false|null)'
-SYMBOLS = r'[+\-*/()=<>.,;:]|(\s+)|(\n)|(\r\n)|(\r)'
+# Milliseconds between checks on work running in the background
+POLL_INTERVAL = 50
 
+# Instructions a program run from the GUI may take, about two seconds' worth
+MAX_RUN_STEPS = 10_000_000
 
-# Define the token types
-TOKEN_TYPES = {
-    'KEYWORD': 1,
-    'IDENTIFIER': 2,
-    'LITERAL': 3,
-    'SYMBOL': 4
-}
 
+class TokenRows:
+    """Token table rows kept as the TokenBuffer batches the lexer produced.
 
-def lexer(code):
-    tokens = []
-    for match in re.finditer(r'|'.join([KEYWORDS, IDENTIFIERS, LITERALS, SYMBOLS]), code):
-        token = match.group()
-        if token in KEYWORDS:
-            tokens.append({'type': TOKEN_TYPES['KEYWORD'], 'value': token})
-        elif re.match(IDENTIFIERS, token):
-            tokens.append({'type': TOKEN_TYPES['IDENTIFIER'], 'value': token})
-        elif re.match(LITERALS, token):
-            if token.startswith('"') or token.startswith("'"):
-                tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': token})
-            else:
-                try:
-                    value = int(token)
-                    tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': value})
-                except ValueError:
-                    tokens.append({'type': TOKEN_TYPES['LITERAL'], 'value': token})
-        elif re.match(SYMBOLS, token):
-            if token.isspace():
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            elif token == '\n':
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            elif token == '\r\n':
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            elif token == '\r':
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-            else:
-                tokens.append({'type': TOKEN_TYPES['SYMBOL'], 'value': token})
-    return tokens
-
-def parse(tokens):
-    # Dummy parse function
-    # You need to implement actual parsing logic here
-    
-    return tokens
-
-
-
-def display_tokens_gui(tokens):
-    root = tk.Tk()
-    root.title("Tokenization and Parsing Output")
-
-    table_frame = ttk.Frame(root)
-    table_frame.pack(padx=10, pady=10)
-
-    headers = ['Type', 'Value']
-    table = []
-    for token in tokens:
-        if token['type'] == TOKEN_TYPES['KEYWORD']:
-            token_type = 'KEYWORD'
-        elif token['type'] == TOKEN_TYPES['IDENTIFIER']:
-            token_type = 'IDENTIFIER'
-        elif token['type'] == TOKEN_TYPES['LITERAL']:
-            token_type = 'LITERAL'
+    Row N is looked up by bisecting the batch boundaries, so millions of
+    tokens never get flattened into per-row lists.
+    """
+
+    def __init__(self):
+        self.batches = []
+        # Index of the first row of each batch
+        self.firsts = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, tokens):
+        if len(tokens):
+            self.batches.append(tokens)
+            self.firsts.append(self.count)
+            self.count += len(tokens)
+
+    def row(self, index):
+        batch = bisect_right(self.firsts, index) - 1
+        tokens = self.batches[batch]
+        index -= self.firsts[batch]
+        return TOKEN_NAMES[tokens.types[index]], tokens.value_at(index)
+
+
+class TokenTable(ttk.Frame):
+    """A Treeview over TokenRows holding only the rows on screen.
+
+    The scrollbar and mouse wheel move a window over the rows and each move
+    replaces the items shown, so the table costs the same for ten tokens as
+    for ten million, and can keep growing while the lexer runs.
+    """
+
+    headers = ('Type', 'Value')
+
+    def __init__(self, master, rows, height=20):
+        super().__init__(master)
+        self.rows = rows
+        self.height = height
+        self.first = 0
+        self.tree = ttk.Treeview(self, columns=self.headers, show='headings', height=height)
+        for col in self.headers:
+            self.tree.heading(col, text=col)
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.refresh()
+
+    def yview(self, action, *args):
+        if action == 'moveto':
+            self.first = int(float(args[0]) * len(self.rows))
+        elif action == 'scroll':
+            self.first += int(args[0]) * (self.height if args[1] == 'pages' else 1)
+        self.refresh()
+
+    def scroll(self, amount):
+        self.first += amount
+        self.refresh()
+
+    def refresh(self):
+        """Show the rows from `first` on, after scrolling or as rows arrive."""
+        total = len(self.rows)
+        self.first = max(0, min(self.first, total - self.height))
+        end = min(self.first + self.height, total)
+        self.tree.delete(*self.tree.get_children())
+        for index in range(self.first, end):
+            self.tree.insert("", "end", values=self.rows.row(index))
+        if total:
+            self.scrollbar.set(self.first / total, end / total)
         else:
-            token_type = 'SYMBOL'
-        table.append([token_type, token['value']])
+            self.scrollbar.set(0, 1)
+
+
+class ProfilePanel(ttk.Frame):
+    """Phase table of the last profiled compile, with a JSON export."""
+
+    headers = ('Phase', 'ms', 'Share', 'Tokens', 'Nodes', 'Peak bytes')
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.profiler = None
+        self.tree = ttk.Treeview(self, columns=self.headers, show='headings', height=7)
+        for col in self.headers:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=90, anchor='w' if col == 'Phase' else 'e')
+        self.tree.pack(fill='x')
+        self.save_button = ttk.Button(self, text="Save JSON", command=self.save, state='disabled')
+        self.save_button.pack(pady=2, anchor='e')
+
+    def show(self, profiler):
+        self.tree.delete(*self.tree.get_children())
+        self.profiler = profiler if profiler.enabled else None
+        if self.profiler is None:
+            self.save_button.state(['disabled'])
+            return
+        for row in profiler.rows():
+            self.tree.insert('', 'end', values=row)
+        self.save_button.state(['!disabled'])
+
+    def save(self):
+        path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[("JSON", "*.json")])
+        if path:
+            with open(path, 'w') as file:
+                file.write(self.profiler.to_json())
+
+
+def display_tokens_gui(master, batches, total):
+    """Show the tokens of `batches` in a new window as they are lexed.
+
+    `batches` yields (TokenBuffer, amount of input done) pairs and is run on
+    a worker thread; the window polls for new batches and tracks progress
+    against `total`.
+    """
+    window = tk.Toplevel(master)
+    window.title("Tokenization and Parsing Output")
+
+    table_frame = ttk.Frame(window)
+    table_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
     table_label = ttk.Label(table_frame, text="Tokenized and Parsed Output")
     table_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
 
-    token_table = ttk.Treeview(table_frame, columns=headers, show='headings')
-    for col in headers:
-        token_table.heading(col, text=col)
-    for row in table:
-        token_table.insert("", "end", values=row)
+    rows = TokenRows()
+    token_table = TokenTable(table_frame, rows)
     token_table.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
+    table_frame.columnconfigure(0, weight=1)
+    table_frame.rowconfigure(1, weight=1)
+    progress = ttk.Progressbar(table_frame, maximum=max(total, 1))
+    progress.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
+    status = ttk.Label(table_frame, text="Lexing...")
+    status.grid(row=3, column=0, padx=5, sticky="w")
+
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def work():
+        try:
+            for item in batches:
+                if stop.is_set():
+                    return
+                results.put(item)
+        except (MiniScriptError, OSError, UnicodeError) as error:
+            results.put(error)
+        results.put(None)
+
+    def poll():
+        if stop.is_set():
+            return
+        count = len(rows)
+        message = None
+        try:
+            while True:
+                item = results.get_nowait()
+                if item is None:
+                    message = f"{len(rows):,} tokens"
+                    break
+                if isinstance(item, Exception):
+                    message = f"Error: {item}"
+                    break
+                tokens, done = item
+                rows.add(tokens)
+                progress['value'] = done
+        except queue.Empty:
+            pass
+        if len(rows) != count:
+            token_table.refresh()
+        if message is None:
+            status['text'] = f"Lexing... {len(rows):,} tokens"
+            window.after(POLL_INTERVAL, poll)
+        else:
+            progress['value'] = progress['maximum']
+            status['text'] = message
 
-    root.mainloop()
-
-def tokenize_and_parse(code):
-    tokens = lexer(code)
-    parsed_tokens = parse(tokens)
-    display_tokens_gui(parsed_tokens)
+    def close():
+        stop.set()
+        window.destroy()
 
-def choose_file_and_tokenize():
-    file_path = filedialog.askopenfilename(title="Choose a file", filetypes=[("Text files", "*.txt")])
-    if file_path:
-        with open(file_path, 'r') as file:
-            code = file.read()
-        tokenize_and_parse(code)
+    window.protocol("WM_DELETE_WINDOW", close)
+    threading.Thread(target=work, daemon=True).start()
+    poll()
 
-# GUI Setup
-root = tk.Tk()
-root.title("Tokenization and Parsing GUI")
-root.geometry("600x500")  # Set initial window size
 
-style = ttk.Style()
-style.configure("TButton", foreground="blue", background="blue", font=("Helvetica", 12, "bold"))
-style.configure("TLabel", font=("Helvetica", 14, "bold"))
+def lex_text(code):
+    yield lexer(code), len(code)
 
-load_button = ttk.Button(root, text="Choose File", command=choose_file_and_tokenize)
-load_button.pack(pady=10)
 
-root.mainloop()
+def lex_file(file_path):
+    # Lex the file chunk by chunk instead of reading it into memory first
+    with open(file_path, 'rb') as file:
+        for tokens in stream_lexer(file):
+            yield tokens, file.tell()
 
 
+def tokenize_and_parse(master, code):
+    display_tokens_gui(master, lex_text(code), len(code))
 
+def choose_file_and_tokenize(master):
+    file_path = filedialog.askopenfilename(title="Choose a file", filetypes=[("Text files", "*.txt")])
+    if file_path:
+        display_tokens_gui(master, lex_file(file_path), os.path.getsize(file_path))
 
 
 
@@ -201,18 +315,20 @@ parse_table = {
     'digit': {'digit': 'digit'}
 }
 
-# Creating DataFrame from Parse Table
-df = pd.DataFrame.from_dict(parse_table, orient='index')
-df.index.name = 'Non-terminal'
-df.columns.name = 'Terminal'
-df.fillna('', inplace=True)
-df = df.rename(columns=lambda x: 'digit' if x.isdigit() else x)
-
-# Displaying Parse Table
-print()
-print("PARSE TABLE:")
-print()
-print(df)
+def print_parse_table():
+    # Displaying Parse Table, one row per filled cell
+    print()
+    print("PARSE TABLE:")
+    print()
+    export_parse_table(parse_table, sys.stdout, 'csv')
+
+    # Checking the Parse Table for LL(1) conflicts
+    grammar = Grammar.from_parse_table(parse_table)
+    table, conflicts = grammar.build_table()
+    print()
+    print(f"LL(1) CONFLICTS: {len(conflicts)}")
+    for nonterminal, terminal, productions in conflicts:
+        print(f"{nonterminal}, {terminal}: " + " | ".join(grammar.format_production(p) for p in productions))
 
 # Parse Tree created using rules.
 # Sample input sequences for different statements
@@ -226,101 +342,158 @@ while_st = ["IDENTIFIER", "LPAREN", "IDENTIFIER", ["GREATER_THAN", "LESS_THAN",
 
 
 
-# Define the Compiler class and SymbolTable class
-class SymbolTable:
-    def __init__(self):
-        self.table = {}
-
-    def insert(self, symbol, value):
-        self.table[symbol] = value
-
-    def lookup(self, symbol):
-        return self.table.get(symbol)
-
-    def print_table(self):
-        for symbol, value in self.table.items():
-            print(f"{symbol}: {value}")
-
+# Define the Compiler class
 class Compiler:
-    def __init__(self):
+    def __init__(self, optimization_level=1, profiling=False, trace_memory=False, max_steps=MAX_RUN_STEPS):
         self.symbol_table = SymbolTable()
         self.output_text = ""
+        self.optimization_level = optimization_level
+        # Instructions a run may take before it is stopped as runaway
+        self.max_steps = max_steps
+        self.document = None
+        # Whether compiles record a per-phase profile in self.profiler
+        self.profiling = profiling
+        self.trace_memory = trace_memory
+        self.profiler = Profiler(enabled=False)
 
     def compile(self, source_code):
-        # Tokenize the source code
-        tokens = self.tokenize(source_code)
-
-        # Parse the tokens
-        self.parse(tokens)
-
-    def tokenize(self, source_code):
-        # This is a very simple tokenizer and does not handle all possible cases
-        tokens = source_code.split()
-        return tokens
+        self.output_text = ""
+        self.symbol_table = SymbolTable()
+        self.profiler = Profiler(self.profiling, self.profiling and self.trace_memory)
 
-    def parse(self, tokens):
-        for i in range(0, len(tokens), 2):
-            symbol = tokens[i]
-            value = tokens[i+1]
-            self.symbol_table.insert(symbol, value)
+        # Re-lex and re-parse only what changed since the last compile
+        if self.document is None:
+            self.document = IncrementalDocument(source_code, self.profiler)
+        else:
+            self.document.profiler = self.profiler
+            self.document.edit(*edit_between(self.document.source, source_code))
+        if self.document.error is not None:
+            raise self.document.error
+        self.ast = self.document.statements
 
     def semantic_analysis(self):
-        # Perform semantic analysis on the AST
-        # This is a very basic example and does not handle all possible cases
-        for symbol, value in self.symbol_table.table.items():
-            if value == 'int':
-                self.output_text += f"Variable {symbol} is an integer\n"
-            elif value == 'float':
-                self.output_text += f"Variable {symbol} is a float\n"
-            else:
-                self.output_text += f"Unknown type for variable {symbol}\n"
+        # Perform semantic analysis on the AST, declaring its variables
+        analyzer = SemanticAnalyzer(lines=self.document.tokens.line_index())
+        self.diagnostics = self.profiler.run('semantic', analyzer.analyze, self.ast)
+        self.symbol_table = analyzer.symbol_table
+        infer_types(self.ast).annotate(self.symbol_table)
+        for diagnostic in self.diagnostics:
+            self.output_text += f"{diagnostic}\n"
+        self.output_text += "Symbol table:\n" + self.symbol_table.format_table() + "\n"
+        if analyzer.errors:
+            raise MiniScriptError(f"Semantic analysis found {len(analyzer.errors)} error(s)")
 
     def generate_code(self):
-        # Generate machine code or bytecode
-        # This is a very basic example and does not handle all possible cases
+        # Optimize and lower the AST to bytecode, then run it on the VM
+        optimizer = CodeOptimization(self.optimization_level)
+        statements = self.profiler.run('optimize', optimizer.optimize, self.ast)
+        self.bytecode = self.profiler.run('codegen', generate_code, statements, self.symbol_table)
+        if optimizer.report:
+            self.output_text += f"Optimization (-O{self.optimization_level}):\n{optimizer.format_report()}\n"
         self.output_text += "Generated code:\n"
-        for symbol, value in self.symbol_table.table.items():
-            self.output_text += f"{symbol}: {value}\n"
-
-# GUI Setup
-root = tk.Tk()
-root.title("Compiler Output GUI")
-root.geometry("600x500")
-
-style = ttk.Style()
-style.configure("TButton", foreground="blue", background="blue", font=("Helvetica", 12, "bold"))
-style.configure("TLabel", font=("Helvetica", 14, "bold"))
-
-# Define the Compiler instance
-compiler = Compiler()
-
-# Function to compile the source code
-def compile_source_code():
-    source_code = source_code_text.get("1.0", tk.END)
-    compiler.compile(source_code)
-    compiler.semantic_analysis()
-    compiler.generate_code()
-    update_output_text()
-
-# Function to update the output text in the GUI
-def update_output_text():
-    output_text.delete("1.0", tk.END)
-    output_text.insert(tk.END, compiler.output_text)
-
-# Text widget for entering source code
-source_code_label = ttk.Label(root, text="Enter Source Code:")
-source_code_label.pack(pady=5)
-source_code_text = ScrolledText(root, height=10, width=60)
-source_code_text.pack(pady=5)
-
-# Button to compile source code
-compile_button = ttk.Button(root, text="Compile", command=compile_source_code)
-compile_button.pack(pady=5)
-
-# Text widget to display compiler output
-output_text_label = ttk.Label(root, text="Compiler Output:")
-output_text_label.pack(pady=5)
-output_text = ScrolledText(root, height=10, width=60)
-output_text.pack(pady=5)
-
-root.mainloop()
+        self.output_text += self.bytecode.disassemble() + "\n"
+        self.output_text += "Output:\n"
+        output = []
+        try:
+            self.profiler.run('run', VM(output.append, self.max_steps).run, self.bytecode)
+        finally:
+            self.output_text += ''.join(output)
+
+def main():
+    print_parse_table()
+
+    # GUI Setup
+    root = tk.Tk()
+    root.title("Compiler Output GUI")
+    root.geometry("600x760")
+
+    style = ttk.Style()
+    style.configure("TButton", foreground="blue", background="blue", font=("Helvetica", 12, "bold"))
+    style.configure("TLabel", font=("Helvetica", 14, "bold"))
+
+    # Define the Compiler instance
+    compiler = Compiler()
+
+    # Compilation runs on one worker thread, so the window stays responsive and
+    # the compiler's incremental document is only ever touched by one compile
+    compile_pool = ThreadPoolExecutor(max_workers=1)
+    compile_job = None
+
+    def run_compiler(source_code):
+        try:
+            compiler.compile(source_code)
+            compiler.semantic_analysis()
+            compiler.generate_code()
+        except MiniScriptError as error:
+            compiler.output_text += f"Error: {error}\n"
+        except Exception as error:
+            # A compiler bug: show it, and start the next compile from a fresh document
+            compiler.document = None
+            compiler.output_text += f"Internal error: {error!r}\n"
+
+    # Function to compile the source code
+    def compile_source_code():
+        nonlocal compile_job
+        source_code = source_code_text.get("1.0", tk.END)
+        compiler.profiling = profile_variable.get()
+        compiler.trace_memory = memory_variable.get()
+        compile_button.state(["disabled"])
+        status_label["text"] = "Compiling..."
+        compile_job = compile_pool.submit(run_compiler, source_code)
+        root.after(POLL_INTERVAL, poll_compile)
+
+    def poll_compile():
+        if not compile_job.done():
+            root.after(POLL_INTERVAL, poll_compile)
+            return
+        compile_button.state(["!disabled"])
+        status_label["text"] = ""
+        update_output_text()
+        compile_job.result()
+
+    # Function to update the output text in the GUI
+    def update_output_text():
+        output_text.delete("1.0", tk.END)
+        output_text.insert(tk.END, compiler.output_text)
+        profile_panel.show(compiler.profiler)
+
+    # Button to lex a file into the token table
+    load_button = ttk.Button(root, text="Choose File", command=lambda: choose_file_and_tokenize(root))
+    load_button.pack(pady=5)
+
+    # Text widget for entering source code
+    source_code_label = ttk.Label(root, text="Enter Source Code:")
+    source_code_label.pack(pady=5)
+    source_code_text = ScrolledText(root, height=10, width=60)
+    source_code_text.pack(pady=5)
+
+    # Buttons to compile source code or show its tokens
+    button_frame = ttk.Frame(root)
+    button_frame.pack(pady=5)
+    compile_button = ttk.Button(button_frame, text="Compile", command=compile_source_code)
+    compile_button.pack(side="left", padx=5)
+    tokens_button = ttk.Button(button_frame, text="Show Tokens",
+                               command=lambda: tokenize_and_parse(root, source_code_text.get("1.0", tk.END)))
+    tokens_button.pack(side="left", padx=5)
+    profile_variable = tk.BooleanVar(value=False)
+    ttk.Checkbutton(button_frame, text="Profile", variable=profile_variable).pack(side="left", padx=5)
+    memory_variable = tk.BooleanVar(value=False)
+    ttk.Checkbutton(button_frame, text="Trace memory", variable=memory_variable).pack(side="left")
+    status_label = ttk.Label(root, text="")
+    status_label.pack()
+
+    # Text widget to display compiler output
+    output_text_label = ttk.Label(root, text="Compiler Output:")
+    output_text_label.pack(pady=5)
+    output_text = ScrolledText(root, height=10, width=60)
+    output_text.pack(pady=5)
+
+    # Per-phase profile of the last compile, when "Profile" is checked
+    profile_panel = ProfilePanel(root)
+    profile_panel.pack(pady=5, padx=10, fill="x")
+
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""Python backend: lower the syntax tree to a Python function and let CPython run it.
+
+The program becomes the body of `def _program(_print, _range): ...`, so
+MiniScript variables are the function's fast locals, operators are
+CPython's own, and `for i in range(n)` is a native range loop. Built
+through the `ast` module rather than source text, so compile() never has to
+re-parse; to_source() shows the equivalent Python.
+
+Runs behave like the VM's: the same output, the same return value and the
+same MiniScriptError messages.
+"""
+import ast
+import keyword
+import sys
+from collections import OrderedDict
+
+from .the_project import (Assignment, BooleanLiteral, BreakStatement, ContinueStatement, ForStatement,
+                         Identifier, IfStatement, MiniScriptError, NullLiteral, Number, PrintStatement,
+                         ReturnStatement, StringLiteral, Term, UnaryTerm, WhileStatement)
+from .vm import format_value
+
+FUNCTION_NAME = '_program'
+
+BINARY_OPERATORS = {
+    '+': ast.Add,
+    '-': ast.Sub,
+    '*': ast.Mult,
+    '/': ast.Div,
+}
+
+COMPARISON_OPERATORS = {
+    '<': ast.Lt,
+    '>': ast.Gt,
+    '=': ast.Eq,
+    '<=': ast.LtE,
+    '>=': ast.GtE,
+}
+
+# Operator chains longer than this are evaluated one step per statement
+# into a temporary: CPython's compiler recurses once per nested operator
+SPINE_LIMIT = 64
+
+# Code objects kept by compile_program, keyed on the statements
+CODE_CACHE_SIZE = 128
+
+
+def python_name(name):
+    """The local a MiniScript variable lives in.
+
+    Names that are Python keywords, or that start with an underscore and
+    could clash with the backend's own _print, _range and _t temporaries,
+    get a `_v` prefix.
+    """
+    if keyword.iskeyword(name) or name.startswith('_'):
+        return '_v' + name
+    return name
+
+
+def undefined_name(error):
+    """The MiniScript variable a NameError is about."""
+    # UnboundLocalError leaves `name` unset, but every message quotes it
+    name = error.name or str(error).split("'")[1]
+    return name[2:] if name.startswith('_v') else name
+
+
+class PythonTranspiler:
+    """Lower a parsed program (a list of statements) to an ast.Module."""
+
+    def __init__(self):
+        self.temporaries = 0
+        self.loop_depth = 0
+        self.statements = {
+            PrintStatement: self.transpile_PrintStatement,
+            IfStatement: self.transpile_IfStatement,
+            WhileStatement: self.transpile_WhileStatement,
+            ForStatement: self.transpile_ForStatement,
+            Assignment: self.transpile_Assignment,
+            BreakStatement: self.transpile_BreakStatement,
+            ContinueStatement: self.transpile_ContinueStatement,
+            ReturnStatement: self.transpile_ReturnStatement
+        }
+
+    def transpile(self, statements):
+        body = self.transpile_block(statements)
+        arguments = ast.arguments(posonlyargs=[], args=[ast.arg('_print'), ast.arg('_range')], kwonlyargs=[],
+                                  kw_defaults=[], defaults=[])
+        function = ast.FunctionDef(FUNCTION_NAME, arguments, body, [], None)
+        return ast.fix_missing_locations(ast.Module([function], []))
+
+    def transpile_block(self, statements):
+        body = []
+        for statement in statements:
+            transpile = self.statements.get(type(statement))
+            if transpile is None:
+                raise MiniScriptError(f"Cannot generate code for {statement.type}")
+            body.extend(transpile(statement))
+        return body or [ast.Pass()]
+
+    # Statements; each returns a list of Python statements
+
+    def transpile_PrintStatement(self, node):
+        setup = []
+        values = [self.transpile_expression(expression, setup) for expression in node.expression]
+        return setup + [ast.Expr(ast.Call(load('_print'), values, []))]
+
+    def transpile_Assignment(self, node):
+        setup = []
+        value = self.transpile_expression(node.expression, setup)
+        return setup + [ast.Assign([store(python_name(node.variable.value))], value)]
+
+    def transpile_IfStatement(self, node):
+        setup = []
+        condition = self.transpile_expression(node.condition, setup)
+        else_body = self.transpile_block(node.else_statement) if node.else_statement else []
+        return setup + [ast.If(condition, self.transpile_block(node.then_statement), else_body)]
+
+    def transpile_WhileStatement(self, node):
+        setup = []
+        condition = self.transpile_expression(node.condition, setup)
+        self.loop_depth += 1
+        body = self.transpile_block(node.statement)
+        self.loop_depth -= 1
+        if setup:
+            # The condition needs statements of its own: test it at the top of the body
+            exit_test = ast.If(ast.UnaryOp(ast.Not(), condition), [ast.Break()], [])
+            return [ast.While(ast.Constant(True), setup + [exit_test] + body, [])]
+        return [ast.While(condition, body, [])]
+
+    def transpile_ForStatement(self, node):
+        setup = []
+        arguments = [self.transpile_expression(argument, setup) for argument in node.range_expression.arguments]
+        self.loop_depth += 1
+        body = self.transpile_block(node.statement)
+        self.loop_depth -= 1
+        target = store(python_name(node.loop_variable.value))
+        return setup + [ast.For(target, ast.Call(load('_range'), arguments, []), body, [])]
+
+    def transpile_BreakStatement(self, node):
+        if not self.loop_depth:
+            raise MiniScriptError("'break' outside loop")
+        return [ast.Break()]
+
+    def transpile_ContinueStatement(self, node):
+        if not self.loop_depth:
+            raise MiniScriptError("'continue' outside loop")
+        return [ast.Continue()]
+
+    def transpile_ReturnStatement(self, node):
+        if node.expression is None:
+            return [ast.Return(None)]
+        setup = []
+        value = self.transpile_expression(node.expression, setup)
+        return setup + [ast.Return(value)]
+
+    # Expressions
+
+    def transpile_expression(self, node, setup):
+        """Python expression for `node`; statements it needs first go to `setup`.
+
+        A long operator chain, or one whose right operand needs statements
+        of its own, is continued in a temporary, one step per statement:
+        `_t = a; _t = _t + b; ...` keeps the Python tree shallow, and a step
+        of and/or becomes an if, so the right operand still only runs when
+        it would in the VM.
+        """
+        spine = []
+        while isinstance(node, Term):
+            spine.append(node)
+            node = node.left
+        left = self.transpile_operand(node, setup)
+        temporary = None
+        if len(spine) > SPINE_LIMIT:
+            temporary = self.spill(left, setup)
+        for term in reversed(spine):
+            operator = term.operator
+            right_setup = []
+            right = self.transpile_expression(term.right, right_setup)
+            if right_setup and temporary is None:
+                temporary = self.spill(left, setup)
+            if temporary is None:
+                left = self.combine(left, operator, right)
+            elif operator == 'and' or operator == 'or':
+                test = load(temporary) if operator == 'and' else ast.UnaryOp(ast.Not(), load(temporary))
+                setup.append(ast.If(test, right_setup + [ast.Assign([store(temporary)], right)], []))
+            else:
+                setup.extend(right_setup)
+                setup.append(ast.Assign([store(temporary)], self.combine(load(temporary), operator, right)))
+        return left if temporary is None else load(temporary)
+
+    def spill(self, value, setup):
+        """Store `value` in a new temporary; returns the temporary's name."""
+        temporary = f'_t{self.temporaries}'
+        self.temporaries += 1
+        setup.append(ast.Assign([store(temporary)], value))
+        return temporary
+
+    def combine(self, left, operator, right):
+        if operator in BINARY_OPERATORS:
+            return ast.BinOp(left, BINARY_OPERATORS[operator](), right)
+        if operator in COMPARISON_OPERATORS:
+            return ast.Compare(left, [COMPARISON_OPERATORS[operator]()], [right])
+        if operator == 'and':
+            return ast.BoolOp(ast.And(), [left, right])
+        if operator == 'or':
+            return ast.BoolOp(ast.Or(), [left, right])
+        raise MiniScriptError(f"Cannot generate code for operator {operator!r}")
+
+    def transpile_operand(self, node, setup):
+        if isinstance(node, Identifier):
+            return load(python_name(node.value))
+        if isinstance(node, (Number, StringLiteral, BooleanLiteral, NullLiteral)):
+            return ast.Constant(node.value)
+        if isinstance(node, UnaryTerm):
+            operator = ast.Not() if node.operator == 'not' else ast.USub()
+            return ast.UnaryOp(operator, self.transpile_expression(node.operand, setup))
+        raise MiniScriptError(f"Cannot generate code for {node.type}")
+
+
+def load(name):
+    return ast.Name(name, ast.Load())
+
+
+def store(name):
+    return ast.Name(name, ast.Store())
+
+
+def transpile(statements):
+    """The program as an ast.Module defining _program(_print, _range)."""
+    return PythonTranspiler().transpile(statements)
+
+
+def to_source(statements):
+    return ast.unparse(transpile(statements))
+
+
+_code_cache = OrderedDict()
+
+
+def compile_program(statements):
+    """The code object of the transpiled module, compiled once per distinct program.
+
+    Syntax trees compare and hash structurally, so an equal program parsed
+    again finds the code object of the first. CPython refuses a few
+    programs MiniScript allows, such as loops nested more than 20 deep;
+    those raise MiniScriptError.
+    """
+    key = tuple(statements)
+    code = _code_cache.get(key)
+    if code is not None:
+        _code_cache.move_to_end(key)
+        return code
+    try:
+        code = compile(transpile(statements), '<miniscript>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError) as error:
+        raise MiniScriptError(f"Program too complex for the Python backend: {error}") from None
+    _code_cache[key] = code
+    while len(_code_cache) > CODE_CACHE_SIZE:
+        _code_cache.popitem(last=False)
+    return code
+
+
+class PythonProgram:
+    """A transpiled program, ready to run any number of times."""
+
+    def __init__(self, statements):
+        namespace = {'__builtins__': {}}
+        exec(compile_program(statements), namespace)
+        self.function = namespace[FUNCTION_NAME]
+
+    def run(self, write):
+        """Run the program, passing each printed line to `write`; returns its return value."""
+        def print_values(*values):
+            write(' '.join(map(format_value, values)) + '\n')
+
+        try:
+            return self.function(print_values, range)
+        except NameError as error:
+            raise MiniScriptError(f"Undefined variable: '{undefined_name(error)}'") from None
+        except ZeroDivisionError:
+            raise MiniScriptError("Division by zero") from None
+        except TypeError as error:
+            raise MiniScriptError(f"Type error: {error}") from None
+        except ValueError as error:
+            raise MiniScriptError(f"Value error: {error}") from None
+        except OverflowError as error:
+            raise MiniScriptError(f"Overflow error: {error}") from None
+        except MemoryError:
+            raise MiniScriptError("Out of memory") from None
+
+
+def run_python(statements, write=None):
+    """Run `statements` on the Python backend, as vm.run runs bytecode."""
+    return PythonProgram(statements).run(write if write is not None else sys.stdout.write)
@@ -0,0 +1,489 @@
+import sys
+from array import array
+
+from .inference import infer_types
+from .the_project import (FOLDABLE_OPERATORS, LITERAL_NODES, NUMERIC_TYPES, Assignment, BooleanLiteral,
+                         BreakStatement, ContinueStatement, ForStatement, Identifier, IfStatement, MiniScriptError,
+                         NullLiteral, Number, PrintStatement, ReturnStatement, StringLiteral, SymbolTable, Term,
+                         UnaryTerm, WhileStatement)
+
+# Opcodes. Every instruction is four bytes: the opcode and a 24-bit
+# little-endian argument (a constant, variable slot, count or jump target).
+LOAD_CONST = 1
+LOAD_VAR = 2
+STORE_VAR = 3
+ADD = 4
+SUBTRACT = 5
+MULTIPLY = 6
+DIVIDE = 7
+LESS = 8
+GREATER = 9
+EQUAL = 10
+LESS_EQUAL = 11
+GREATER_EQUAL = 12
+NOT = 13
+NEGATE = 14
+JUMP = 15
+JUMP_IF_FALSE = 16
+JUMP_IF_FALSE_OR_POP = 17
+JUMP_IF_TRUE_OR_POP = 18
+GET_ITER = 19
+FOR_ITER = 20
+POP = 21
+PRINT = 22
+RETURN = 23
+
+# Numeric opcodes, emitted where type inference proves both operands are
+# numbers. The left operand is a variable slot, the right a variable slot
+# (_VAR_VAR) or a constant (_VAR_CONST), packed as left << 12 | right; the
+# result is pushed. The operands being typed means the variables are set.
+ADD_VAR_VAR = 24
+ADD_VAR_CONST = 25
+SUBTRACT_VAR_VAR = 26
+SUBTRACT_VAR_CONST = 27
+MULTIPLY_VAR_VAR = 28
+MULTIPLY_VAR_CONST = 29
+DIVIDE_VAR_VAR = 30
+DIVIDE_VAR_CONST = 31
+LESS_VAR_VAR = 32
+LESS_VAR_CONST = 33
+GREATER_VAR_VAR = 34
+GREATER_VAR_CONST = 35
+EQUAL_VAR_VAR = 36
+EQUAL_VAR_CONST = 37
+LESS_EQUAL_VAR_VAR = 38
+LESS_EQUAL_VAR_CONST = 39
+GREATER_EQUAL_VAR_VAR = 40
+GREATER_EQUAL_VAR_CONST = 41
+
+OPCODE_NAMES = {value: name for name, value in globals().items() if isinstance(value, int) and name.isupper()}
+
+INSTRUCTION_SIZE = 4
+MAX_ARGUMENT = (1 << 24) - 1
+
+BINARY_OPCODES = {
+    '+': ADD,
+    '-': SUBTRACT,
+    '*': MULTIPLY,
+    '/': DIVIDE,
+    '<': LESS,
+    '>': GREATER,
+    '=': EQUAL,
+    '<=': LESS_EQUAL,
+    '>=': GREATER_EQUAL
+}
+
+# (variable-variable, variable-constant) opcode of each operator
+NUMERIC_OPCODES = {
+    '+': (ADD_VAR_VAR, ADD_VAR_CONST),
+    '-': (SUBTRACT_VAR_VAR, SUBTRACT_VAR_CONST),
+    '*': (MULTIPLY_VAR_VAR, MULTIPLY_VAR_CONST),
+    '/': (DIVIDE_VAR_VAR, DIVIDE_VAR_CONST),
+    '<': (LESS_VAR_VAR, LESS_VAR_CONST),
+    '>': (GREATER_VAR_VAR, GREATER_VAR_CONST),
+    '=': (EQUAL_VAR_VAR, EQUAL_VAR_CONST),
+    '<=': (LESS_EQUAL_VAR_VAR, LESS_EQUAL_VAR_CONST),
+    '>=': (GREATER_EQUAL_VAR_VAR, GREATER_EQUAL_VAR_CONST)
+}
+
+FIRST_NUMERIC_OPCODE = ADD_VAR_VAR
+NUMERIC_OPERATORS = {opcode: operator for operator, opcodes in NUMERIC_OPCODES.items() for opcode in opcodes}
+
+OPERAND_BITS = 12
+OPERAND_MASK = (1 << OPERAND_BITS) - 1
+
+
+class Bytecode:
+    """A compiled MiniScript program.
+
+    `code` holds the instructions, `constants` the constant pool that
+    LOAD_CONST indexes and `names` the variable for each slot LOAD_VAR and
+    STORE_VAR index. Jump arguments are instruction numbers.
+    """
+
+    def __init__(self, code, constants, names):
+        self.code = code
+        self.constants = constants
+        self.names = names
+
+    def __len__(self):
+        return len(self.code) // INSTRUCTION_SIZE
+
+    def instructions(self):
+        """Yield (opcode, argument) pairs."""
+        code = self.code
+        for i in range(0, len(code), INSTRUCTION_SIZE):
+            yield code[i], code[i + 1] | code[i + 2] << 8 | code[i + 3] << 16
+
+    def disassemble(self):
+        lines = []
+        for index, (opcode, argument) in enumerate(self.instructions()):
+            line = f"{index:>6} {OPCODE_NAMES[opcode]:<22}{argument}"
+            if opcode == LOAD_CONST:
+                line += f" ({format_value(self.constants[argument])})"
+            elif opcode in (LOAD_VAR, STORE_VAR):
+                line += f" ({self.names[argument]})"
+            elif opcode >= FIRST_NUMERIC_OPCODE:
+                left, right = argument >> OPERAND_BITS, argument & OPERAND_MASK
+                right = format_value(self.constants[right]) if opcode & 1 else self.names[right]
+                line += f" ({self.names[left]} {NUMERIC_OPERATORS[opcode]} {right})"
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+class CodeGenerator:
+    """Lower a parsed program (a list of statements) to Bytecode.
+
+    Variables get the slots of their global-scope symbols in `symbol_table`
+    (pass one filled by collect_symbols to share its numbering); names it
+    does not know yet are declared as they come. With `types` (a
+    TypeInference of the same statements), operations on variables and
+    constants known to be numbers get the numeric opcodes.
+    """
+
+    def __init__(self, symbol_table=None, types=None):
+        self.code = array('B')
+        self.constants = []
+        self.constant_slots = {}
+        self.symbol_table = SymbolTable() if symbol_table is None else symbol_table
+        self.types = types
+        # (continue target, break jumps to patch, pops needed to leave) per enclosing loop
+        self.loops = []
+        self.statements = {
+            PrintStatement: self.generate_PrintStatement,
+            IfStatement: self.generate_IfStatement,
+            WhileStatement: self.generate_WhileStatement,
+            ForStatement: self.generate_ForStatement,
+            Assignment: self.generate_Assignment,
+            BreakStatement: self.generate_BreakStatement,
+            ContinueStatement: self.generate_ContinueStatement,
+            ReturnStatement: self.generate_ReturnStatement
+        }
+
+    def generate(self, statements):
+        self.generate_block(statements)
+        self.emit(RETURN, 0)
+        names = list(self.symbol_table.scopes[0])
+        return Bytecode(self.code.tobytes(), self.constants, names)
+
+    def here(self):
+        return len(self.code) // INSTRUCTION_SIZE
+
+    def emit(self, opcode, argument=0):
+        if argument > MAX_ARGUMENT:
+            raise MiniScriptError("Program too large for 24-bit bytecode arguments")
+        self.code.extend((opcode, argument & 0xFF, argument >> 8 & 0xFF, argument >> 16))
+        return self.here() - 1
+
+    def patch(self, instruction, target=None):
+        """Point the jump at `instruction` to `target` (default: the next instruction)."""
+        target = self.here() if target is None else target
+        offset = instruction * INSTRUCTION_SIZE
+        self.code[offset + 1:offset + 4] = array('B', (target & 0xFF, target >> 8 & 0xFF, target >> 16))
+
+    def constant(self, value):
+        # Key on the type too, so 1, 1.0 and true get separate pool entries
+        key = (type(value), value)
+        slot = self.constant_slots.get(key)
+        if slot is None:
+            slot = self.constant_slots[key] = len(self.constants)
+            self.constants.append(value)
+        return slot
+
+    def slot(self, name):
+        symbol = self.symbol_table.lookup(name)
+        if symbol is None:
+            symbol = self.symbol_table.declare(name)
+        return symbol.slot
+
+    def generate_block(self, statements):
+        for statement in statements:
+            generate = self.statements.get(type(statement))
+            if generate is None:
+                raise MiniScriptError(f"Cannot generate code for {statement.type}")
+            generate(statement)
+
+    def generate_PrintStatement(self, node):
+        for expression in node.expression:
+            self.generate_expression(expression)
+        self.emit(PRINT, len(node.expression))
+
+    def generate_Assignment(self, node):
+        self.generate_expression(node.expression)
+        self.emit(STORE_VAR, self.slot(node.variable.value))
+
+    def generate_IfStatement(self, node):
+        self.generate_expression(node.condition)
+        skip_then = self.emit(JUMP_IF_FALSE)
+        self.generate_block(node.then_statement)
+        if node.else_statement:
+            skip_else = self.emit(JUMP)
+            self.patch(skip_then)
+            self.generate_block(node.else_statement)
+            self.patch(skip_else)
+        else:
+            self.patch(skip_then)
+
+    def generate_WhileStatement(self, node):
+        start = self.here()
+        self.generate_expression(node.condition)
+        exit_jump = self.emit(JUMP_IF_FALSE)
+        self.loops.append((start, [], 0))
+        self.generate_block(node.statement)
+        _, breaks, _ = self.loops.pop()
+        self.emit(JUMP, start)
+        self.patch(exit_jump)
+        for jump in breaks:
+            self.patch(jump)
+
+    def generate_ForStatement(self, node):
+        arguments = node.range_expression.arguments
+        for argument in arguments:
+            self.generate_expression(argument)
+        self.emit(GET_ITER, len(arguments))
+        start = self.emit(FOR_ITER)
+        self.emit(STORE_VAR, self.slot(node.loop_variable.value))
+        # The range iterator stays on the stack, so break has to pop it
+        self.loops.append((start, [], 1))
+        self.generate_block(node.statement)
+        _, breaks, _ = self.loops.pop()
+        self.emit(JUMP, start)
+        self.patch(start)
+        for jump in breaks:
+            self.patch(jump)
+
+    def generate_BreakStatement(self, node):
+        if not self.loops:
+            raise MiniScriptError("'break' outside loop")
+        _, breaks, pops = self.loops[-1]
+        for _ in range(pops):
+            self.emit(POP)
+        breaks.append(self.emit(JUMP))
+
+    def generate_ContinueStatement(self, node):
+        if not self.loops:
+            raise MiniScriptError("'continue' outside loop")
+        self.emit(JUMP, self.loops[-1][0])
+
+    def generate_ReturnStatement(self, node):
+        if node.expression is None:
+            self.emit(RETURN, 0)
+        else:
+            self.generate_expression(node.expression)
+            self.emit(RETURN, 1)
+
+    def generate_expression(self, node):
+        # Walk down the left spine of operator chains iteratively: a long
+        # expression like a + b + c + ... is a tree as deep as it is long.
+        spine = []
+        while isinstance(node, Term):
+            spine.append(node)
+            node = node.left
+        if spine and self.generate_numeric(spine[-1]):
+            spine.pop()
+        else:
+            self.generate_operand(node)
+        for term in reversed(spine):
+            operator = term.operator
+            if operator == 'and' or operator == 'or':
+                jump = self.emit(JUMP_IF_FALSE_OR_POP if operator == 'and' else JUMP_IF_TRUE_OR_POP)
+                self.generate_expression(term.right)
+                self.patch(jump)
+            else:
+                self.generate_expression(term.right)
+                self.emit(BINARY_OPCODES[operator])
+
+    def generate_numeric(self, term):
+        """Emit `term` as one numeric opcode if its operands allow; returns whether it did."""
+        opcodes = NUMERIC_OPCODES.get(term.operator)
+        types = self.types
+        left, right = term.left, term.right
+        if (opcodes is None or types is None or not isinstance(left, Identifier)
+                or not isinstance(right, (Identifier, *LITERAL_NODES))
+                or types.type_of(left) not in NUMERIC_TYPES or types.type_of(right) not in NUMERIC_TYPES):
+            return False
+        if isinstance(right, Identifier):
+            opcode, operand = opcodes[0], self.slot(right.value)
+        else:
+            opcode, operand = opcodes[1], self.constant(right.value)
+        slot = self.slot(left.value)
+        if slot > OPERAND_MASK or operand > OPERAND_MASK:
+            return False
+        self.emit(opcode, slot << OPERAND_BITS | operand)
+        return True
+
+    def generate_operand(self, node):
+        if isinstance(node, Identifier):
+            self.emit(LOAD_VAR, self.slot(node.value))
+        elif isinstance(node, (Number, StringLiteral, BooleanLiteral, NullLiteral)):
+            self.emit(LOAD_CONST, self.constant(node.value))
+        elif isinstance(node, UnaryTerm):
+            self.generate_expression(node.operand)
+            self.emit(NOT if node.operator == 'not' else NEGATE)
+        else:
+            raise MiniScriptError(f"Cannot generate code for {node.type}")
+
+
+def generate_code(statements, symbol_table=None, specialize=True):
+    """Bytecode for `statements`; `specialize` infers types to use the numeric opcodes."""
+    types = infer_types(statements) if specialize else None
+    return CodeGenerator(symbol_table, types).generate(statements)
+
+
+def format_value(value):
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return str(value)
+
+
+# Marks a variable slot that has not been assigned yet
+UNSET = object()
+
+
+class VM:
+    """Stack machine that runs Bytecode.
+
+    `write` receives each printed line (without the newline); `executed`
+    counts the instructions run so far. With `max_steps`, a run that has
+    executed more instructions than that stops with a MiniScriptError the
+    next time it jumps back to the head of a loop, which every
+    non-terminating program does.
+    """
+
+    def __init__(self, write=None, max_steps=None):
+        self.write = write if write is not None else sys.stdout.write
+        self.executed = 0
+        self.max_steps = max_steps
+
+    def run(self, bytecode):
+        """Run `bytecode` and return the program's return value (or None)."""
+        code = bytecode.code
+        ops = code[0::INSTRUCTION_SIZE]
+        args = [low | middle << 8 | high << 16 for low, middle, high in
+                zip(code[1::INSTRUCTION_SIZE], code[2::INSTRUCTION_SIZE], code[3::INSTRUCTION_SIZE])]
+        constants = bytecode.constants
+        # Numeric instructions run as (operator function, left slot, right slot or constant)
+        for pc in [pc for pc, op in enumerate(ops) if op >= FIRST_NUMERIC_OPCODE]:
+            right = args[pc] & OPERAND_MASK
+            args[pc] = (FOLDABLE_OPERATORS[NUMERIC_OPERATORS[ops[pc]]], args[pc] >> OPERAND_BITS,
+                        constants[right] if ops[pc] & 1 else right)
+        try:
+            return self.execute(ops, args, constants, bytecode.names)
+        except ZeroDivisionError:
+            raise MiniScriptError("Division by zero") from None
+        except TypeError as error:
+            raise MiniScriptError(f"Type error: {error}") from None
+        except ValueError as error:
+            raise MiniScriptError(f"Value error: {error}") from None
+        except OverflowError as error:
+            raise MiniScriptError(f"Overflow error: {error}") from None
+        except MemoryError:
+            raise MiniScriptError("Out of memory") from None
+
+    def execute(self, ops, args, constants, names):
+        variables = [UNSET] * len(names)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        write = self.write
+        unset = UNSET
+        pc = 0
+        executed = 0
+        max_steps = self.max_steps if self.max_steps is not None else sys.maxsize
+        try:
+            while True:
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+                executed += 1
+                if op == 2:  # LOAD_VAR
+                    value = variables[arg]
+                    if value is unset:
+                        raise MiniScriptError(f"Undefined variable: '{names[arg]}'")
+                    push(value)
+                elif op == 1:  # LOAD_CONST
+                    push(constants[arg])
+                elif op == 3:  # STORE_VAR
+                    variables[arg] = pop()
+                elif op >= 24:  # numeric: both operands are set, so no unset check
+                    function, left, right = arg
+                    push(function(variables[left], right if op & 1 else variables[right]))
+                elif op == 16:  # JUMP_IF_FALSE
+                    if not pop():
+                        pc = arg
+                elif op == 15:  # JUMP
+                    if arg < pc and executed > max_steps:
+                        raise MiniScriptError(f"Step limit exceeded: more than {max_steps:,} instructions")
+                    pc = arg
+                elif op == 4:  # ADD
+                    right = pop()
+                    stack[-1] = stack[-1] + right
+                elif op == 5:  # SUBTRACT
+                    right = pop()
+                    stack[-1] = stack[-1] - right
+                elif op == 8:  # LESS
+                    right = pop()
+                    stack[-1] = stack[-1] < right
+                elif op == 9:  # GREATER
+                    right = pop()
+                    stack[-1] = stack[-1] > right
+                elif op == 6:  # MULTIPLY
+                    right = pop()
+                    stack[-1] = stack[-1] * right
+                elif op == 7:  # DIVIDE
+                    right = pop()
+                    stack[-1] = stack[-1] / right
+                elif op == 10:  # EQUAL
+                    right = pop()
+                    stack[-1] = stack[-1] == right
+                elif op == 11:  # LESS_EQUAL
+                    right = pop()
+                    stack[-1] = stack[-1] <= right
+                elif op == 12:  # GREATER_EQUAL
+                    right = pop()
+                    stack[-1] = stack[-1] >= right
+                elif op == 20:  # FOR_ITER
+                    value = next(stack[-1], unset)
+                    if value is unset:
+                        pop()
+                        pc = arg
+                    else:
+                        push(value)
+                elif op == 17:  # JUMP_IF_FALSE_OR_POP
+                    if not stack[-1]:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == 18:  # JUMP_IF_TRUE_OR_POP
+                    if stack[-1]:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == 13:  # NOT
+                    stack[-1] = not stack[-1]
+                elif op == 14:  # NEGATE
+                    stack[-1] = -stack[-1]
+                elif op == 22:  # PRINT
+                    values = stack[len(stack) - arg:]
+                    del stack[len(stack) - arg:]
+                    write(' '.join(map(format_value, values)) + '\n')
+                elif op == 19:  # GET_ITER
+                    arguments = stack[len(stack) - arg:]
+                    del stack[len(stack) - arg:]
+                    push(iter(range(*arguments)))
+                elif op == 21:  # POP
+                    pop()
+                elif op == 23:  # RETURN
+                    return pop() if arg else None
+                else:
+                    raise MiniScriptError(f"Unknown opcode {op}")
+        finally:
+            self.executed += executed
+
+
+def run(bytecode, write=None):
+    return VM(write).run(bytecode)
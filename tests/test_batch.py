@@ -0,0 +1,101 @@
+import os
+
+from simple_compiler import batch
+from simple_compiler.batch import compile_files
+from simple_compiler.benchmarks import nested_blocks
+from simple_compiler.cache import CompileCache, pack_entry, unpack_statements, unpack_tokens
+from simple_compiler.the_project import code, lexer, parse_Miniscript
+
+
+def write_sources(directory, count):
+    paths = []
+    for i in range(count):
+        paths.append(os.path.join(directory, f'file{i:03}.ms'))
+        with open(paths[-1], 'w') as file:
+            file.write(f'x = ({i} +\n' if i % 7 == 3 else code * (1 + i % 4) + f'marker = {i}\nprint marker + y\n')
+    return paths
+
+
+def test_parallel_batch_matches_serial(tmp_path):
+    paths = write_sources(tmp_path, 40) + [str(tmp_path / 'missing.ms')]
+    serial = [result.to_dict() for result in compile_files(paths, 1)]
+    assert [result['path'] for result in serial] == paths
+    assert serial[3]['error'] is not None and serial[0]['code'] is None
+    assert serial[-1]['error'] is not None
+    assert [result.to_dict() for result in compile_files(paths, 2, chunk_size=4)] == serial
+    unordered = [result.to_dict() for result in compile_files(paths, 2, chunk_size=4, ordered=False)]
+    assert sorted(unordered, key=lambda result: result['path']) == sorted(serial, key=lambda result: result['path'])
+
+
+def test_files_the_compiler_fails_on_do_not_end_the_batch(tmp_path, monkeypatch):
+    paths = write_sources(tmp_path, 12)
+    with open(paths[5], 'w') as file:
+        file.write(nested_blocks(5_000, 1))
+    expected = [result.error for result in compile_files(paths, 1)]
+    assert 'Nesting deeper' in expected[5]
+    assert [result.error for result in compile_files(paths, 2, chunk_size=4)] == expected
+    # An exception from a bug in the compiler is recorded for that file alone
+    monkeypatch.setattr(batch, 'lexer', lambda source: lexer(source) if len(source) < 10_000 else 1 / 0)
+    cache_directory = str(tmp_path / 'cache')
+    errors = [result.error for result in compile_files(paths, 1, cache_directory=cache_directory)]
+    assert errors[5].startswith('Internal error: ZeroDivisionError')
+    assert errors[:5] + errors[6:] == expected[:5] + expected[6:]
+    assert not next(compile_files(paths[5:6], 1, cache_directory=cache_directory)).cached
+
+
+def test_cached_results_match_compiled_ones(tmp_path):
+    paths = write_sources(tmp_path, 20)
+    cache_directory = str(tmp_path / 'cache')
+    cold = list(compile_files(paths, 1, cache_directory=cache_directory))
+    warm = list(compile_files(paths, 1, cache_directory=cache_directory))
+    assert not any(result.cached for result in cold)
+    assert all(result.cached for result in warm)
+    assert [result.to_dict() for result in warm] == [result.to_dict() for result in cold]
+    assert os.stat(cache_directory).st_mode & 0o777 == 0o700
+
+
+def test_entries_round_trip(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    tokens = lexer(code)
+    statements = parse_Miniscript(tokens)
+    key = cache.key(code, optimization_level=1)
+    assert cache.put(key, pack_entry(tokens, statements))
+    entry = cache.get(key)
+    assert unpack_statements(entry) == statements
+    restored = unpack_tokens(entry, code)
+    assert (restored.types, restored.starts, restored.lengths) == (tokens.types, tokens.starts, tokens.lengths)
+    assert cache.key(code, optimization_level=2) != key
+
+
+def test_damaged_entries_are_misses(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    key = cache.key('x = 1')
+    cache.put(key, pack_entry())
+    with open(cache.path(key), 'wb') as file:
+        file.write(b'\x00garbage')
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.path(key))
+    assert cache.get(cache.key('never stored')) is None
+    assert cache.stats()['misses'] == 2
+
+
+def test_unwritable_cache_is_skipped(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    # A directory that cannot exist, as its parent is a file
+    cache = CompileCache(str(blocker / 'cache'))
+    key = cache.key('x = 1')
+    assert not cache.put(key, pack_entry())
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = CompileCache(str(tmp_path), max_bytes=4_000)
+    tokens = lexer(code)
+    keys = [cache.key(code, copy=i) for i in range(20)]
+    for key in keys:
+        cache.put(key, pack_entry(tokens))
+    assert cache.evictions > 0
+    assert cache.size <= 4_000
+    assert cache.get(keys[-1]) is not None
+    assert cache.get(keys[0]) is None
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+
+import pytest
+
+from simple_compiler.corpus import generate
+from simple_compiler.export import (EXPORT_FORMATS, export_ast, export_parse_table, export_symbols, export_tokens,
+                                    read_columnar)
+from simple_compiler.the_project import Parser, collect_symbols, lexer, parse_Miniscript, stream_lexer
+
+SOURCE = (generate('mixed', 200, 3, terms=20, string_length=30) +
+          'x = "a\nb" \n y = null z = true; w = 1.5 q = not x r = -y\n')
+
+
+def exported(make):
+    """Rows `make(file, format)` writes, read back from every format."""
+    rows = {}
+    for format in EXPORT_FORMATS:
+        file = io.BytesIO() if format == 'columnar' else io.StringIO()
+        count = make(file, format)
+        file.seek(0)
+        if format == 'jsonl':
+            rows[format] = [json.loads(line) for line in file]
+        elif format == 'csv':
+            rows[format] = list(csv.DictReader(file))
+        else:
+            schema, batches = read_columnar(file)
+            rows[format] = []
+            for batch in batches:
+                for i in range(len(next(iter(batch.values())))):
+                    row = {}
+                    for column in schema['columns']:
+                        value = batch[column['name']][i]
+                        if column['type'] == 'enum':
+                            value = column['labels'][value]
+                        elif column['type'] == 'ints':
+                            value = list(value)
+                        row[column['name']] = value
+                    rows[format].append(row)
+        assert count == len(rows[format]), format
+    assert rows['columnar'] == rows['jsonl']
+    assert len(rows['csv']) == len(rows['jsonl'])
+    for row, text_row in zip(rows['jsonl'], rows['csv']):
+        for name, value in row.items():
+            if isinstance(value, list):
+                assert text_row[name] == ' '.join(map(str, value))
+            elif name == 'value':
+                assert json.loads(text_row[name]) == value
+            else:
+                assert text_row[name] == str(value)
+    return rows['jsonl']
+
+
+def test_tokens():
+    tokens = lexer(SOURCE)
+    rows = exported(lambda file, format: export_tokens(tokens, file, format, True))
+    assert ''.join(row['text'] for row in rows) == SOURCE
+    assert all(SOURCE.startswith(row['text'], row['offset']) for row in rows)
+    visible = exported(lambda file, format: export_tokens(tokens, file, format))
+    assert visible == [row for row in rows if not row['text'].isspace()]
+
+
+def test_streamed_tokens_match_whole_input():
+    whole, streamed = io.StringIO(), io.StringIO()
+    export_tokens(lexer(SOURCE), whole, 'jsonl', True)
+    export_tokens(stream_lexer(io.StringIO(SOURCE), 100), streamed, 'jsonl', True)
+    assert streamed.getvalue() == whole.getvalue()
+
+
+def test_ast():
+    rows = exported(lambda file, format: export_ast(Parser(lexer(SOURCE)).iter_statements(), file, format))
+    assert len(rows) > len(parse_Miniscript(lexer(SOURCE)))
+    for row in rows:
+        assert row['parent'] < row['id']
+        if row['type'] == 'Identifier':
+            assert SOURCE.startswith(row['value'], row['offset'])
+
+
+def test_symbols_and_parse_table():
+    tokens = lexer(SOURCE)
+    symbols = collect_symbols(parse_Miniscript(tokens), lines=tokens.line_index())
+    rows = exported(lambda file, format: export_symbols(symbols, file, format))
+    assert [row['name'] for row in rows] == [symbol.name for symbol in symbols.symbols]
+    table = {'Statement': {'if': 'IfStatement', 'while': 'WhileStatement'}, 'Factor': {'(': '( Expression )'}}
+    rows = exported(lambda file, format: export_parse_table(table, file, format))
+    assert [(row['nonterminal'], row['terminal']) for row in rows] == [('Statement', 'if'), ('Statement', 'while'),
+                                                                        ('Factor', '(')]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        export_tokens(lexer(''), io.StringIO(), 'xml')
@@ -0,0 +1,93 @@
+import random
+
+from simple_compiler.corpus import generate
+from simple_compiler.incremental import IncrementalDocument, edit_between
+from simple_compiler.the_project import ParseError, lexer, parse_Miniscript
+
+PIECES = ['x = 1\n', 'y = x + 2\n', 'while x < 3 {\n x += 1\n}\n', 'print(x, "a b")\n',
+          'if x > 1 { print "hi" } else { y = 2 }\n', 'for i in range(3) { print i }\n', 'z = "quoted\nstring"\n',
+          'return\n', 'return x\n', ';', ' ', '\n', '"', "'", '+', '{', '}', 'x', '1.5', '=']
+
+
+def offsets(statements):
+    """(node type, offset) of every node, in preorder."""
+    result = []
+    stack = list(reversed(statements))
+    while stack:
+        node = stack.pop()
+        result.append((type(node).__name__, getattr(node, 'offset', None)))
+        stack.extend(reversed(node.children))
+    return result
+
+
+def test_edit_between():
+    assert edit_between('hello world', 'hello brave world') == (6, 0, 'brave ')
+    assert edit_between('abc', 'abc') == (3, 0, '')
+    assert edit_between('aaa', 'aa') == (2, 1, '')
+
+
+def check_document(document):
+    """The document's tokens and tree match a fresh lex and parse of its source."""
+    tokens = lexer(document.source)
+    assert tokens.types == document.tokens.types
+    assert list(tokens.starts) == [document.tokens.starts[i] for i in range(len(document.tokens))]
+    assert tokens.lengths == document.tokens.lengths
+    try:
+        statements = parse_Miniscript(tokens)
+    except ParseError:
+        assert document.error is not None
+        return
+    assert document.error is None
+    assert document.statements == statements
+    assert offsets(document.statements) == offsets(statements)
+
+
+def test_edits_match_a_fresh_parse():
+    rng = random.Random(1)
+    for _ in range(100):
+        source = ''.join(rng.choice(PIECES[:9]) for _ in range(rng.randint(0, 15)))
+        document = IncrementalDocument(source)
+        for _ in range(30):
+            offset = rng.randint(0, len(document.source))
+            removed = rng.randint(0, min(6, len(document.source) - offset)) if rng.random() < 0.5 else 0
+            document.edit(offset, removed, rng.choice(PIECES) if rng.random() < 0.8 else '')
+            check_document(document)
+
+
+def test_edits_in_a_generated_program():
+    rng = random.Random(2)
+    pieces = ['x = 1\n', '\n', ' ', 'while y < 3 { y = y + 1 }\n', 'print x\n', 'z = "a\nb"\n']
+    for seed in range(20):
+        document = IncrementalDocument(generate('mixed', 40, seed, terms=20, string_length=20))
+        for _ in range(30):
+            offset = rng.randrange(len(document.source) + 1)
+            removed = 0 if rng.random() < 0.7 else rng.randrange(min(3, len(document.source) - offset) + 1)
+            document.edit(offset, removed, rng.choice(pieces) if rng.random() < 0.8 else '')
+            check_document(document)
+
+
+def test_edit_rebuilds_only_near_the_change():
+    source = 'x = 1\n' * 2_000
+    document = IncrementalDocument(source)
+    document.edit(len(source) // 2, 0, 'y = 2\n')
+    assert document.relexed < 20
+    assert document.reparsed < 5
+    check_document(document)
+
+
+def test_failed_parse_keeps_the_last_good_tree():
+    document = IncrementalDocument('x = 1\ny = 2\n')
+    statements = document.statements
+    document.edit(6, 0, 'z = (\n')
+    assert document.error is not None
+    assert document.statements == statements
+    document.edit(6, 6, '')
+    assert document.error is None
+    check_document(document)
+
+
+def test_too_deep_nesting_is_a_parse_error():
+    document = IncrementalDocument('x = 1\n')
+    document.edit(6, 0, 'y = ' + '(' * 5_000 + '1' + ')' * 5_000 + '\n')
+    assert 'Nesting deeper' in str(document.error)
+    check_document(document)
@@ -0,0 +1,115 @@
+import io
+import random
+
+import pytest
+
+from simple_compiler import parallel
+from simple_compiler.benchmarks import legacy_lexer
+from simple_compiler.corpus import SHAPES, generate
+from simple_compiler.the_project import (KEYWORDS, TOKEN_TYPES, MiniScriptError, TokenBuffer, code, lexer,
+                                         stream_lexer)
+
+SOURCES = [code, '', 'x', '\n\n', 'x = "a\nb" y = \'c\' z = "unterminated\n', 'if(x)i=1 else print 1.5;',
+           'while not x {\r\n x += 1\r}\n']
+SOURCES += [generate(shape, 60, seed, terms=40, string_length=100) for shape in SHAPES for seed in range(2)]
+
+
+def same_tokens(tokens, expected):
+    return (tokens.types, list(tokens.starts), tokens.lengths) == (expected.types, list(expected.starts),
+                                                                     expected.lengths)
+
+
+def test_lexer_matches_legacy_lexer():
+    for source in SOURCES:
+        new_tokens = lexer(source)
+        old_tokens = legacy_lexer(source)
+        assert [t['value'] for t in new_tokens] == [t['value'] for t in old_tokens]
+        for new, old in zip(new_tokens, old_tokens):
+            if new['type'] != old['type']:
+                # The legacy lexer classified by substring search in the KEYWORDS
+                # pattern (so '(' or 'i' came out as keywords) and never reached the
+                # true/false/null literal branch; those are the only allowed changes.
+                assert old['value'] in KEYWORDS or old['value'] in ('true', 'false', 'null'), old['value']
+
+
+def test_lexer_types_words():
+    assert [token['type'] for token in lexer('if iffy 12 true')] == [
+        TOKEN_TYPES['KEYWORD'], TOKEN_TYPES['SYMBOL'], TOKEN_TYPES['IDENTIFIER'], TOKEN_TYPES['SYMBOL'],
+        TOKEN_TYPES['LITERAL'], TOKEN_TYPES['SYMBOL'], TOKEN_TYPES['LITERAL']]
+
+
+def test_token_buffer_reads_back_values():
+    tokens = lexer('x = 12 + "s"')
+    assert isinstance(tokens, TokenBuffer)
+    assert len(tokens) == 9
+    assert tokens[2] == {'type': TOKEN_TYPES['SYMBOL'], 'value': '='}
+    assert tokens.value_at(4) == 12
+    assert tokens.text_at(8) == '"s"'
+    assert list(tokens)[-1]['value'] == '"s"'
+
+
+def test_lexer_on_bytes_matches_str():
+    for source in SOURCES:
+        assert same_tokens(lexer(source.encode()), lexer(source))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+@pytest.mark.parametrize('binary', [False, True])
+def test_stream_lexer_matches_lexer(chunk_size, binary):
+    for source in SOURCES:
+        file = io.BytesIO(source.encode()) if binary else io.StringIO(source)
+        streamed = [(token['type'], token['value']) for tokens in stream_lexer(file, chunk_size) for token in tokens]
+        assert streamed == [(token['type'], token['value']) for token in lexer(source)]
+
+
+def test_stream_lexer_offsets():
+    source = generate('strings', 100, 1)
+    offset = 0
+    for tokens in stream_lexer(io.StringIO(source), 64):
+        assert tokens.offset == offset
+        for i in range(len(tokens)):
+            assert source[tokens.offset + tokens.starts[i]:].startswith(tokens.text_at(i))
+        offset += sum(tokens.lengths)
+    assert offset == len(source)
+
+
+def test_stream_lexer_caps_an_unterminated_string():
+    file = io.StringIO('x = "' + 'a' * 10_000)
+    with pytest.raises(MiniScriptError, match='Unterminated string at offset 4'):
+        list(stream_lexer(file, 100, max_string_size=1_000))
+    # A closed string longer than the chunk size is still one token
+    source = 'x = "' + 'a' * 900 + '" y\n'
+    streamed = [token['value'] for tokens in stream_lexer(io.StringIO(source), 100, 1_000) for token in tokens]
+    assert streamed == [token['value'] for token in lexer(source)]
+
+
+def test_bulk_lexer_matches_lexer():
+    pytest.importorskip('numpy')
+    from simple_compiler.bulk import bulk_lexer
+
+    for source in SOURCES + ['caf\xe9 = 1\n', '\x1c\x00 ~ @']:
+        assert same_tokens(bulk_lexer(source), lexer(source))
+        assert same_tokens(bulk_lexer(source.encode()), lexer(source.encode()))
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_SEGMENT_SIZE', 1)
+
+
+def test_parallel_lexer_matches_lexer(small_segments):
+    rng = random.Random(1)
+    alphabet = 'ab1 \n\n"\'x=+\t{}'
+    cases = SOURCES + ['"a\nb"\n"c\nd"\n', '\'\n\n\n', 'x\n"\n\n\ny\n', 'a"b\nc\nd', '"\n"\n"\n"\n"']
+    cases += [''.join(rng.choice(alphabet) for _ in range(rng.randrange(300))) for _ in range(20)]
+    for source in cases:
+        for workers in (2, 3):
+            assert same_tokens(parallel.parallel_lexer(source, workers), lexer(source)), repr(source)
+            assert same_tokens(parallel.parallel_lexer(source.encode(), workers), lexer(source.encode()))
+
+
+def test_parallel_lex_file(small_segments, tmp_path):
+    source = generate('mixed', 300, 2).encode()
+    path = tmp_path / 'huge.ms'
+    path.write_bytes(source)
+    assert same_tokens(parallel.parallel_lex_file(str(path), 3), lexer(source))
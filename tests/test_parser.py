@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+from simple_compiler.benchmarks import count_nodes, long_expression, nested_blocks
+from simple_compiler.corpus import SHAPES, generate
+from simple_compiler.ll1 import parse_ll1
+from simple_compiler.the_project import (MAX_NESTING_DEPTH, Assignment, CodeOptimization, Identifier, LineIndex,
+                                         ParseError, Parser, SemanticAnalyzer, SymbolTable, Term, code, lexer,
+                                         parse_Miniscript)
+from simple_compiler.vm import generate_code
+
+PROGRAMS = [code, long_expression(50), nested_blocks(20, 2)]
+PROGRAMS += [generate(shape, 60, seed, terms=40, string_length=100) for shape in SHAPES for seed in range(2)]
+
+WORDS = ['x', '1', '2.5', '"s"', 'true', 'null', '=', '+', '-', '*', '/', '<', '>', '(', ')', '{', '}', 'if', 'else',
+         'while', 'for', 'in', 'range', 'print', 'not', 'and', 'or', 'break', 'continue', 'return', ',', ';', '\n']
+
+
+def accepts(parser, source):
+    try:
+        parser(lexer(source))
+        return True
+    except ParseError:
+        return False
+
+
+def test_precedence_and_associativity():
+    (statement,) = parse_Miniscript(lexer('x = 1 - 2 - 3 * 4 < 5 and not y'))
+    assert isinstance(statement, Assignment)
+    comparison = statement.expression.left
+    assert comparison.operator == '<'
+    subtraction = comparison.left
+    assert (subtraction.operator, subtraction.left.operator, subtraction.right.operator) == ('-', '-', '*')
+
+
+def test_parse_errors_carry_offsets():
+    with pytest.raises(ParseError) as raised:
+        parse_Miniscript(lexer('x = 1\n y = ) 2'))
+    assert raised.value.offset == 11
+    assert 'line 2, column 6' in str(raised.value)
+    with pytest.raises(ParseError, match='end of input'):
+        parse_Miniscript(lexer('x = (1 +\n'))
+
+
+def test_parsing_long_inputs_does_not_recurse_per_token():
+    tokens = lexer(long_expression(5_000))
+    (statement,) = parse_Miniscript(tokens)
+    assert count_nodes([statement]) > 5_000
+
+
+def test_ll1_accepts_programs():
+    for source in PROGRAMS:
+        parse_ll1(lexer(source))
+
+
+def test_ll1_agrees_with_pratt_parser_on_random_tokens():
+    rng = random.Random(1)
+    for _ in range(5_000):
+        source = ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(1, 12)))
+        assert accepts(parse_ll1, source) == accepts(parse_Miniscript, source), repr(source)
+
+
+def test_ll1_parses_deep_nesting():
+    tokens = lexer(nested_blocks(5_000, 1))
+    with pytest.raises(ParseError, match='Nesting deeper'):
+        parse_Miniscript(tokens)
+    parse_ll1(tokens)
+
+
+def test_nesting_limit():
+    shapes = (lambda depth: nested_blocks(depth, 1), lambda depth: 'x = ' + '(' * depth + '1' + ')' * depth,
+              lambda depth: 'x = ' + 'not ' * depth + '1', lambda depth: 'if x { }' + ' else if x { }' * depth)
+    for shape in shapes:
+        # Every later pass copes with the deepest tree the parser accepts
+        statements = parse_Miniscript(lexer(shape(MAX_NESTING_DEPTH - 5)))
+        SemanticAnalyzer().analyze(statements)
+        str(statements[0])
+        generate_code(CodeOptimization(2).optimize(statements))
+        with pytest.raises(ParseError, match='Nesting deeper') as error:
+            parse_Miniscript(lexer(shape(MAX_NESTING_DEPTH + 5)))
+        assert error.value.offset is not None
+
+
+def test_hash_consing_keeps_trees_equal():
+    for source in PROGRAMS:
+        tokens = lexer(source)
+        plain = parse_Miniscript(tokens)
+        shared = parse_Miniscript(tokens, True)
+        assert shared == plain
+        assert [hash(statement) for statement in shared] == [hash(statement) for statement in plain]
+        assert count_nodes(shared) <= count_nodes(plain)
+
+
+def test_hash_consing_shares_equal_subtrees():
+    first, second = parse_Miniscript(lexer('x = a + 1\ny = a + 1'), True)
+    assert isinstance(first.expression, Term)
+    assert first.expression is second.expression
+    assert isinstance(first.variable, Identifier)
+
+
+def test_symbol_table_resolves_scopes_to_slots():
+    symbols = SymbolTable()
+    symbols.declare('a')
+    symbols.push_scope()
+    symbols.declare('b')
+    assert symbols.resolve('a') == (0, 0)
+    assert symbols.resolve('b') == (1, 0)
+    symbols.pop_scope()
+    assert symbols.lookup('b') is None
+
+
+def test_semantic_analysis_reports_every_diagnostic():
+    source = 'x = 1\nprint y - 1\nbreak\nz = "a" - 1'
+    tokens = lexer(source)
+    diagnostics = SemanticAnalyzer(lines=tokens.line_index()).analyze(parse_Miniscript(tokens))
+    assert sorted((d.code, d.line, d.column) for d in diagnostics) == [
+        ('E001', 2, 7), ('E002', 3, 1), ('E004', 4, 5), ('W003', 4, 1), ('W004', 1, 1), ('W004', 4, 1)]
+
+
+def test_spans_and_positions():
+    source = 'x = 1\n  y = (x +\n 2)\nprint y\nprint(z, 1)\n'
+    tokens = lexer(source)
+    parser = Parser(tokens, spans=True)
+    statements = parser.parse_Miniscript()
+    assert [source[slice(*parser.spans.span(statement))] for statement in statements] == [
+        'x = 1', 'y = (x +\n 2)', 'print y', 'print(z, 1)']
+    lines = tokens.line_index()
+    assert [lines.node_position(statement) for statement in statements] == [(1, 1), (2, 3), (4, 1), (5, 1)]
+
+
+def test_line_index_matches_counting_newlines():
+    source = generate('strings', 100, 3, string_length=50)
+    index = LineIndex(source)
+    for offset in range(0, len(source) + 1, 7):
+        line = source.count('\n', 0, offset) + 1
+        column = offset - (source.rfind('\n', 0, offset) + 1) + 1
+        assert index.position(offset) == (line, column)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+
+from simple_compiler.server import (COMPILE_ERROR, INTERNAL_ERROR, INVALID_PARAMS, INVALID_REQUEST,
+                                    METHOD_NOT_FOUND, PARSE_ERROR, CompileServer)
+from simple_compiler.the_project import code, lexer, parse_Miniscript
+
+
+def request(server, method, params=None, request_id=1):
+    message = {'jsonrpc': '2.0', 'id': request_id, 'method': method}
+    if params is not None:
+        message['params'] = params
+    return asyncio.run(server.handle(json.dumps(message).encode()))
+
+
+def error_code(response):
+    return response['error']['code']
+
+
+def test_methods():
+    server = CompileServer()
+    params = {'uri': 'sample', 'version': 1, 'text': 'x = 1\nprint y\n'}
+    tokens = request(server, 'lex', params)['result']['tokens']
+    assert tokens[:3] == [['IDENTIFIER', 'x', 0], ['SYMBOL', '=', 2], ['LITERAL', '1', 4]]
+    statements = parse_Miniscript(lexer(params['text']))
+    assert request(server, 'parse', params)['result']['statements'] == [str(statement) for statement in statements]
+    diagnostics = request(server, 'check', params)['result']['diagnostics']
+    assert [diagnostic['code'] for diagnostic in diagnostics] == ['W004', 'E001']
+    result = request(server, 'compile', {'uri': 'run', 'text': 'print(1 + 2)', 'run': True})['result']
+    assert result['output'] == '3\n'
+    assert 'PRINT' in result['code']
+
+
+def test_versions_are_cached():
+    server = CompileServer()
+    first = request(server, 'check', {'uri': 'sample', 'version': 1, 'text': code})['result']
+    again = request(server, 'check', {'uri': 'sample', 'version': 1})['result']
+    assert (first['cached'], again['cached']) == (False, True)
+    assert again['diagnostics'] == first['diagnostics']
+    missing = request(server, 'check', {'uri': 'sample', 'version': 2})
+    assert error_code(missing) == INVALID_PARAMS
+
+
+def test_protocol_errors():
+    server = CompileServer()
+    assert error_code(asyncio.run(server.handle(b'{not json'))) == PARSE_ERROR
+    assert error_code(asyncio.run(server.handle(b'[1, 2]'))) == INVALID_REQUEST
+    assert error_code(request(server, 'nope', {})) == METHOD_NOT_FOUND
+    assert error_code(request(server, 'check', [1])) == INVALID_PARAMS
+    # Notifications get no answer
+    assert asyncio.run(server.handle(b'{"jsonrpc": "2.0", "method": "check", "params": {"text": ""}}')) is None
+
+
+def test_invalid_params():
+    server = CompileServer()
+    for params in ({'uri': ['a'], 'text': ''}, {'version': [1], 'text': ''}, {'version': {}, 'text': ''},
+                   {'text': 5}, {}):
+        assert error_code(request(server, 'check', params)) == INVALID_PARAMS, params
+    for level in (True, 3, '1', 1.0, None):
+        assert error_code(request(server, 'compile', {'text': '', 'optimize': level})) == INVALID_PARAMS, level
+
+
+def test_compile_and_runtime_errors():
+    server = CompileServer(max_steps=10_000)
+    response = request(server, 'parse', {'text': 'x = (1 +'})
+    assert error_code(response) == COMPILE_ERROR
+    response = request(server, 'compile', {'text': 'print 1 / 0', 'run': True})
+    assert error_code(response) == COMPILE_ERROR
+    response = request(server, 'compile', {'text': 'x = 0 while true { x += 1 }', 'run': True})
+    assert error_code(response) == COMPILE_ERROR
+    assert 'Step limit exceeded' in response['error']['message']
+    response = request(server, 'compile', {'text': 'print "ab" * 99999999999999999999', 'run': True})
+    assert error_code(response) == COMPILE_ERROR
+
+
+def test_internal_errors_are_answered():
+    server = CompileServer()
+
+    def broken(params):
+        raise KeyError('bug')
+
+    server.methods['check'] = broken
+    response = request(server, 'check', {'text': ''})
+    assert error_code(response) == INTERNAL_ERROR
+    assert response['id'] == 1
+
+
+def test_shutdown_over_a_socket(tmp_path):
+    path = str(tmp_path / 'server.sock')
+
+    async def session():
+        server = CompileServer()
+        serving = asyncio.create_task(server.serve_unix(path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+        messages = [{'jsonrpc': '2.0', 'id': i, 'method': 'check', 'params': {'uri': str(i), 'text': code}}
+                    for i in range(5)]
+        messages.append({'jsonrpc': '2.0', 'id': 'stop', 'method': 'shutdown'})
+        writer.write(b''.join(json.dumps(message).encode() + b'\n' for message in messages))
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in messages]
+        await asyncio.wait_for(serving, 10)
+        writer.close()
+        return responses
+
+    responses = asyncio.run(session())
+    # Every request sent before the shutdown is answered before it
+    assert responses[-1] == {'jsonrpc': '2.0', 'id': 'stop', 'result': None}
+    assert sorted(response['id'] for response in responses[:-1]) == list(range(5))
+    assert all('diagnostics' in response['result'] for response in responses[:-1])
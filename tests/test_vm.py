@@ -0,0 +1,231 @@
+import operator
+import random
+
+import pytest
+
+from simple_compiler.corpus import SHAPES, generate
+from simple_compiler.inference import infer_types
+from simple_compiler.ir import Const, lower
+from simple_compiler.the_project import (CodeOptimization, MiniScriptError, StringLiteral, Term, code, lexer,
+                                         parse_Miniscript)
+from simple_compiler.transpile import PythonProgram
+from simple_compiler.vm import VM, CodeGenerator, format_value, generate_code
+
+EDGE_CASES = [
+    'total = 0 for i in range(10) { if i = 3 { continue } if i > 7 { break } total += i } print(total, "done", 1.5)',
+    'n = 0 while true { n += 1; if n >= 5 { break } } print n return n * 2',
+    'x = 0 or "a" print x print not 0 and 2 print 7 / 2',
+    'if 1 > 2 { print "no" } else if 2 > 1 { print "yes" } else { print "never" }',
+    'x = 1 while x < 5 { if x = 3 { y = 2 } x = x + 1 } print(y + 1)',
+    'for i in range(3) { if i = 1 { continue } z = i } print(z * 2)',
+    'for i in range(0) { } print(i + 1)',
+    'x = 1 while true { x = x / 2 if x < 0.01 { break } } print(x * 3)',
+    'x = 1 while x < 100 { x = x * 2 if x > 10 { x = "s" break } } print(x)',
+    'x = 5 while x > 0 { x = x - 1 if x = 2 { return x * 10 } }',
+    'q = 1 r = q + 1 q = "a" print(q + "b", r < 3)',
+    't = true print(t + 1, t < 2)',
+    'k = 0 for i in range(5) { for j in range(5) { if j > i { break } k = k + j } } print(k, i, j)',
+    'u = 3 while u > 0 { u = u - 1 if u = 1 { u = null } if u = null { break } } print(u)',
+    'print y',
+    'x = 1 y = 0 print(x / y)',
+    'print 1 + "a"',
+]
+
+VARIABLES = ['a', 'b', 'c', 'd']
+
+
+def random_expression(rng, depth=0):
+    choice = rng.random()
+    if depth > 2 or choice < 0.3:
+        return rng.choice([str(rng.randint(0, 4)), rng.choice(VARIABLES), 'true', 'false', 'null', '"s"', '1.5'])
+    if choice < 0.4:
+        return f'(not ({random_expression(rng, depth + 1)}))'
+    if choice < 0.45:
+        return f'-({random_expression(rng, depth + 1)})'
+    operator = rng.choice(['+', '-', '*', '/', '<', '>', '=', '<=', '>=', 'and', 'or'])
+    return f'({random_expression(rng, depth + 1)} {operator} {random_expression(rng, depth + 1)})'
+
+
+def random_block(rng, depth=0, in_loop=False):
+    lines = []
+    for _ in range(rng.randint(1, 4)):
+        choice = rng.random()
+        if choice < 0.4:
+            lines.append(f'{rng.choice(VARIABLES)} = {random_expression(rng)}')
+        elif choice < 0.5:
+            lines.append(f'print({random_expression(rng)})')
+        elif choice < 0.6 and depth < 3:
+            lines.append(f'if {random_expression(rng)} {{ {random_block(rng, depth + 1, in_loop)} }} '
+                         f'else {{ {random_block(rng, depth + 1, in_loop)} }}')
+        elif choice < 0.7 and depth < 3:
+            lines.append(f'w{depth} = 0\nwhile w{depth} < 3 {{ w{depth} += 1\n{random_block(rng, depth + 1, True)} }}')
+        elif choice < 0.8 and depth < 3:
+            lines.append(f'for {rng.choice(VARIABLES)} in range({rng.randint(0, 3)}) '
+                         f'{{ {random_block(rng, depth + 1, True)} }}')
+        elif choice < 0.85 and in_loop:
+            lines.append(rng.choice(['break', 'continue']))
+        elif choice < 0.87:
+            lines.append(f'return {random_expression(rng)}')
+        else:
+            lines.append(f'{rng.choice(VARIABLES)} = {rng.choice(VARIABLES)} + 1')
+    return '\n'.join(lines)
+
+
+def random_programs(count, seed=1):
+    rng = random.Random(seed)
+    return ['a = 1\nb = 2\nc = 3\nd = 4\n' + random_block(rng) for _ in range(count)]
+
+
+PROGRAMS = EDGE_CASES + [code] + [generate(shape, 40, seed, terms=20, string_length=20) for shape in SHAPES
+                                  for seed in range(2)]
+
+
+def run_bytecode(bytecode):
+    """(printed lines, return value), or the lines printed before a runtime error and 'error'."""
+    output = []
+    try:
+        return output, VM(output.append).run(bytecode)
+    except MiniScriptError:
+        return output, 'error'
+
+
+def run_program(statements):
+    output = []
+    try:
+        return output, PythonProgram(statements).run(output.append)
+    except MiniScriptError:
+        return output, 'error'
+
+
+def test_vm_runs_programs():
+    output, result = run_bytecode(generate_code(parse_Miniscript(lexer(EDGE_CASES[0] + ' ' + EDGE_CASES[1]))))
+    assert output == ['25 done 1.5\n', '5\n']
+    assert result == 10
+
+
+def test_vm_reports_runtime_errors():
+    for source, message in (('print y', 'Undefined variable'), ('print 1 / 0', 'Division by zero'),
+                            ('print 1 + "a"', 'Type error'), ('print "ab" * 99999999999999999999', 'Overflow error'),
+                            ('print ' + '9' * 400 + ' / 1', 'Overflow error')):
+        statements = parse_Miniscript(lexer(source))
+        with pytest.raises(MiniScriptError, match=message):
+            VM(lambda line: None).run(generate_code(statements))
+        with pytest.raises(MiniScriptError, match=message):
+            PythonProgram(statements).run(lambda line: None)
+
+
+def test_vm_step_limit():
+    bytecode = generate_code(parse_Miniscript(lexer('x = 0 while true { x += 1 }')))
+    vm = VM(lambda line: None, max_steps=10_000)
+    with pytest.raises(MiniScriptError, match='Step limit exceeded'):
+        vm.run(bytecode)
+    assert 10_000 < vm.executed < 10_100
+    # A program that finishes within the limit runs as without one
+    assert run_bytecode(generate_code(parse_Miniscript(lexer('x = 0 while x < 10 { x += 1 } return x'))))[1] == 10
+
+
+def test_optimization_levels_agree():
+    for source in PROGRAMS + random_programs(300):
+        statements = parse_Miniscript(lexer(source))
+        results = [run_bytecode(generate_code(CodeOptimization(level).optimize(statements))) for level in (0, 1, 2)]
+        assert results[0] == results[1] == results[2], source
+
+
+def test_optimizer_reports_each_pass():
+    optimizer = CodeOptimization(2)
+    optimizer.optimize(parse_Miniscript(lexer('x = 2 * 3 + 0 print x')))
+    assert [name for name, *_ in optimizer.report][:3] == ['constant_folding', 'algebraic_simplification',
+                                                           'dead_code_elimination']
+    assert all(after <= before for _, _, before, after in optimizer.report)
+
+
+def test_folding_leaves_huge_strings_to_run_time():
+    for source in ('print "ab" * 200000000', 'print 99999999999999999999 * "ab"', 'print "ab" * 3000 + "c"'):
+        statements = CodeOptimization(1).optimize(parse_Miniscript(lexer(source)))
+        assert isinstance(statements[0].expression[0], Term), source
+    statements = CodeOptimization(1).optimize(parse_Miniscript(lexer('print "ab" * 3 + "c"')))
+    assert statements[0].expression[0] == StringLiteral('abababc')
+
+
+def test_python_backend_matches_vm():
+    for source in PROGRAMS + random_programs(300, seed=2):
+        statements = CodeOptimization(2).optimize(parse_Miniscript(lexer(source)))
+        assert run_program(statements) == run_bytecode(generate_code(statements)), source
+
+
+OPERATORS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, '<': operator.lt,
+             '>': operator.gt, '=': operator.eq, '<=': operator.le, '>=': operator.ge}
+
+
+def interpret(graph, write):
+    """Run a ControlFlowGraph; returns the program's return value."""
+    variables = {}
+
+    def value(operand):
+        return operand.value if isinstance(operand, Const) else variables[operand]
+
+    block = graph.entry
+    while True:
+        for instruction in block.instructions:
+            op, args = instruction.op, instruction.args
+            if op == 'copy':
+                variables[instruction.dest] = value(args[0])
+            elif op in OPERATORS:
+                variables[instruction.dest] = OPERATORS[op](value(args[0]), value(args[1]))
+            elif op == 'not':
+                variables[instruction.dest] = not value(args[0])
+            elif op == 'neg':
+                variables[instruction.dest] = -value(args[0])
+            elif op == 'print':
+                write(' '.join(format_value(value(arg)) for arg in args) + '\n')
+            elif op == 'range':
+                variables[instruction.dest] = iter(range(*[value(arg) for arg in args]))
+            elif op == 'jump':
+                block = block.successors[0]
+            elif op == 'branch':
+                block = block.successors[0 if value(args[0]) else 1]
+            elif op == 'next':
+                item = next(variables[args[0]], None)
+                if item is None:
+                    block = block.successors[1]
+                else:
+                    variables[instruction.dest] = item
+                    block = block.successors[0]
+            elif op == 'return':
+                return value(args[0]) if args else None
+
+
+def run_graph(graph):
+    output = []
+    try:
+        return output, interpret(graph, output.append)
+    except (KeyError, TypeError, ZeroDivisionError):
+        return output, 'error'
+
+
+def test_ir_runs_like_bytecode():
+    for source in PROGRAMS + random_programs(300, seed=4):
+        statements = parse_Miniscript(lexer(source))
+        assert run_graph(lower(statements)) == run_bytecode(generate_code(statements)), source
+
+
+def test_ir_analyses():
+    graph = lower(parse_Miniscript(lexer('x = 0\nfor i in range(3) { if i = 1 and x < 2 { continue } x += i }\n'
+                                         'print(x)')))
+    graph.dominators()
+    live_in, _ = graph.liveness()
+    assert all(graph.dominates(graph.entry, block) for block in graph.blocks)
+    assert all(not name.startswith('%') for name in live_in[0])
+    for block in graph.blocks:
+        for successor in block.successors:
+            assert block in successor.predecessors
+
+
+def test_specialized_bytecode_matches_generic():
+    for source in PROGRAMS + random_programs(200, seed=3):
+        for level in (0, 1, 2):
+            for hash_cons in (False, True):
+                statements = CodeOptimization(level).optimize(parse_Miniscript(lexer(source), hash_cons))
+                generic = run_bytecode(generate_code(statements, specialize=False))
+                specialized = run_bytecode(CodeGenerator(None, infer_types(statements)).generate(statements))
+                assert generic == specialized, (level, hash_cons, source)